@@ -1,83 +1,110 @@
+import time
+
 import streamlit as st
 import pandas as pd
-import sqlite3
-import os
-
-def get_all_bookings():
-    """Fetch all bookings from the database."""
-    # Ensure we connect to the correct path
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db', 'bookings.db')
-    
+
+from app.config import TRACE_DASHBOARD_MAX_SPANS
+from app.tracing import stage_percentiles, slowest_turns
+
+from db.database import (
+    search_bookings, count_bookings_by_status, distinct_booking_dates,
+    get_booking_stats, bookings_version, outbox_status, requeue_dead_emails,
+)
+
+PAGE_SIZE = 25
+# Latency panel windows, in hours
+LATENCY_WINDOWS = {"Last hour": 1, "Last 24 hours": 24, "Last 7 days": 168}
+
+# Query results are cached per bookings version: any booking write bumps the
+# version (via a trigger), so cached pages are never served stale.
+@st.cache_data(max_entries=256, show_spinner=False)
+def _cached_page(search, date, before_id, version):
+    return search_bookings(search, date, before_id, PAGE_SIZE)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _cached_status_counts(search, date, version):
+    return count_bookings_by_status(search, date)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _cached_dates(version):
+    return distinct_booking_dates()
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _cached_stats(version):
+    return get_booking_stats()
+
+def get_bookings_page(search=None, date=None, before_id=None):
+    """Fetch one page of bookings matching the filters, plus the cursor for the next page."""
     try:
-        conn = sqlite3.connect(db_path)
-        # We join customers and bookings to get a complete view
-        query = """
-        SELECT 
-            b.id as Booking_ID,
-            c.name as Customer_Name,
-            c.email as Email,
-            c.phone as Phone,
-            b.booking_type as Service_Type,
-            b.date as Date,
-            b.time as Time,
-            b.status as Status
-        FROM bookings b
-        JOIN customers c ON b.customer_id = c.id
-        ORDER BY b.id DESC
-        """
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        columns, rows, next_before_id = _cached_page(search, date, before_id, bookings_version())
+        return pd.DataFrame(rows, columns=columns), next_before_id
     except Exception as e:
         st.error(f"Error accessing database: {e}")
-        return pd.DataFrame()
+        return pd.DataFrame(), None
 
 def show_dashboard():
     """Main function to render the Admin Dashboard."""
     st.header("🔒 Admin Dashboard")
     st.markdown("View and manage all mentorship bookings here.")
 
-    # 1. Fetch Data
-    df = get_all_bookings()
+    version = bookings_version()
+    dates = _cached_dates(version)
 
-    if df.empty:
+    if not dates:
         st.info("No bookings found yet. Go to the Chat tab to create one!")
+        show_latency_panel()
         return
 
-    # 2. Filter / Search Section
+    # 1. Filter / Search Section
     with st.expander("🔎 Filter & Search", expanded=True):
         col1, col2 = st.columns(2)
-        
+
         with col1:
             search_term = st.text_input("Search by Name or Email")
-        
+
         with col2:
-            # Get unique dates for the dropdown
-            unique_dates = ["All"] + list(df['Date'].unique())
-            selected_date = st.selectbox("Filter by Date", unique_dates)
-
-    # 3. Apply Filters
-    if search_term:
-        # Case-insensitive search on Name or Email
-        df = df[
-            df['Customer_Name'].str.contains(search_term, case=False) | 
-            df['Email'].str.contains(search_term, case=False)
-        ]
-    
-    if selected_date != "All":
-        df = df[df['Date'] == selected_date]
-
-    # 4. Display Metrics
+            # Distinct dates come from the trigger-maintained booking_stats table, not a bookings scan
+            selected_date = st.selectbox("Filter by Date", ["All"] + dates)
+
+    search = search_term.strip() or None
+    date = None if selected_date == "All" else selected_date
+
+    # 2. Pagination state: a stack of cursors, reset whenever the filters change
+    filters = (search, date)
+    if st.session_state.get("dashboard_filters") != filters:
+        st.session_state.dashboard_filters = filters
+        st.session_state.dashboard_cursors = [None]
+    cursors = st.session_state.dashboard_cursors
+
+    # 3. Display Metrics: unfiltered totals come from the trigger-maintained
+    # summary table; only a filtered view needs a COUNT query
+    stats = _cached_stats(version)
+    if search or date:
+        counts = _cached_status_counts(search, date, version)
+        total = sum(counts.values())
+    else:
+        counts = stats.get("status", {})
+        total = stats["total"].get("all", 0)
     m1, m2, m3 = st.columns(3)
-    m1.metric("Total Bookings", len(df))
-    m2.metric("Confirmed", len(df[df['Status'] == 'Confirmed']))
-    m3.metric("Pending", len(df[df['Status'] == 'Pending']))
+    m1.metric("Total Bookings", total)
+    m2.metric("Confirmed", counts.get("Confirmed", 0))
+    m3.metric("Pending", counts.get("Pending", 0))
 
-    # 5. Data Table
+    with st.expander("📊 Breakdown by Day & Service"):
+        day_col, service_col = st.columns(2)
+        with day_col:
+            st.caption("Bookings per Day")
+            st.bar_chart(pd.Series(stats.get("date", {}), name="Bookings"))
+        with service_col:
+            st.caption("Bookings per Service")
+            st.bar_chart(pd.Series(stats.get("booking_type", {}), name="Bookings"))
+
+    # 4. Data Table
+    df, next_before_id = get_bookings_page(search, date, cursors[-1])
     st.subheader("Booking Records")
     # precise column config for better UI
     st.dataframe(
-        df, 
+        df,
         use_container_width=True,
         hide_index=True,
         column_config={
@@ -86,6 +113,58 @@ def show_dashboard():
         }
     )
 
-    # 6. Refresh Button (Manual refresh in case of new bookings)
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+    if prev_col.button("⬅️ Previous", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    page_col.caption(f"Page {len(cursors)}")
+    if next_col.button("Next ➡️", disabled=next_before_id is None):
+        cursors.append(next_before_id)
+        st.rerun()
+
+    # 5. Confirmation email outbox (not cached: the sender updates it in the background)
+    show_outbox_status()
+
+    # 6. Per-stage chat latency from the trace store
+    show_latency_panel()
+
+    # 7. Refresh Button (Manual refresh in case of new bookings)
     if st.button("🔄 Refresh Data"):
-        st.rerun()
\ No newline at end of file
+        st.rerun()
+
+def show_outbox_status():
+    """Pending / sent / dead-lettered confirmation emails, with recent failures."""
+    counts, columns, failures = outbox_status()
+    with st.expander(f"📧 Email Outbox ({counts.get('dead', 0)} dead-lettered)"):
+        o1, o2, o3, o4 = st.columns(4)
+        o1.metric("Pending", counts.get("pending", 0))
+        o2.metric("Sending", counts.get("sending", 0))
+        o3.metric("Sent", counts.get("sent", 0))
+        o4.metric("Dead", counts.get("dead", 0))
+        if failures:
+            st.caption("Recent failures")
+            st.dataframe(pd.DataFrame(failures, columns=columns), use_container_width=True, hide_index=True)
+        if counts.get("dead") and st.button("♻️ Retry Dead-Lettered Emails"):
+            requeue_dead_emails()
+            st.rerun()
+
+def show_latency_panel():
+    """p50 / p95 / p99 per chat stage and the slowest recent turns, from the trace store."""
+    with st.expander("⏱️ Chat Latency"):
+        window = st.selectbox("Window", list(LATENCY_WINDOWS), key="latency_window")
+        since = time.time() - LATENCY_WINDOWS[window] * 3600
+        # Only the newest spans of the window are read (capped in SQL)
+        columns, stages = stage_percentiles(since)
+        if not stages:
+            st.caption("No traced turns in this window yet.")
+            return
+
+        summary = pd.DataFrame(stages, columns=columns).set_index("Stage")
+        st.dataframe(summary, use_container_width=True)
+        if summary["Count"].sum() >= TRACE_DASHBOARD_MAX_SPANS:
+            st.caption(f"Based on the newest {TRACE_DASHBOARD_MAX_SPANS:,} spans in this window.")
+
+        columns, turns = slowest_turns(since)
+        if turns:
+            st.caption("Slowest turns")
+            st.dataframe(pd.DataFrame(turns, columns=columns), use_container_width=True, hide_index=True)
@@ -0,0 +1,204 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+from app.config import (
+    INDEX_BACKEND, INDEX_MIN_TRAIN_VECTORS, INDEX_NLIST, INDEX_NPROBE,
+    INDEX_HNSW_M, INDEX_EF_CONSTRUCTION, INDEX_EF_SEARCH, INDEX_PQ_M,
+)
+
+BACKENDS = ("flat", "ivf", "hnsw", "ivfpq", "sq")
+
+
+# --- 1. BUILDING ---
+def ann_params(backend=INDEX_BACKEND):
+    """Settings that change how the search index is built (part of its cache key)."""
+    params = {"backend": backend, "min_train": INDEX_MIN_TRAIN_VECTORS}
+    if backend in ("ivf", "ivfpq"):
+        params["nlist"] = INDEX_NLIST
+    if backend == "ivfpq":
+        params["pq_m"] = INDEX_PQ_M
+    if backend == "hnsw":
+        params.update(m=INDEX_HNSW_M, ef_construction=INDEX_EF_CONSTRUCTION)
+    return params
+
+def _nlist(n):
+    # ~39 training points per centroid is the least faiss trains well with
+    nlist = INDEX_NLIST or int(4 * math.sqrt(n))
+    return max(1, min(nlist, n // 39))
+
+def _pq_m(dim):
+    """Largest sub-quantizer count <= INDEX_PQ_M that divides the dimension."""
+    return max(m for m in range(1, min(INDEX_PQ_M, dim) + 1) if dim % m == 0)
+
+def build_index(vectors, backend=INDEX_BACKEND):
+    """
+    A trained, populated faiss index over `vectors` (float32, L2 metric like
+    LangChain's default flat index). Returns (index, backend actually used):
+    approximate backends fall back to flat below INDEX_MIN_TRAIN_VECTORS.
+    """
+    import faiss
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown index backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    # PQ trains a 256-entry codebook per sub-quantizer, so it needs at least that many vectors
+    if backend != "flat" and n < max(INDEX_MIN_TRAIN_VECTORS, 256 if backend == "ivfpq" else 0):
+        backend = "flat"
+
+    if backend == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif backend == "ivf":
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, _nlist(n))
+    elif backend == "ivfpq":
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, _nlist(n), _pq_m(dim), 8)
+    elif backend == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, INDEX_HNSW_M)
+        index.hnsw.efConstruction = INDEX_EF_CONSTRUCTION
+    else:
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    set_search_params(index)
+    return index, backend
+
+def set_search_params(index, nprobe=INDEX_NPROBE, ef_search=INDEX_EF_SEARCH):
+    """Apply the recall/latency knobs: `nprobe` for IVF indexes, `efSearch` for HNSW."""
+    import faiss
+
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass  # not an IVF index
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+
+def index_backend(index):
+    """Name of the backend a faiss index was built with."""
+    name = type(index).__name__
+    return {
+        "IndexIVFFlat": "ivf", "IndexIVFPQ": "ivfpq", "IndexHNSWFlat": "hnsw",
+        "IndexScalarQuantizer": "sq",
+    }.get(name, "flat")
+
+def build_search_store(flat_store, backend=INDEX_BACKEND):
+    """
+    A FAISS vector store searching `flat_store`'s chunks with the configured
+    backend. The flat store stays the source of truth (it supports merging and
+    deleting documents); the approximate copy shares its docstore and is rebuilt
+    after every change. Returns `flat_store` itself when no ANN index is needed.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    if backend == "flat" or flat_store.index.ntotal < INDEX_MIN_TRAIN_VECTORS:
+        return flat_store
+    vectors = flat_store.index.reconstruct_n(0, flat_store.index.ntotal)
+    index, used = build_index(vectors, backend)
+    if used == "flat":
+        return flat_store
+    return FAISS(
+        embedding_function=flat_store.embedding_function,
+        index=index,
+        docstore=flat_store.docstore,
+        index_to_docstore_id=dict(flat_store.index_to_docstore_id),
+        distance_strategy=flat_store.distance_strategy,
+    )
+
+
+# --- 2. RECALL / LATENCY REPORT ---
+DEFAULT_SWEEP = [
+    ("flat", {}),
+    ("ivf", {"nprobe": 1}), ("ivf", {"nprobe": 4}), ("ivf", {"nprobe": 16}), ("ivf", {"nprobe": 64}),
+    ("hnsw", {"ef_search": 16}), ("hnsw", {"ef_search": 64}), ("hnsw", {"ef_search": 256}),
+    ("ivfpq", {"nprobe": 8}), ("ivfpq", {"nprobe": 32}),
+    ("sq", {}),
+]
+
+def recall_report(vectors, queries, k=10, sweep=DEFAULT_SWEEP):
+    """
+    Recall@k against exact flat search, mean single-query latency and index
+    size for each (backend, knobs) in `sweep`. Indexes are built once per
+    backend; the knobs only change search time.
+    """
+    import faiss
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    built, rows = {}, []
+    for backend, knobs in sweep:
+        if backend not in built:
+            started = time.perf_counter()
+            built[backend] = build_index(vectors, backend) + (time.perf_counter() - started,)
+        index, used, build_seconds = built[backend]
+        set_search_params(index, knobs.get("nprobe", INDEX_NPROBE), knobs.get("ef_search", INDEX_EF_SEARCH))
+
+        started = time.perf_counter()
+        found = np.vstack([index.search(q[None, :], k)[1] for q in queries])
+        latency_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        rows.append({
+            "backend": used,
+            "knobs": ", ".join(f"{key}={value}" for key, value in knobs.items()) or "-",
+            "recall_at_k": round(float(recall), 4),
+            "latency_ms": round(latency_ms, 4),
+            "build_s": round(build_seconds, 3),
+            "size_mb": round(faiss.serialize_index(index).nbytes / 1024 / 1024, 2),
+        })
+    return rows
+
+def format_report(rows, k):
+    header = f"{'backend':<8} {'knobs':<14} {'recall@' + str(k):>10} {'ms/query':>10} {'build s':>9} {'size MB':>9}"
+    lines = [header, "-" * len(header)]
+    for r in rows:
+        lines.append(f"{r['backend']:<8} {r['knobs']:<14} {r['recall_at_k']:>10.4f} {r['latency_ms']:>10.4f} "
+                     f"{r['build_s']:>9.3f} {r['size_mb']:>9.2f}")
+    return "\n".join(lines)
+
+
+def main():
+    """
+    Compare backends on a folder of PDFs (or synthetic vectors). Queries are
+    corpus vectors with a little Gaussian noise, held to the same k.
+    """
+    parser = argparse.ArgumentParser(description="Recall vs latency of the ANN index backends.")
+    parser.add_argument("--pdf-dir", help="Folder of PDFs to index (default: synthetic vectors)")
+    parser.add_argument("--synthetic", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384, help="Synthetic vector dimension")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.pdf_dir:
+        from app.knowledge_base import KnowledgeBase
+
+        kb = KnowledgeBase(backend="flat")
+        kb.add_directory(args.pdf_dir)
+        index = kb.flat_store.index
+        vectors = index.reconstruct_n(0, index.ntotal)
+    else:
+        # Clustered data, closer to real embeddings than uniform noise
+        centers = rng.normal(size=(64, args.dim))
+        vectors = centers[rng.integers(0, 64, args.synthetic)] + 0.5 * rng.normal(size=(args.synthetic, args.dim))
+    vectors = vectors.astype(np.float32)
+
+    picks = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    noise = 0.05 * vectors.std() * rng.normal(size=(len(picks), vectors.shape[1]))
+    queries = (vectors[picks] + noise).astype(np.float32)
+
+    print(f"{len(vectors)} vectors, {len(queries)} queries, dim {vectors.shape[1]}")
+    print(format_report(recall_report(vectors, queries, args.k), args.k))
+
+
+if __name__ == "__main__":
+    main()
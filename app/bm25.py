@@ -0,0 +1,187 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from app.config import BM25_K1, BM25_B
+
+BM25_FILE = "bm25.json"
+# Keeps codes like "ds-101", "week3" or "v2.1" as single terms
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Inverted index over chunk texts, keyed by the same docstore ids as the
+    FAISS index. Postings are built once at ingestion and persisted next to
+    the vector index, so a query only touches the postings of its own terms.
+    """
+
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        # term -> {chunk_id: term frequency}
+        self.postings = {}
+        # chunk_id -> number of terms
+        self.lengths = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    # Building
+    def add(self, ids, texts):
+        for chunk_id, text in zip(ids, texts):
+            terms = Counter(tokenize(text))
+            self.lengths[chunk_id] = sum(terms.values())
+            self.total_length += self.lengths[chunk_id]
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[chunk_id] = tf
+
+    def remove(self, ids):
+        ids = set(ids) & self.lengths.keys()
+        if not ids:
+            return
+        for term in list(self.postings):
+            chunks = self.postings[term]
+            for chunk_id in ids & chunks.keys():
+                del chunks[chunk_id]
+            if not chunks:
+                del self.postings[term]
+        for chunk_id in ids:
+            self.total_length -= self.lengths.pop(chunk_id)
+
+    def merge_from(self, other):
+        for term, chunks in other.postings.items():
+            self.postings.setdefault(term, {}).update(chunks)
+        self.lengths.update(other.lengths)
+        self.total_length += other.total_length
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        """Index every chunk of a FAISS store (no embedding needed)."""
+        index = cls()
+        ids = list(vectorstore.index_to_docstore_id.values())
+        index.add(ids, (vectorstore.docstore.search(chunk_id).page_content for chunk_id in ids))
+        return index
+
+    # Querying
+    def search(self, query, k):
+        """Top-k (chunk_id, score) pairs for `query`, best first."""
+        n = len(self.lengths)
+        if not n:
+            return []
+        avgdl = self.total_length / n
+        scores = Counter()
+        for term in set(tokenize(query)):
+            chunks = self.postings.get(term)
+            if not chunks:
+                continue
+            idf = math.log(1 + (n - len(chunks) + 0.5) / (len(chunks) + 0.5))
+            for chunk_id, tf in chunks.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / avgdl)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores.most_common(k)
+
+    # Persistence (JSON, so loading never unpickles anything)
+    def save(self, directory):
+        with open(os.path.join(directory, BM25_FILE), "w") as f:
+            json.dump({"k1": self.k1, "b": self.b, "postings": self.postings, "lengths": self.lengths}, f)
+
+    @classmethod
+    def load(cls, directory):
+        """The index saved in `directory`, or None if there is none."""
+        try:
+            with open(os.path.join(directory, BM25_FILE)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        index = cls(data["k1"], data["b"])
+        index.postings = data["postings"]
+        index.lengths = data["lengths"]
+        index.total_length = sum(index.lengths.values())
+        return index
+
+
+class MappedBM25Index:
+    """
+    Read-only BM25 over chunks identified by index position, stored as CSR
+    arrays (term -> slice of positions and term frequencies) that are
+    memory-mapped, so processes searching the same published knowledge base
+    share the postings. Scores match BM25Index.
+    """
+
+    VOCAB_FILE = "bm25_vocab.json"
+    ARRAYS = ("term_offsets", "positions", "tfs", "lengths")
+
+    def __init__(self, directory, mmap=True):
+        with open(os.path.join(directory, self.VOCAB_FILE)) as f:
+            data = json.load(f)
+        self.k1 = data["k1"]
+        self.b = data["b"]
+        self.vocab = {term: i for i, term in enumerate(data["terms"])}
+        for name in self.ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, f"bm25_{name}.npy"), mmap_mode="r" if mmap else None))
+        # At least 1, so chunks without any tokens cannot make the length normalisation divide by zero
+        self.avgdl = max(float(self.lengths.sum()) / len(self.lengths) if len(self.lengths) else 0.0, 1.0)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    @classmethod
+    def write(cls, directory, texts, k1=BM25_K1, b=BM25_B):
+        """Index `texts` (position i is chunk id str(i)) into `directory`."""
+        postings = {}
+        lengths = []
+        for position, text in enumerate(texts):
+            terms = Counter(tokenize(text))
+            lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                postings.setdefault(term, []).append((position, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        flat = [entry for term in terms for entry in postings[term]]
+        arrays = {
+            "term_offsets": offsets,
+            "positions": np.array([p for p, _ in flat], dtype=np.int32),
+            "tfs": np.array([tf for _, tf in flat], dtype=np.int32),
+            "lengths": np.array(lengths, dtype=np.int32),
+        }
+        for name in cls.ARRAYS:
+            np.save(os.path.join(directory, f"bm25_{name}.npy"), arrays[name])
+        with open(os.path.join(directory, cls.VOCAB_FILE), "w") as f:
+            json.dump({"k1": k1, "b": b, "terms": terms}, f)
+
+    def search(self, query, k):
+        """Top-k (chunk_id, score) pairs for `query`, best first."""
+        n = len(self.lengths)
+        if not n:
+            return []
+        positions, scores = [], []
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            start, end = self.term_offsets[t], self.term_offsets[t + 1]
+            chunks = self.positions[start:end]
+            tf = self.tfs[start:end].astype(np.float64)
+            df = end - start
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[chunks] / self.avgdl)
+            positions.append(chunks)
+            scores.append(idf * tf * (self.k1 + 1) / (tf + norm))
+        if not positions:
+            return []
+        unique, inverse = np.unique(np.concatenate(positions), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+        best = np.argsort(-totals, kind="stable")[:k]
+        return [(str(int(unique[i])), float(totals[i])) for i in best]
@@ -1,45 +1,342 @@
+import json
+import re
+from datetime import date, datetime, timedelta
+from typing import Optional
+
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
 
+from app.chains import get_chain
+from app.config import (
+    BOOKING_TYPES, SLOT_MINUTES, SLOT_DAY_START_HOUR, SLOT_DAY_END_HOUR,
+    SLOT_SUGGESTIONS, SLOT_SEARCH_DAYS,
+)
+from app.llm_gateway import get_gateway
+from db.database import slot_key, is_slot_free, booked_slots
+
+# Slots in the order we ask for them
+FIELDS = ["name", "email", "phone", "booking_type", "date", "time"]
+FIELD_LABELS = {
+    "name": "Name", "email": "Email", "phone": "Phone",
+    "booking_type": "Booking Type", "date": "Date", "time": "Time",
+}
+
 # Define the structure we want the LLM to return
 class BookingState(BaseModel):
-    name: str = Field(description="Customer name, or null if missing")
-    email: str = Field(description="Customer email, or null if missing")
-    phone: str = Field(description="Customer phone, or null if missing")
-    booking_type: str = Field(description="Type of service (e.g., Mock Interview), or null if missing")
-    date: str = Field(description="Preferred date (YYYY-MM-DD), or null if missing")
-    time: str = Field(description="Preferred time, or null if missing")
-    missing_fields: list = Field(description="List of fields that are still missing")
-
-def extract_booking_details(chat_history, llm):
-    # This prompt asks the LLM to look at history and extract JSON
-    parser = JsonOutputParser(pydantic_object=BookingState)
-    
-    prompt = PromptTemplate(
-        template="""
-        You are a booking assistant. Analyze the conversation history and extract the following booking details:
-        Name, Email, Phone, Booking Type, Date, Time.
-        
-        Current Conversation History:
-        {history}
-        
-        Return a JSON object with the extracted fields. If a field is not mentioned, set it to null.
-        Also list which fields are strictly missing from the requirements.
-        
-        {format_instructions}
-        """,
-        input_variables=["history"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
-    )
-    
-    chain = prompt | llm | parser
-    
-    # Convert list of messages to string for the prompt
-    history_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in chat_history])
-    
+    name: Optional[str] = Field(default=None, description="Customer name, or null if missing")
+    email: Optional[str] = Field(default=None, description="Customer email, or null if missing")
+    phone: Optional[str] = Field(default=None, description="Customer phone, or null if missing")
+    booking_type: Optional[str] = Field(default=None, description="Type of service (e.g., Mock Interview), or null if missing")
+    date: Optional[str] = Field(default=None, description="Preferred date (YYYY-MM-DD), or null if missing")
+    time: Optional[str] = Field(default=None, description="Preferred time, or null if missing")
+
+
+# --- 1. LOCAL PARSERS ---
+MONTHS = {m: i + 1 for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+)}
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_MONTH = r"(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+NUMERIC_DATE_RE = re.compile(r"\b(\d{1,2})[/.](\d{1,2})[/.](\d{2,4})\b")
+# "10/11" without a year; slash only, so "10.30am" stays a time
+SHORT_NUMERIC_DATE_RE = re.compile(r"\b(\d{1,2})/(\d{1,2})\b(?!/)")
+DAY_MONTH_RE = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?(?:\s+of)?\s+" + _MONTH + r"(?:,?\s+(\d{4}))?", re.I)
+MONTH_DAY_RE = re.compile(r"\b" + _MONTH + r"\s+(\d{1,2})(?:st|nd|rd|th)?(?:,?\s+(\d{4}))?\b", re.I)
+RELATIVE_DATE_RE = re.compile(r"\b(day after tomorrow|tomorrow|today)\b", re.I)
+WEEKDAY_RE = re.compile(r"\b(?:next\s+|this\s+|on\s+)?(" + "|".join(WEEKDAYS) + r")\b", re.I)
+TIME_12H_RE = re.compile(r"\b(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)", re.I)
+TIME_24H_RE = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b")
+NOON_RE = re.compile(r"\b(noon|midday)\b", re.I)
+PHONE_RE = re.compile(r"\+?\d[\d\s().-]{8,}\d")
+NAME_RE = re.compile(r"\b(?:my name is|name is|name:|this is|i am|i'm|call me)\s+([A-Za-z][A-Za-z'.-]*(?:\s+[A-Za-z][A-Za-z'.-]*){0,3})", re.I)
+BOOKING_TYPE_RES = {
+    "Mock Interview": re.compile(r"\b(mock\s+interview|interview\s+practice|interview)\b", re.I),
+    "Code Review": re.compile(r"\b(code\s+review|review\s+my\s+code)\b", re.I),
+    "Career Guidance": re.compile(r"\b(career\s+guidance|career\s+advice|career\s+counsel\w*|career)\b", re.I),
+}
+
+# Words that carry no slot information; a message made only of these never needs the LLM
+FILLER_WORDS = {
+    "i", "want", "to", "book", "a", "an", "the", "session", "please", "my", "is", "for", "at", "on",
+    "and", "hi", "hello", "hey", "mentorship", "would", "like", "can", "you", "me", "it", "of", "in",
+    "email", "phone", "number", "date", "time", "name", "its", "it's", "i'd", "schedule", "need",
+    "with", "mentor", "be", "next", "this", "sure", "ok", "okay", "thanks", "thank", "am", "pm",
+}
+# Answers to the confirmation question
+CONFIRM_WORDS = ["yes", "y", "confirm", "ok", "sure"]
+CANCEL_WORDS = ["no", "cancel", "stop"]
+# A bare reply made only of these is an answer or a greeting, never a name
+NOT_A_NAME = FILLER_WORDS | set(CONFIRM_WORDS) | set(CANCEL_WORDS) | {"yeah", "yep", "nope", "nah", "thx", "i'm", "im"}
+NAME_STOP_WORDS = {
+    "and", "my", "email", "phone", "i", "want", "from", "here", "with", "would", "to", "please",
+    "at", "on", "by", "via", "for", "in",
+}
+
+def _safe_date(year, month, day):
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+def _upcoming(month, day, year=None):
+    """Resolve a day/month without a year to its next occurrence."""
+    today = date.today()
+    if year:
+        return _safe_date(int(year), month, day)
+    candidate = _safe_date(today.year, month, day)
+    if candidate and candidate < today:
+        candidate = _safe_date(today.year + 1, month, day)
+    return candidate
+
+def parse_date(text):
+    """Return (YYYY-MM-DD, span) for the first date found in `text`, or (None, None)."""
+    today = date.today()
+
+    m = ISO_DATE_RE.search(text)
+    if m:
+        d = _safe_date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+        if d:
+            return d.isoformat(), m.span()
+
+    m = NUMERIC_DATE_RE.search(text)
+    if m:
+        # Day-first, as written by our users (e.g. 05/03/2025 is 5 March)
+        year = int(m.group(3))
+        d = _safe_date(year + 2000 if year < 100 else year, int(m.group(2)), int(m.group(1)))
+        if d:
+            return d.isoformat(), m.span()
+
+    m = SHORT_NUMERIC_DATE_RE.search(text)
+    if m:
+        d = _upcoming(int(m.group(2)), int(m.group(1)))
+        if d:
+            return d.isoformat(), m.span()
+
+    m = DAY_MONTH_RE.search(text)
+    if m:
+        d = _upcoming(MONTHS[m.group(2).lower()[:3]], int(m.group(1)), m.group(3))
+        if d:
+            return d.isoformat(), m.span()
+
+    m = MONTH_DAY_RE.search(text)
+    if m:
+        d = _upcoming(MONTHS[m.group(1).lower()[:3]], int(m.group(2)), m.group(3))
+        if d:
+            return d.isoformat(), m.span()
+
+    m = RELATIVE_DATE_RE.search(text)
+    if m:
+        offset = {"today": 0, "tomorrow": 1, "day after tomorrow": 2}[m.group(1).lower()]
+        return (today + timedelta(days=offset)).isoformat(), m.span()
+
+    m = WEEKDAY_RE.search(text)
+    if m:
+        days_ahead = (WEEKDAYS.index(m.group(1).lower()) - today.weekday()) % 7 or 7
+        return (today + timedelta(days=days_ahead)).isoformat(), m.span()
+
+    return None, None
+
+def parse_time(text):
+    """Return (HH:MM in 24h, span) for the first time found in `text`, or (None, None)."""
+    m = TIME_12H_RE.search(text)
+    if m:
+        hour, minute = int(m.group(1)), int(m.group(2) or 0)
+        if 1 <= hour <= 12 and minute < 60:
+            if m.group(3).lower().startswith("p") and hour != 12:
+                hour += 12
+            elif m.group(3).lower().startswith("a") and hour == 12:
+                hour = 0
+            return f"{hour:02d}:{minute:02d}", m.span()
+
+    m = TIME_24H_RE.search(text)
+    if m:
+        return f"{int(m.group(1)):02d}:{m.group(2)}", m.span()
+
+    m = NOON_RE.search(text)
+    if m:
+        return "12:00", m.span()
+
+    return None, None
+
+def parse_phone(text):
+    for m in PHONE_RE.finditer(text):
+        digits = re.sub(r"\D", "", m.group(0))
+        if 10 <= len(digits) <= 15:
+            return m.group(0).strip(), m.span()
+    return None, None
+
+def parse_name(text):
+    m = NAME_RE.search(text)
+    if not m:
+        return None, None
+    words = []
+    for word in m.group(1).split():
+        if word.lower() in NAME_STOP_WORDS or word.lower() in NOT_A_NAME:
+            break
+        words.append(word)
+    # "this is urgent" / "I'm interested..." are not names: the first word must be capitalised
+    if not words or not words[0][0].isupper():
+        return None, None
+    return " ".join(w.capitalize() for w in words), m.span()
+
+def parse_booking_type(text):
+    for booking_type in BOOKING_TYPES:
+        pattern = BOOKING_TYPE_RES.get(booking_type)
+        m = pattern.search(text) if pattern else None
+        if m:
+            return booking_type, m.span()
+    return None, None
+
+def parse_local_details(message, asking_for=None):
+    """
+    Fill what we can deterministically. Returns (details, leftover) where
+    `leftover` is the message with every matched span blanked out.
+    """
+    details = {}
+    leftover = message
+
+    def take(field, value, span):
+        nonlocal leftover
+        if value:
+            details[field] = value
+            leftover = leftover[:span[0]] + " " * (span[1] - span[0]) + leftover[span[1]:]
+
+    # Order matters: email and date/time first so their digits are not read as a phone number
+    m = EMAIL_RE.search(leftover)
+    if m:
+        take("email", m.group(0), m.span())
+    take("date", *parse_date(leftover))
+    take("time", *parse_time(leftover))
+    take("phone", *parse_phone(leftover))
+    take("booking_type", *parse_booking_type(leftover))
+    take("name", *parse_name(leftover))
+
+    # A short bare reply to "what is your name?" is the name itself ("yes", "ok" or "hi" is not)
+    if asking_for == "name" and "name" not in details:
+        words = leftover.split()
+        if 1 <= len(words) <= 4 and all(w.replace("-", "").replace("'", "").isalpha() for w in words):
+            # "hi, Asha" / "sure Asha Rao": drop the lead-in and keep the rest
+            while words and words[0].lower() in NOT_A_NAME:
+                words.pop(0)
+            if words:
+                take("name", " ".join(w.capitalize() for w in words), (0, len(leftover)))
+
+    return details, leftover
+
+def _has_unparsed_content(leftover):
+    words = re.findall(r"[a-z0-9']+", leftover.lower())
+    return any(w not in FILLER_WORDS for w in words)
+
+def missing_fields(details):
+    return [field for field in FIELDS if not details.get(field)]
+
+
+# --- 2. LLM FALLBACK (built once, reused every turn) ---
+_parser = JsonOutputParser(pydantic_object=BookingState)
+_prompt = PromptTemplate(
+    template="""
+    You are a booking assistant. Extract booking details from the user's latest message.
+
+    Details already collected: {known}
+    Fields still missing: {missing}
+
+    Latest user message: {message}
+
+    Return a JSON object with the missing fields you can find in the latest message.
+    If a field is not mentioned, set it to null. Dates must be YYYY-MM-DD.
+
+    {format_instructions}
+    """,
+    input_variables=["known", "missing", "message"],
+    partial_variables={"format_instructions": _parser.get_format_instructions()},
+)
+
+def extract_booking_details(user_message, known_details, llm, asking_for=None):
+    """
+    Return the booking slots newly filled by `user_message`.
+    Local parsers run first; the LLM only sees the latest message plus the
+    slots already known, and only when unparsed text could fill a missing slot.
+    """
+    found, leftover = parse_local_details(user_message, asking_for)
+    missing = [f for f in missing_fields(known_details) if f not in found]
+
+    if not missing or not _has_unparsed_content(leftover):
+        return found
+
+    chain = get_chain("booking", lambda model: _prompt | model | _parser, llm)
+    known = {k: v for k, v in {**known_details, **found}.items() if v}
     try:
-        result = chain.invoke({"history": history_str})
-        return result
-    except Exception as e:
-        return None
\ No newline at end of file
+        result = get_gateway().invoke(chain, {
+            "known": json.dumps(known),
+            "missing": ", ".join(missing),
+            "message": user_message,
+        })
+    except Exception:
+        return found
+
+    for field in missing:
+        value = result.get(field) if isinstance(result, dict) else None
+        if not value or str(value).lower() in ("null", "none"):
+            continue
+        value = str(value).strip()
+        # Normalise LLM dates and times the same way as local ones
+        if field == "date":
+            value = parse_date(value)[0] or value
+        elif field == "time":
+            value = parse_time(value)[0] or value
+        found[field] = value
+    return found
+
+
+# --- 3. SLOT AVAILABILITY ---
+def _day_slots(day):
+    """Every bookable slot start on `day`, in order."""
+    start = datetime.combine(day, datetime.min.time()).replace(hour=SLOT_DAY_START_HOUR)
+    end = start.replace(hour=SLOT_DAY_END_HOUR)
+    while start + timedelta(minutes=SLOT_MINUTES) <= end:
+        yield start
+        start += timedelta(minutes=SLOT_MINUTES)
+
+def is_bookable(start, now=None):
+    """On the slot grid, inside mentor hours and in the future."""
+    now = now or datetime.now()
+    return start > now and start in set(_day_slots(start.date()))
+
+def next_free_slots(resource, after, n=SLOT_SUGGESTIONS):
+    """
+    The first `n` free slots for `resource` strictly after `after`. Each day
+    costs one range scan over the slot index, and the search stops after
+    SLOT_SEARCH_DAYS.
+    """
+    free = []
+    for offset in range(SLOT_SEARCH_DAYS + 1):
+        day = after.date() + timedelta(days=offset)
+        taken = set(booked_slots(resource, f"{day.isoformat()} 00:00", f"{(day + timedelta(days=1)).isoformat()} 00:00"))
+        for start in _day_slots(day):
+            if start > after and start.strftime("%Y-%m-%d %H:%M") not in taken:
+                free.append(start)
+                if len(free) == n:
+                    return free
+    return free
+
+def check_availability(details):
+    """
+    Return (available, alternatives) for the slot in `details`. When the slot
+    is taken, off the grid or unparseable, `alternatives` holds the next free
+    slots as "YYYY-MM-DD at HH:MM" strings the user can reply with.
+    """
+    key = slot_key(details.get("date"), details.get("time"))
+    now = datetime.now()
+    if key:
+        start = datetime.strptime(key, "%Y-%m-%d %H:%M")
+        if is_bookable(start, now) and is_slot_free(details["booking_type"], key):
+            return True, []
+        after = max(start, now)
+    else:
+        after = now
+    alternatives = next_free_slots(details["booking_type"], after)
+    return False, [f"{s:%Y-%m-%d} at {s:%H:%M}" for s in alternatives]
@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+
+from langchain_core.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+
+from app.config import CHAIN_REGISTRY_SIZE, HYBRID_RETRIEVAL, RETRIEVAL_K
+from app.retrieval import HybridRetriever, LayeredRetriever
+from app.context import context_for_prompt, log_prompt_tokens
+
+_registry = OrderedDict()
+_registry_lock = threading.Lock()
+
+RAG_PROMPT = PromptTemplate.from_template(
+    """Answer the question based only on the following context:
+    {context}
+
+    Question: {question}
+    """
+)
+
+
+# --- 1. REGISTRY ---
+def get_chain(name, builder, *deps):
+    """
+    Compile `builder(*deps)` once per (name, deps) and reuse it across turns
+    and sessions. Entries hold a reference to their deps, so an object's id
+    cannot be recycled while its chain is cached.
+    """
+    key = (name,) + tuple(id(dep) for dep in deps)
+    with _registry_lock:
+        entry = _registry.get(key)
+        if entry is not None:
+            _registry.move_to_end(key)
+            return entry[1]
+
+    chain = builder(*deps)
+    with _registry_lock:
+        _registry[key] = (deps, chain)
+        _registry.move_to_end(key)
+        while len(_registry) > CHAIN_REGISTRY_SIZE:
+            _registry.popitem(last=False)
+    return chain
+
+
+# --- 2. CHAINS ---
+def _keyword_index(bm25):
+    return bm25 if HYBRID_RETRIEVAL and bm25 is not None and len(bm25) else None
+
+def _rag_chain(llm, retriever):
+    return (
+        {"context": retriever | RunnableLambda(context_for_prompt), "question": RunnablePassthrough()}
+        | RAG_PROMPT
+        | RunnableLambda(log_prompt_tokens)
+        | llm
+        | StrOutputParser()
+    )
+
+def _build_rag_chain(llm, vectorstore, bm25):
+    if _keyword_index(bm25) is not None:
+        retriever = HybridRetriever(vectorstore=vectorstore, bm25=bm25)
+    else:
+        retriever = vectorstore.as_retriever(search_kwargs={"k": RETRIEVAL_K})
+    return _rag_chain(llm, retriever)
+
+def _build_layered_rag_chain(llm, *stores):
+    # stores is vectorstore, bm25, vectorstore, bm25, ... so the registry keys on each of them
+    layers = [(vectorstore, _keyword_index(bm25)) for vectorstore, bm25 in zip(stores[::2], stores[1::2])]
+    return _rag_chain(llm, LayeredRetriever(layers=layers))
+
+def get_rag_chain(llm, vectorstore, bm25=None):
+    return get_chain("rag", _build_rag_chain, llm, vectorstore, bm25)
+
+def get_layered_rag_chain(llm, layers):
+    """RAG chain over several knowledge bases at once, fused with reciprocal rank fusion."""
+    stores = [store for kb in layers for store in (kb.vectorstore, kb.bm25)]
+    return get_chain("layered_rag", _build_layered_rag_chain, llm, *stores)
@@ -1,19 +1,159 @@
+import re
+import threading
+from collections import OrderedDict
+
 from langchain_core.prompts import ChatPromptTemplate
 
+from app.chains import get_chain
+from app.llm_gateway import get_gateway
+from app.config import INTENT_CACHE_SIZE, INTENT_USE_EMBEDDINGS, INTENT_MIN_SIMILARITY, INTENT_MIN_MARGIN
+
+# --- 1. RULES ---
+BOOKING_PATTERNS = re.compile(
+    r"\b(book|booking|schedule|scheduling|reschedule|reserve|appointment|sign me up|set up a (session|call|meeting))\b"
+)
+QUERY_PATTERNS = re.compile(
+    r"^(hi|hello|hey|thanks|thank you|good (morning|afternoon|evening))\b"
+    r"|^(what|who|why|where|which|tell me|explain|describe)\b"
+)
+
+# --- 2. NEAREST-CENTROID EXAMPLES ---
+INTENT_EXAMPLES = {
+    "BOOKING": [
+        "I want to book a mentorship session",
+        "Can I schedule a mock interview for next Monday?",
+        "I'd like a code review session tomorrow at 5pm",
+        "Please reserve a career guidance slot for me",
+        "Set up a meeting with a mentor on Friday",
+        "I need an appointment this week",
+        "Book me in for 10am on 2024-06-01",
+        "Can we fix a time for my interview practice?",
+    ],
+    "QUERY": [
+        "Hi there",
+        "What is covered in Week 1?",
+        "Who are the mentors?",
+        "What services do you offer?",
+        "How does the mentorship program work?",
+        "Explain the final project requirements",
+        "What topics are in the machine learning module?",
+        "Thanks, that was helpful",
+    ],
+}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_centroids = None
+_centroids_lock = threading.Lock()
+_stats = {"cache": 0, "rules": 0, "centroid": 0, "llm": 0}
+_stats_lock = threading.Lock()
+
+_llm_prompt = ChatPromptTemplate.from_template(
+    """
+    Classify the user's intent based on the latest message.
+    User Message: "{input}"
+
+    Respond with EXACTLY one word: "BOOKING" or "QUERY".
+    If they say "hi", "hello", or ask about services, classify as "QUERY".
+    If they mention scheduling, dates, or explicitly say "book", classify as "BOOKING".
+    """
+)
+
+
+# --- 3. TIERS ---
+def normalize_message(text):
+    return re.sub(r"\s+", " ", text.lower()).strip(" .!?")
+
+def _classify_rules(text):
+    is_booking = bool(BOOKING_PATTERNS.search(text))
+    is_query = bool(QUERY_PATTERNS.search(text))
+    if is_booking and not is_query:
+        return "BOOKING"
+    if is_query and not is_booking:
+        return "QUERY"
+    return None
+
+def _get_centroids():
+    """Label -> unit-length mean embedding of its examples, computed once per process."""
+    global _centroids
+    if _centroids is None:
+        with _centroids_lock:
+            if _centroids is None:
+                import numpy as np
+                from models.embeddings import get_embedding_service
+
+                service = get_embedding_service()
+                centroids = {}
+                for label, examples in INTENT_EXAMPLES.items():
+                    vectors = np.array(service.embed_documents(examples))
+                    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                    centroid = vectors.mean(axis=0)
+                    centroids[label] = centroid / np.linalg.norm(centroid)
+                _centroids = centroids
+    return _centroids
+
+def _classify_centroid(text):
+    import numpy as np
+    from models.embeddings import get_embedding_service, embedding_service_loaded, warm_up_embedding_service
+
+    if not embedding_service_loaded():
+        # Loading the model inside this user's turn would cost seconds: let the
+        # LLM answer now and load it in the background for later messages
+        warm_up_embedding_service()
+        return None
+    centroids = _get_centroids()
+    vector = np.array(get_embedding_service().embed_query(text))
+    vector /= np.linalg.norm(vector) or 1.0
+
+    scores = sorted(((float(vector @ c), label) for label, c in centroids.items()), reverse=True)
+    (best, label), (runner_up, _) = scores[0], scores[1]
+    if best >= INTENT_MIN_SIMILARITY and best - runner_up >= INTENT_MIN_MARGIN:
+        return label
+    return None
+
+def _classify_llm(user_input, llm):
+    chain = get_chain("intent", lambda model: _llm_prompt | model, llm)
+    response = get_gateway().invoke(chain, {"input": user_input})
+    return "BOOKING" if "BOOKING" in response.content.strip().upper() else "QUERY"
+
+
+# --- 4. ENTRY POINT ---
 def determine_intent(user_input, llm):
     """
     Decides if the user wants to 'book' something or just 'query' information.
+    Tries the LRU cache, keyword rules and embedding centroids before paying
+    for an LLM round trip.
     """
-    prompt = ChatPromptTemplate.from_template(
-        """
-        Classify the user's intent based on the latest message.
-        User Message: "{input}"
-        
-        Respond with EXACTLY one word: "BOOKING" or "QUERY".
-        If they say "hi", "hello", or ask about services, classify as "QUERY".
-        If they mention scheduling, dates, or explicitly say "book", classify as "BOOKING".
-        """
-    )
-    chain = prompt | llm
-    response = chain.invoke({"input": user_input})
-    return response.content.strip().upper()
\ No newline at end of file
+    key = normalize_message(user_input)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            _count("cache")
+            return _cache[key]
+
+    intent, tier = _classify_rules(key), "rules"
+    if intent is None and INTENT_USE_EMBEDDINGS:
+        try:
+            intent, tier = _classify_centroid(user_input), "centroid"
+        except Exception:
+            # Embedding model unavailable: fall through to the LLM
+            intent = None
+    if intent is None:
+        intent, tier = _classify_llm(user_input, llm), "llm"
+
+    _count(tier)
+    with _cache_lock:
+        _cache[key] = intent
+        _cache.move_to_end(key)
+        while len(_cache) > INTENT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return intent
+
+def _count(tier):
+    with _stats_lock:
+        _stats[tier] += 1
+
+def get_intent_stats():
+    """How many messages each tier (cache / rules / centroid / llm) answered."""
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,166 @@
+import os
+
+# --- 1. PATHS ---
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CACHE_DIR = os.getenv("PYSCHOLAR_CACHE_DIR", os.path.join(BASE_DIR, ".cache"))
+
+# --- 2. RAG / KNOWLEDGE BASE SETTINGS ---
+# Changing any of these invalidates previously cached indexes
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# --- 3. INDEX CACHE ---
+INDEX_CACHE_DIR = os.path.join(CACHE_DIR, "indexes")
+INDEX_CACHE_MAX_MB = int(os.getenv("PYSCHOLAR_INDEX_CACHE_MAX_MB", "500"))
+
+# --- 4. EMBEDDING SERVICE ---
+EMBED_BATCH_SIZE = int(os.getenv("PYSCHOLAR_EMBED_BATCH_SIZE", "64"))
+QUERY_BATCH_SIZE = int(os.getenv("PYSCHOLAR_QUERY_BATCH_SIZE", "32"))
+# How long the query worker waits for more concurrent queries before encoding
+QUERY_BATCH_WAIT_MS = float(os.getenv("PYSCHOLAR_QUERY_BATCH_WAIT_MS", "5"))
+QUERY_CACHE_SIZE = 256
+# Load the embedding model in a background thread at startup, so the first
+# PDF does not wait for it and the intent router can use embeddings from the first message
+EMBEDDING_WARMUP = os.getenv("PYSCHOLAR_EMBEDDING_WARMUP", "0") == "1"
+
+# --- 5. INGESTION ---
+# Chunks embedded and added to the index per step while streaming a PDF
+INGEST_BATCH_SIZE = int(os.getenv("PYSCHOLAR_INGEST_BATCH_SIZE", "64"))
+
+# --- 6. MULTI-DOCUMENT KNOWLEDGE BASE ---
+# Worker processes used to parse and split PDFs in parallel
+KB_WORKERS = int(os.getenv("PYSCHOLAR_KB_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Optional folder of PDFs registered into every new knowledge base
+KNOWLEDGE_DIR = os.getenv("PYSCHOLAR_KNOWLEDGE_DIR")
+
+# --- 7. INTENT CLASSIFIER ---
+INTENT_CACHE_SIZE = 1024
+INTENT_USE_EMBEDDINGS = os.getenv("PYSCHOLAR_INTENT_USE_EMBEDDINGS", "1") == "1"
+# Nearest-centroid answers only when the best match is this similar...
+INTENT_MIN_SIMILARITY = 0.35
+# ...and beats the other label by at least this margin; otherwise ask the LLM
+INTENT_MIN_MARGIN = 0.08
+
+# --- 8. BOOKING ---
+BOOKING_TYPES = ["Mock Interview", "Code Review", "Career Guidance"]
+
+# --- 9. RESPONSE STREAMING ---
+STREAM_RESPONSES = os.getenv("PYSCHOLAR_STREAM_RESPONSES", "1") == "1"
+
+# --- 10. SEMANTIC ANSWER CACHE ---
+SEMANTIC_CACHE_DB = os.path.join(CACHE_DIR, "semantic_cache.db")
+SEMANTIC_CACHE_ENABLED = os.getenv("PYSCHOLAR_SEMANTIC_CACHE", "1") == "1"
+# Cosine similarity above which a new question reuses a cached answer (its numbers and names must match too)
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("PYSCHOLAR_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL_HOURS = float(os.getenv("PYSCHOLAR_SEMANTIC_CACHE_TTL_HOURS", "24"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("PYSCHOLAR_SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+
+# --- 11. LLM CLIENT ---
+GROQ_MODEL = "llama-3.3-70b-versatile"
+# Keep-alive connections shared by every session talking to Groq
+GROQ_MAX_CONNECTIONS = int(os.getenv("PYSCHOLAR_GROQ_MAX_CONNECTIONS", "20"))
+GROQ_TIMEOUT_SECONDS = float(os.getenv("PYSCHOLAR_GROQ_TIMEOUT_SECONDS", "60"))
+# Compiled chains kept in the process-level chain registry
+CHAIN_REGISTRY_SIZE = 64
+
+# --- 12. LLM GATEWAY ---
+# "groq" for the real model, "stub" for the offline stand-in
+LLM_BACKEND = os.getenv("PYSCHOLAR_LLM_BACKEND", "groq")
+STUB_LATENCY_MS = float(os.getenv("PYSCHOLAR_STUB_LATENCY_MS", "50"))
+LLM_MAX_CONCURRENCY = int(os.getenv("PYSCHOLAR_LLM_MAX_CONCURRENCY", "8"))
+# Token bucket in front of Groq's per-minute request limit
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("PYSCHOLAR_LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_BURST = int(os.getenv("PYSCHOLAR_LLM_BURST", "5"))
+LLM_MAX_RETRIES = int(os.getenv("PYSCHOLAR_LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = 0.5
+LLM_BACKOFF_MAX_SECONDS = 8.0
+# A 429 whose Retry-After asks for a longer wait than this is not retried
+LLM_RETRY_AFTER_MAX_SECONDS = float(os.getenv("PYSCHOLAR_LLM_RETRY_AFTER_MAX_SECONDS", "60"))
+
+# --- 13. EMAIL OUTBOX ---
+# Point these at a local stand-in (e.g. `python -m aiosmtpd -n -l localhost:8025`
+# with PYSCHOLAR_SMTP_SSL=0 and only PYSCHOLAR_SMTP_USER set) to test without sending real mail
+SMTP_HOST = os.getenv("PYSCHOLAR_SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("PYSCHOLAR_SMTP_PORT", "465"))
+SMTP_USE_SSL = os.getenv("PYSCHOLAR_SMTP_SSL", "1") == "1"
+SMTP_TIMEOUT_SECONDS = float(os.getenv("PYSCHOLAR_SMTP_TIMEOUT_SECONDS", "20"))
+# An idle SMTP connection is closed after this long and reopened on demand
+SMTP_IDLE_SECONDS = float(os.getenv("PYSCHOLAR_SMTP_IDLE_SECONDS", "60"))
+# A connection unused for this long gets a NOOP before the next send; busier ones are trusted
+SMTP_PROBE_AFTER_SECONDS = float(os.getenv("PYSCHOLAR_SMTP_PROBE_AFTER_SECONDS", "10"))
+OUTBOX_BATCH_SIZE = int(os.getenv("PYSCHOLAR_OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_POLL_SECONDS = float(os.getenv("PYSCHOLAR_OUTBOX_POLL_SECONDS", "5"))
+# Attempts before an email is dead-lettered
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("PYSCHOLAR_OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_BASE_SECONDS = 30.0
+OUTBOX_BACKOFF_MAX_SECONDS = 3600.0
+# Claimed emails become due again if the sender dies before reporting back
+OUTBOX_LEASE_SECONDS = 300.0
+OUTBOX_RETENTION_DAYS = 30
+
+# --- 14. BOOKING SLOTS ---
+# Sessions start on a fixed grid inside mentor hours
+SLOT_MINUTES = int(os.getenv("PYSCHOLAR_SLOT_MINUTES", "60"))
+SLOT_DAY_START_HOUR = int(os.getenv("PYSCHOLAR_SLOT_DAY_START_HOUR", "9"))
+SLOT_DAY_END_HOUR = int(os.getenv("PYSCHOLAR_SLOT_DAY_END_HOUR", "18"))
+# Alternatives offered when the requested slot is unavailable
+SLOT_SUGGESTIONS = 3
+SLOT_SEARCH_DAYS = 14
+
+# --- 15. ANN INDEX ---
+# "flat" (exact), "ivf", "hnsw", "ivfpq" (product-quantized) or "sq" (8-bit scalar-quantized)
+INDEX_BACKEND = os.getenv("PYSCHOLAR_INDEX_BACKEND", "flat")
+# Approximate backends are only trained once the knowledge base has this many chunks
+INDEX_MIN_TRAIN_VECTORS = int(os.getenv("PYSCHOLAR_INDEX_MIN_TRAIN_VECTORS", "2000"))
+# IVF: number of clusters (0 = about 4 * sqrt(vectors)) and clusters probed per query
+INDEX_NLIST = int(os.getenv("PYSCHOLAR_INDEX_NLIST", "0"))
+INDEX_NPROBE = int(os.getenv("PYSCHOLAR_INDEX_NPROBE", "8"))
+# HNSW: graph degree, build-time and query-time beam widths
+INDEX_HNSW_M = int(os.getenv("PYSCHOLAR_INDEX_HNSW_M", "32"))
+INDEX_EF_CONSTRUCTION = int(os.getenv("PYSCHOLAR_INDEX_EF_CONSTRUCTION", "80"))
+INDEX_EF_SEARCH = int(os.getenv("PYSCHOLAR_INDEX_EF_SEARCH", "64"))
+# IVF-PQ: sub-quantizers per vector (rounded down to a divisor of the dimension)
+INDEX_PQ_M = int(os.getenv("PYSCHOLAR_INDEX_PQ_M", "16"))
+
+# --- 16. HYBRID RETRIEVAL ---
+# BM25 keyword search fused with vector search (reciprocal rank fusion)
+HYBRID_RETRIEVAL = os.getenv("PYSCHOLAR_HYBRID_RETRIEVAL", "1") == "1"
+RETRIEVAL_K = int(os.getenv("PYSCHOLAR_RETRIEVAL_K", "3"))
+# Candidates taken from each retriever before fusion
+RETRIEVAL_FETCH_K = int(os.getenv("PYSCHOLAR_RETRIEVAL_FETCH_K", "20"))
+RRF_K = 60
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# --- 17. CONTEXT ASSEMBLY ---
+# Retrieved text sent to the LLM per question, after merging overlaps
+CONTEXT_TOKEN_BUDGET = int(os.getenv("PYSCHOLAR_CONTEXT_TOKEN_BUDGET", "1200"))
+# Word-set overlap above which a retrieved block is dropped as a duplicate
+CONTEXT_DEDUP_THRESHOLD = 0.85
+
+# --- 18. CONVERSATION MEMORY ---
+# Recent turns sent verbatim on the no-PDF chat path; older ones are summarized
+MEMORY_WINDOW_TOKENS = int(os.getenv("PYSCHOLAR_MEMORY_WINDOW_TOKENS", "1500"))
+MEMORY_SUMMARY_MAX_TOKENS = 300
+MEMORY_SUMMARY_CACHE_SIZE = 128
+
+# --- 19. TRACING ---
+TRACES_DB = os.path.join(CACHE_DIR, "traces.db")
+# Fraction of chat turns whose per-stage spans are recorded
+TRACE_SAMPLE_RATE = float(os.getenv("PYSCHOLAR_TRACE_SAMPLE_RATE", "1.0"))
+TRACE_RETENTION_DAYS = float(os.getenv("PYSCHOLAR_TRACE_RETENTION_DAYS", "7"))
+TRACE_MAX_SPANS = int(os.getenv("PYSCHOLAR_TRACE_MAX_SPANS", "200000"))
+# The latency panel's percentiles cover at most this many of the newest spans in its window
+TRACE_DASHBOARD_MAX_SPANS = int(os.getenv("PYSCHOLAR_TRACE_DASHBOARD_MAX_SPANS", "20000"))
+
+# --- 20. SHARED KNOWLEDGE BASE ---
+# Published, memory-mapped snapshots of the KNOWLEDGE_DIR knowledge base,
+# shared read-only by every session and server process
+SHARED_KB_DIR = os.path.join(CACHE_DIR, "shared_kb")
+# Old versions kept on disk after a swap, for processes still opening them
+SHARED_KB_KEEP_VERSIONS = int(os.getenv("PYSCHOLAR_SHARED_KB_KEEP_VERSIONS", "3"))
+# 0 reads published indexes into memory instead of mapping them
+SHARED_KB_MMAP = os.getenv("PYSCHOLAR_SHARED_KB_MMAP", "1") == "1"
+# How often the app re-checks KNOWLEDGE_DIR and the live version (a rebuild runs in the background)
+SHARED_KB_CHECK_SECONDS = float(os.getenv("PYSCHOLAR_SHARED_KB_CHECK_SECONDS", "30"))
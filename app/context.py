@@ -0,0 +1,125 @@
+import logging
+import re
+
+from app.config import CONTEXT_TOKEN_BUDGET, CONTEXT_DEDUP_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+
+    # Not Llama's tokenizer, but within a few percent on English text
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+WORD_RE = re.compile(r"\w+")
+
+
+# --- 1. HELPERS ---
+def count_tokens(text):
+    """Token count from tiktoken when installed, else the usual ~4 characters per token."""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def _merge_spans(docs):
+    """
+    Join retrieved chunks of the same page whose character ranges overlap or
+    touch (needs the splitter's `start_index`). Returns [(first_rank, doc, text)].
+    """
+    blocks = []
+    spans = {}
+    for rank, doc in enumerate(docs):
+        start = doc.metadata.get("start_index")
+        key = (doc.metadata.get("doc_id"), doc.metadata.get("page"))
+        if start is None:
+            blocks.append([rank, doc, doc.page_content, None, None])
+            continue
+        spans.setdefault(key, []).append((start, rank, doc))
+
+    for chunks in spans.values():
+        chunks.sort(key=lambda c: c[0])
+        current = None
+        for start, rank, doc in chunks:
+            end = start + len(doc.page_content)
+            if current is not None and start <= current[4] + 1:
+                if end > current[4]:
+                    overlap = current[4] - start
+                    current[2] += doc.page_content[overlap:] if overlap >= 0 else " " + doc.page_content
+                    current[4] = end
+                current[0] = min(current[0], rank)
+                continue
+            current = [rank, doc, doc.page_content, start, end]
+            blocks.append(current)
+
+    blocks.sort(key=lambda b: b[0])
+    return [(rank, doc, text) for rank, doc, text, _, _ in blocks]
+
+def _is_near_duplicate(words, kept, threshold):
+    for other in kept:
+        union = len(words | other)
+        if union and len(words & other) / union >= threshold:
+            return True
+    return False
+
+def trim_to_tokens(text, max_tokens):
+    """Cut `text` to roughly `max_tokens`, at a sentence or word boundary when possible."""
+    cut = text[:max_tokens * 4]
+    while cut and count_tokens(cut) > max_tokens:
+        cut = cut[:int(len(cut) * 0.9)]
+    for boundary in (". ", "\n", " "):
+        pos = cut.rfind(boundary)
+        if pos > len(cut) // 2:
+            return cut[:pos + 1].rstrip() + " …"
+    return cut + " …"
+
+
+# --- 2. ASSEMBLY ---
+def assemble_context(docs, budget=CONTEXT_TOKEN_BUDGET, dedup_threshold=CONTEXT_DEDUP_THRESHOLD):
+    """
+    Turn retrieved chunks into prompt context: merge overlapping / adjacent
+    chunks of the same page, drop near-duplicates (word-set Jaccard), and add
+    blocks in retrieval order until the token budget is spent. Returns
+    (context, stats).
+    """
+    blocks, kept_words, used = [], [], 0
+    merged = _merge_spans(docs)
+    for _, doc, text in merged:
+        words = set(WORD_RE.findall(text.lower()))
+        if _is_near_duplicate(words, kept_words, dedup_threshold):
+            continue
+        header = f"[{doc.metadata.get('source', 'document')}, page {doc.metadata.get('page', 0) + 1}]"
+        tokens = count_tokens(header) + count_tokens(text) + 2
+        if used + tokens > budget:
+            remaining = budget - used - count_tokens(header) - 2
+            # Only worth including a partial block if a meaningful piece fits
+            if remaining >= 50:
+                text = trim_to_tokens(text, remaining)
+                blocks.append(f"{header}\n{text}")
+                used += count_tokens(header) + count_tokens(text) + 2
+            break
+        kept_words.append(words)
+        blocks.append(f"{header}\n{text}")
+        used += tokens
+
+    stats = {
+        "retrieved": len(docs),
+        "merged": len(merged),
+        "used": len(blocks),
+        "raw_tokens": sum(count_tokens(doc.page_content) for doc in docs),
+        "context_tokens": used,
+    }
+    return "\n\n".join(blocks), stats
+
+def context_for_prompt(docs):
+    """Runnable step between the retriever and RAG_PROMPT."""
+    context, stats = assemble_context(docs)
+    logger.info("context: %(retrieved)d chunks -> %(merged)d merged -> %(used)d used, "
+                "%(raw_tokens)d -> %(context_tokens)d tokens", stats)
+    return context
+
+def log_prompt_tokens(prompt_value):
+    """Pass the formatted prompt through, logging its size for this turn."""
+    logger.info("prompt: %d tokens", count_tokens(prompt_value.to_string()))
+    return prompt_value
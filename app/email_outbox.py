@@ -0,0 +1,234 @@
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+from app.config import (
+    SMTP_HOST, SMTP_PORT, SMTP_USE_SSL, SMTP_TIMEOUT_SECONDS, SMTP_IDLE_SECONDS, SMTP_PROBE_AFTER_SECONDS,
+    OUTBOX_BATCH_SIZE, OUTBOX_POLL_SECONDS, OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_BACKOFF_BASE_SECONDS, OUTBOX_BACKOFF_MAX_SECONDS,
+    OUTBOX_LEASE_SECONDS, OUTBOX_RETENTION_DAYS,
+)
+from app.tracing import record_span
+from db.database import claim_outbox_batch, mark_email_sent, mark_email_failed, purge_sent_emails
+
+logger = logging.getLogger(__name__)
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+# --- 1. HELPERS ---
+def load_credentials():
+    """
+    (sender, password) from the environment or Streamlit secrets; (None, None)
+    when neither is configured. An open relay needs a sender but no password.
+    """
+    sender = os.getenv("PYSCHOLAR_SMTP_USER")
+    password = os.getenv("PYSCHOLAR_SMTP_PASSWORD")
+    if sender:
+        return sender, password
+    try:
+        import streamlit as st
+
+        return st.secrets["email"]["sender_email"], st.secrets["email"]["app_password"]
+    except Exception:
+        return None, None
+
+def is_permanent(error):
+    """5xx replies (bad recipient, rejected message) will fail the same way on every retry."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    code = getattr(error, "smtp_code", None)
+    return code is not None and 500 <= code < 600 and not isinstance(error, smtplib.SMTPAuthenticationError)
+
+def backoff_seconds(attempts):
+    delay = min(OUTBOX_BACKOFF_MAX_SECONDS, OUTBOX_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+# --- 2. SENDER ---
+class OutboxWorker:
+    """
+    Background thread that drains the email outbox. It keeps one authenticated
+    SMTP connection open while there is mail to send, sends claimed emails in
+    batches, retries transient failures with exponential backoff and
+    dead-letters an email after OUTBOX_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, use_ssl=SMTP_USE_SSL, credentials=None,
+                 batch_size=OUTBOX_BATCH_SIZE, poll_seconds=OUTBOX_POLL_SECONDS,
+                 max_attempts=OUTBOX_MAX_ATTEMPTS):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.credentials = credentials
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+
+        self._smtp = None
+        self._last_used = 0.0
+        self._warned_unconfigured = False
+        self._last_purge = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._stats = {"sent": 0, "retried": 0, "dead": 0, "connections": 0}
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def wake(self):
+        """Send newly queued mail now instead of at the next poll."""
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    # Connection handling
+    def _connect(self):
+        if self.credentials is None:
+            self.credentials = load_credentials()
+        cls = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        smtp = cls(self.host, self.port, timeout=SMTP_TIMEOUT_SECONDS)
+        sender, password = self.credentials
+        if sender and password:
+            smtp.login(sender, password)
+        self._count("connections")
+        return smtp
+
+    def _get_smtp(self):
+        if self._smtp is not None:
+            # A connection in use is trusted: if it dropped, the send fails into _connection_lost
+            if time.time() - self._last_used < SMTP_PROBE_AFTER_SECONDS:
+                return self._smtp
+            try:
+                # The server may have dropped a connection that sat idle
+                if self._smtp.noop()[0] == 250:
+                    self._last_used = time.time()
+                    return self._smtp
+            except smtplib.SMTPException:
+                pass
+            self._close()
+        self._smtp = self._connect()
+        self._last_used = time.time()
+        return self._smtp
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    # Draining
+    def _build_message(self, to_email, subject, body):
+        msg = EmailMessage()
+        msg["Subject"] = subject
+        msg["From"] = self.credentials[0] or "pyscholar@localhost"
+        msg["To"] = to_email
+        msg.set_content(body)
+        return msg
+
+    def _fail(self, outbox_id, attempts, error, transient=False):
+        if attempts >= self.max_attempts or (not transient and is_permanent(error)):
+            mark_email_failed(outbox_id, repr(error))
+            self._count("dead")
+            logger.warning("Email %s dead-lettered after %s attempts: %r", outbox_id, attempts, error)
+        else:
+            mark_email_failed(outbox_id, repr(error), time.time() + backoff_seconds(attempts))
+            self._count("retried")
+
+    def _configured(self):
+        """Without a sender every send would fail, so mail stays queued with its attempts untouched."""
+        if self.credentials is None or not self.credentials[0]:
+            self.credentials = load_credentials()
+        if self.credentials[0]:
+            return True
+        if not self._warned_unconfigured:
+            logger.warning("No SMTP sender configured (PYSCHOLAR_SMTP_USER or st.secrets['email']); "
+                           "confirmation emails stay queued until one is")
+            self._warned_unconfigured = True
+        return False
+
+    def drain_once(self):
+        """Send one batch of due emails. Returns how many were claimed."""
+        if not self._configured():
+            return 0
+        batch = claim_outbox_batch(self.batch_size, OUTBOX_LEASE_SECONDS)
+        for position, (outbox_id, to_email, subject, body, attempts) in enumerate(batch):
+            start = time.perf_counter()
+            try:
+                smtp = self._get_smtp()
+                smtp.send_message(self._build_message(to_email, subject, body))
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, smtplib.SMTPAuthenticationError) as e:
+                self._connection_lost(batch[position:], e, start)
+                break
+            except smtplib.SMTPException as e:
+                # The server refused this message (recipient, sender or data): only it fails
+                record_span("email_send", (time.perf_counter() - start) * 1000, ok=False, detail=f"outbox {outbox_id}")
+                self._fail(outbox_id, attempts, e)
+                continue
+            except OSError as e:
+                # Socket errors: SMTPException subclasses OSError, so this must come after it
+                self._connection_lost(batch[position:], e, start)
+                break
+            record_span("email_send", (time.perf_counter() - start) * 1000, detail=f"outbox {outbox_id}")
+            mark_email_sent(outbox_id)
+            self._count("sent")
+            self._last_used = time.time()
+        return len(batch)
+
+    def _connection_lost(self, remaining, error, start):
+        """The connection is gone: reschedule the rest of the batch and reconnect next round."""
+        record_span("email_send", (time.perf_counter() - start) * 1000, ok=False,
+                    detail=f"outbox {remaining[0][0]}")
+        self._close()
+        for outbox_id, _, _, _, attempts in remaining:
+            # Not the message's fault, so never dead-lettered early for it
+            self._fail(outbox_id, attempts, error, transient=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.drain_once()
+                if time.time() - self._last_purge > 3600:
+                    purge_sent_emails(time.time() - OUTBOX_RETENTION_DAYS * 86400)
+                    self._last_purge = time.time()
+            except Exception:
+                logger.exception("Email outbox drain failed")
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue  # more mail is probably waiting
+            if self._smtp is not None and time.time() - self._last_used > SMTP_IDLE_SECONDS:
+                self._close()
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+        self._close()
+
+
+def get_outbox_worker():
+    """The process-wide outbox sender, started on first use."""
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = OutboxWorker().start()
+    return _worker
@@ -0,0 +1,244 @@
+import uuid
+
+from app import semantic_cache
+from app.booking_flow import (
+    extract_booking_details, missing_fields, check_availability, FIELD_LABELS, CONFIRM_WORDS, CANCEL_WORDS,
+)
+from app.chains import get_rag_chain, get_layered_rag_chain
+from app.chat_logic import determine_intent
+from app.config import STREAM_RESPONSES, SEMANTIC_CACHE_ENABLED
+from app.llm_gateway import get_gateway
+from app.memory import ConversationMemory
+from app.streaming import timed_stream
+from app.tools import save_booking_to_db
+from app.tracing import start_turn
+from db.database import SLOT_TAKEN, slot_key
+
+
+# --- 1. SESSION STATE ---
+class SessionState:
+    """
+    Everything one conversation carries between turns. The Streamlit UI keeps
+    one per browser session; batch replay keeps one per scripted conversation.
+    """
+
+    def __init__(self, session_id=None, knowledge_base=None):
+        self.session_id = session_id or uuid.uuid4().hex[:12]
+        # Set by the caller; RAG answers are used while it has documents
+        self.knowledge_base = knowledge_base
+        self.messages = []
+        self.memory = ConversationMemory()
+        self.end_booking()
+
+    def end_booking(self):
+        self.booking_in_progress = False
+        self.confirming = False
+        self.extracted_details = {}
+        self.asking_for = None
+
+    def reset(self):
+        """Forget the conversation (the knowledge base stays)."""
+        self.messages = []
+        self.memory.clear()
+        self.end_booking()
+
+
+class Reply:
+    """One assistant turn: either `text`, or a `stream` generated as it is read."""
+
+    def __init__(self, turn):
+        self.turn = turn
+        self.text = ""
+        self.stream = None
+        # Which branch answered: confirm / booking / cache / rag / chat
+        self.path = "chat"
+        # Set when this turn saved a booking
+        self.booking_id = None
+        # Knowledge base whose answer cache should learn this turn's answer
+        self.cache_kb_id = None
+
+
+# --- 2. ENGINE ---
+class ConversationEngine:
+    """
+    The booking and RAG state machine, with no UI attached. `respond()`
+    works out the reply to one user message and updates `state`; the caller
+    renders it and hands the final text to `finish()`. `run_turn()` does both
+    for headless callers.
+    """
+
+    def __init__(self, llm, stream=STREAM_RESPONSES):
+        self.llm = llm
+        self.stream = stream
+
+    def respond(self, state, prompt):
+        state.messages.append({"role": "user", "content": prompt})
+        state.memory.add("user", prompt)
+        # Per-stage timings for the admin latency panel (sampled per turn)
+        reply = Reply(start_turn(state.session_id))
+
+        if state.confirming:
+            self._confirm(state, prompt, reply)
+            return reply
+
+        if state.booking_in_progress:
+            intent = "BOOKING"
+        else:
+            with reply.turn.span("intent"):
+                intent = determine_intent(prompt, self.llm)
+
+        if intent == "BOOKING":
+            self._collect_booking(state, prompt, reply)
+        else:
+            self._answer(state, prompt, reply)
+        return reply
+
+    def finish(self, state, reply, text, metrics=None):
+        """Record the rendered reply: history, answer cache, memory and the turn's trace."""
+        message = {"role": "assistant", "content": text}
+        if metrics:
+            message["metrics"] = metrics
+        state.messages.append(message)
+
+        if reply.cache_kb_id:
+            semantic_cache.store(reply.cache_kb_id, state.messages[-2]["content"], text)
+
+        # Summarizes old turns in the background once the history outgrows the window
+        state.memory.add("assistant", text)
+        state.memory.compact(self.llm)
+        reply.turn.finish(reply.path)
+
+    def run_turn(self, state, prompt):
+        """respond() and finish() without a UI; a streamed reply is read to the end here."""
+        reply = self.respond(state, prompt)
+        metrics = None
+        text = reply.text
+        if reply.stream is not None:
+            metrics = {}
+            text = "".join(timed_stream(reply.stream, metrics))
+        self.finish(state, reply, text, metrics)
+        return reply, text
+
+    # --- 3. BOOKING ---
+    def _confirm(self, state, prompt, reply):
+        reply.path = "confirm"
+        answer = prompt.lower()
+        if answer in CONFIRM_WORDS:
+            details = state.extracted_details
+            with reply.turn.span("save_booking"):
+                success, bid = save_booking_to_db(
+                    details['name'], details['email'], details['phone'],
+                    details['booking_type'], details['date'], details['time'], details
+                )
+            state.end_booking()
+            if success:
+                # The email was queued with the booking; the outbox worker sends it
+                reply.booking_id = bid
+                reply.text = f"✅ **Booking Confirmed!**\n\n**Booking ID:** #{bid}\nA confirmation email is on its way to {details['email']}."
+            elif bid == SLOT_TAKEN:
+                # Someone else confirmed this slot first: keep the details and offer other times
+                state.booking_in_progress = True
+                state.extracted_details = details
+                reply.text = offer_alternative_slots(state, details, check_availability(details)[1])
+            else:
+                reply.text = f"❌ Error saving booking: {bid}"
+
+        elif answer in CANCEL_WORDS:
+            state.end_booking()
+            reply.text = "🚫 Booking cancelled. How else can I help you?"
+
+        else:
+            reply.text = "Please type 'Yes' to confirm the booking or 'No' to cancel."
+
+    def _collect_booking(self, state, prompt, reply):
+        reply.path = "booking"
+        state.booking_in_progress = True
+
+        # Only the newest message is parsed; earlier slots are already in extracted_details
+        with reply.turn.span("extraction"):
+            current_details = extract_booking_details(
+                prompt, state.extracted_details, self.llm, asking_for=state.asking_for
+            )
+        state.extracted_details.update(current_details)
+
+        saved = state.extracted_details
+        missing = missing_fields(saved)
+        if missing:
+            state.asking_for = missing[0]
+            reply.text = f"I can help you book. I just need a few details. Could you please provide your **{FIELD_LABELS[missing[0]]}**?"
+            return
+
+        with reply.turn.span("availability"):
+            available, alternatives = check_availability(saved)
+        if not available:
+            # Offer other slots now rather than failing after confirmation
+            reply.text = offer_alternative_slots(state, saved, alternatives)
+            return
+
+        state.asking_for = None
+        state.confirming = True
+        reply.text = (
+            f"📋 **Please Confirm Your Booking Details:**\n\n"
+            f"👤 **Name:** {saved['name']}\n"
+            f"📧 **Email:** {saved['email']}\n"
+            f"📱 **Phone:** {saved['phone']}\n"
+            f"🎓 **Type:** {saved['booking_type']}\n"
+            f"📅 **Date:** {saved['date']} at {saved['time']}\n\n"
+            f"**Is this correct? (Yes/No)**"
+        )
+
+    # --- 4. RAG / GENERAL QUERY ---
+    def _answer(self, state, prompt, reply):
+        kb = state.knowledge_base
+        kb_id = kb.fingerprint if kb is not None and kb.documents else None
+
+        cached_answer = None
+        if kb_id and SEMANTIC_CACHE_ENABLED:
+            with reply.turn.span("cache_lookup"):
+                cached_answer = semantic_cache.lookup(kb_id, prompt)
+
+        # Retrieval and generation spans come from the chain's callbacks
+        config = {"callbacks": reply.turn.callbacks()}
+        if cached_answer:
+            reply.path = "cache"
+            reply.text = cached_answer
+        elif kb_id:
+            reply.path = "rag"
+            reply.cache_kb_id = kb_id if SEMANTIC_CACHE_ENABLED else None
+            if getattr(kb, "layers", None):
+                # Session uploads over the shared knowledge base: both are searched and fused
+                rag_chain = get_layered_rag_chain(self.llm, kb.layers)
+            else:
+                rag_chain = get_rag_chain(self.llm, kb.vectorstore, kb.bm25)
+            if self.stream:
+                reply.stream = get_gateway().stream(rag_chain, prompt, config=config)
+            else:
+                reply.text = get_gateway().invoke(rag_chain, prompt, config=config)
+        else:
+            # Bounded history: recent turns verbatim, older ones as a rolling summary
+            msgs = state.memory.messages("You are a helpful assistant.")
+            if self.stream:
+                reply.stream = get_gateway().stream(self.llm, msgs, config=config)
+            else:
+                reply.text = get_gateway().invoke(self.llm, msgs, config=config).content
+
+
+def offer_alternative_slots(state, details, alternatives):
+    """Clear the unavailable slot, ask for a new one and list the next free slots."""
+    requested = f"{details.get('date')} at {details.get('time')}"
+    date_readable = slot_key(details.get("date"), "00:00") is not None
+    details["time"] = None
+    if date_readable:
+        state.asking_for = "time"
+        problem, ask = "isn't available", "**Time**"
+    else:
+        # An unreadable date fails with any time: ask for the date again too
+        details["date"] = None
+        state.asking_for = "date"
+        problem, ask = "isn't a date and time I can book", "**Date** and **Time**"
+    if not alternatives:
+        return (f"😕 **{requested}** {problem} for {details['booking_type']}, and I couldn't find a free slot "
+                f"soon. Could you suggest another **Date** and **Time**?")
+    options = "\n".join(f"- {slot}" for slot in alternatives)
+    return (f"😕 **{requested}** {problem} for {details['booking_type']}. "
+            f"The next free slots are:\n\n{options}\n\nReply with one of these, or suggest another {ask}.")
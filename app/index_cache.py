@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+from langchain_community.vectorstores import FAISS
+
+from app.config import (
+    CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL,
+    INDEX_CACHE_DIR, INDEX_CACHE_MAX_MB,
+)
+from app.bm25 import BM25Index
+
+META_FILE = "meta.json"
+# Bump when the stored chunk metadata changes shape
+INDEX_FORMAT = 3
+
+
+# --- 1. CACHE KEYS ---
+def current_index_params():
+    """Parameters that change the contents of a built index."""
+    return {
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "embedding_model": EMBEDDING_MODEL,
+        "format": INDEX_FORMAT,
+    }
+
+def cache_key(pdf_bytes, params):
+    """Content-addressed key: hash of the PDF bytes plus the index parameters."""
+    h = hashlib.sha256()
+    h.update(hashlib.sha256(pdf_bytes).digest())
+    h.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+# --- 2. HELPERS ---
+def _entry_dir(key):
+    return os.path.join(INDEX_CACHE_DIR, key)
+
+def _read_meta(entry_dir):
+    try:
+        with open(os.path.join(entry_dir, META_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_meta(entry_dir, meta):
+    # Write to a temp file first so readers never see a half-written meta.json
+    tmp_path = os.path.join(entry_dir, f".{META_FILE}.{uuid.uuid4().hex}")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(entry_dir, META_FILE))
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def _list_entries():
+    if not os.path.isdir(INDEX_CACHE_DIR):
+        return []
+    entries = []
+    for name in os.listdir(INDEX_CACHE_DIR):
+        path = os.path.join(INDEX_CACHE_DIR, name)
+        if name.startswith(".") or not os.path.isdir(path):
+            continue
+        entries.append((path, _read_meta(path)))
+    return entries
+
+
+# --- 3. PUBLIC API ---
+def load_index(key, embeddings):
+    """Return the cached FAISS index for `key`, or None on a cache miss."""
+    entry_dir = _entry_dir(key)
+    meta = _read_meta(entry_dir)
+    if meta is None:
+        return None
+
+    # Entries built with other chunking / embedding settings are stale
+    if meta.get("params") != current_index_params():
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return None
+
+    try:
+        vectorstore = FAISS.load_local(entry_dir, embeddings, allow_dangerous_deserialization=True)
+    except Exception:
+        # Corrupt or partially deleted entry: drop it and rebuild
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return None
+
+    # Touch for LRU ordering
+    meta["last_access"] = time.time()
+    try:
+        _write_meta(entry_dir, meta)
+    except OSError:
+        pass
+    return vectorstore
+
+def load_bm25(key):
+    """The keyword index stored with the cached vector index for `key`, or None."""
+    return BM25Index.load(_entry_dir(key))
+
+def save_index(key, vectorstore, params, bm25=None):
+    """Persist a built index (and its keyword index) under `key`, then enforce the cache size limit."""
+    os.makedirs(INDEX_CACHE_DIR, exist_ok=True)
+    entry_dir = _entry_dir(key)
+
+    # Build in a private temp dir and rename into place, so concurrent
+    # sessions never load a half-written index
+    tmp_dir = os.path.join(INDEX_CACHE_DIR, f".tmp-{uuid.uuid4().hex}")
+    try:
+        vectorstore.save_local(tmp_dir)
+        if bm25 is not None:
+            bm25.save(tmp_dir)
+        now = time.time()
+        _write_meta(tmp_dir, {
+            "params": params,
+            "size_bytes": _dir_size(tmp_dir),
+            "created_at": now,
+            "last_access": now,
+        })
+        if os.path.isdir(entry_dir):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+    except OSError:
+        # Another process won the race (or the disk is full); caching is best-effort
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    evict()
+
+def evict(max_mb=None):
+    """Drop stale entries, then least-recently-used ones until under the size limit."""
+    max_bytes = (INDEX_CACHE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    params = current_index_params()
+
+    live = []
+    for path, meta in _list_entries():
+        if meta is None or meta.get("params") != params:
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            live.append((meta.get("last_access", 0), meta.get("size_bytes", 0), path))
+
+    total = sum(size for _, size, _ in live)
+    for _, size, path in sorted(live):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+def clear():
+    """Remove every cached index."""
+    shutil.rmtree(INDEX_CACHE_DIR, ignore_errors=True)
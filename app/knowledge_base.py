@@ -0,0 +1,289 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+
+from langchain_core.documents import Document
+
+from app.config import KB_WORKERS, INDEX_BACKEND, INGEST_BATCH_SIZE
+from app import index_cache
+from app.bm25 import BM25Index
+from app.ann_index import ann_params, build_search_store, set_search_params, index_backend
+from app.rag_pipeline import document_id, iter_pdf_pages, iter_chunks, add_to_vectorstore
+from models.embeddings import get_embedding_service
+
+_pool = None
+_manager = None
+_pool_lock = threading.Lock()
+# Seconds a parse worker waits for the main process to take a batch before giving up
+QUEUE_PUT_TIMEOUT = 600
+
+
+# --- 1. PROCESS POOL ---
+def _get_pool():
+    """
+    Process-wide pool for PDF parsing, plus the manager whose queues carry
+    chunk batches back; 'spawn' avoids forking a process that holds model threads.
+    """
+    global _pool, _manager
+    with _pool_lock:
+        if _pool is None:
+            context = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(max_workers=KB_WORKERS, mp_context=context)
+            if _manager is None:
+                _manager = context.Manager()
+        return _pool, _manager
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def split_pdf(pdf_bytes, source, progress=None, batch_size=INGEST_BATCH_SIZE):
+    """
+    Parse and split one PDF page by page, yielding lists of at most
+    `batch_size` chunks as plain (text, metadata) tuples.
+    """
+    chunks = iter_chunks(iter_pdf_pages(pdf_bytes, source=source, progress=progress))
+    while True:
+        batch = [(doc.page_content, doc.metadata) for doc in islice(chunks, batch_size)]
+        if not batch:
+            return
+        yield batch
+
+def _split_to_queue(pdf_bytes, source, doc_id, out):
+    """
+    Worker process: put (doc_id, batch, None) on `out` for each batch, then
+    (doc_id, None, None) at the end, or (doc_id, None, error) if parsing fails.
+    """
+    try:
+        for batch in split_pdf(pdf_bytes, source):
+            out.put((doc_id, batch, None), timeout=QUEUE_PUT_TIMEOUT)
+        out.put((doc_id, None, None), timeout=QUEUE_PUT_TIMEOUT)
+    except queue.Full:
+        pass  # the main process stopped reading; nobody is waiting for this document
+    except Exception as e:
+        out.put((doc_id, None, str(e)), timeout=QUEUE_PUT_TIMEOUT)
+
+
+# --- 2. KNOWLEDGE BASE ---
+class KnowledgeBase:
+    """
+    Several PDFs merged into one FAISS index. Each chunk carries its
+    document's `doc_id` in metadata so documents can be removed individually.
+    `flat_store` is the exact index that documents are merged into and deleted
+    from; `vectorstore` is what gets searched, an approximate copy once the
+    corpus is large enough for the configured INDEX_BACKEND.
+    """
+
+    def __init__(self, embeddings=None, backend=INDEX_BACKEND):
+        self.embeddings = embeddings or get_embedding_service()
+        self.backend = backend
+        self.flat_store = None
+        self.vectorstore = None
+        # Keyword index over the same chunks, for hybrid retrieval
+        self.bm25 = BM25Index()
+        # doc_id -> {"name", "chunks", "ids", "origin"}
+        self.documents = {}
+        # doc_id -> {"name", "error"} for PDFs that could not be read, so they are not
+        # retried every rerun; cleared when the document is removed or a fixed copy is added
+        self.failed = {}
+
+    @property
+    def fingerprint(self):
+        """
+        Identity of the current index: changes whenever a document is added or
+        removed, or the chunking / embedding settings change.
+        """
+        params = json.dumps(index_cache.current_index_params(), sort_keys=True)
+        identity = params + "|" + ",".join(sorted(self.documents))
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16]
+
+    def add_pdfs(self, files, origin="upload", progress=None):
+        """
+        Add PDFs given as (name, bytes) pairs. Documents already in the knowledge
+        base are skipped, cached indexes are reused, and the rest are parsed in
+        parallel. Returns a list of (name, error) for PDFs that could not be read.
+        `progress(done, total, unit)` reports pages for a single document and
+        documents otherwise.
+        """
+        params = index_cache.current_index_params()
+        pending = {}
+        for name, data in files:
+            doc_id = document_id(data)
+            if doc_id not in self.documents and doc_id not in self.failed and doc_id not in pending:
+                pending[doc_id] = (name, data)
+
+        total = len(pending)
+        done = 0
+        failures = []
+        to_parse = {}
+
+        # 1. Cache hits merge straight in
+        for doc_id, (name, data) in pending.items():
+            key = index_cache.cache_key(data, params)
+            cached = index_cache.load_index(key, self.embeddings)
+            if cached is not None:
+                # Entries cached before keyword indexing existed get one built from their chunks
+                bm25 = index_cache.load_bm25(key) or BM25Index.from_vectorstore(cached)
+                self._merge(doc_id, name, cached, bm25, origin)
+                done += 1
+                if progress:
+                    progress(done, total, "document")
+            else:
+                to_parse[doc_id] = (name, data, key)
+
+        # 2. Misses are split in worker processes (a lone document in-process) and
+        #    each batch is embedded as it arrives, so memory is bounded by the batch
+        #    size rather than the document size
+        if len(to_parse) == 1:
+            batches = self._split_local(to_parse, progress)
+        else:
+            batches = self._split_parallel(to_parse)
+        stores = {}
+        for doc_id, batch, error in batches:
+            name, _, key = to_parse[doc_id]
+            if doc_id in self.failed:
+                continue  # later batches of a document that already failed
+            if error is not None:
+                stores.pop(doc_id, None)
+                self._fail(doc_id, name, error, failures)
+            elif batch is not None:
+                docs = [Document(page_content=text, metadata=metadata) for text, metadata in batch]
+                try:
+                    stores[doc_id] = add_to_vectorstore(stores.get(doc_id), docs, self.embeddings)
+                except Exception as e:
+                    stores.pop(doc_id, None)
+                    self._fail(doc_id, name, str(e), failures)
+            else:
+                # 3. The document is complete: cache its index and merge it
+                doc_store = stores.pop(doc_id, None)
+                if doc_store is None:
+                    self._fail(doc_id, name, "No extractable text found in the PDF.", failures)
+                    continue
+                bm25 = BM25Index.from_vectorstore(doc_store)
+                index_cache.save_index(key, doc_store, params, bm25)
+                self._merge(doc_id, name, doc_store, bm25, origin)
+                done += 1
+                if progress and total > 1:
+                    progress(done, total, "document")
+
+        if pending:
+            self._refresh_search_store()
+        return failures
+
+    def add_directory(self, path):
+        """Register every PDF in a folder."""
+        files = []
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith(".pdf"):
+                with open(os.path.join(path, name), "rb") as f:
+                    files.append((name, f.read()))
+        return self.add_pdfs(files, origin="directory")
+
+    def remove_document(self, doc_id):
+        """
+        Drop one document's chunks without re-embedding the rest; the search
+        index is then refreshed. A failed document just loses its failure entry.
+        """
+        if self.failed.pop(doc_id, None) is not None:
+            return True
+        info = self.documents.pop(doc_id, None)
+        if info is None:
+            return False
+        if not self.documents:
+            self.flat_store = None
+        else:
+            self.flat_store.delete(info["ids"])
+        self.bm25.remove(info["ids"])
+        self._refresh_search_store()
+        return True
+
+    @property
+    def index_backend(self):
+        """Backend of the index currently being searched ("flat" until the corpus is big enough)."""
+        return index_backend(self.vectorstore.index) if self.vectorstore is not None else None
+
+    # --- 3. HELPERS ---
+    def _split_local(self, to_parse, progress):
+        """Split a single document in this process, reporting page progress."""
+        (doc_id, (name, data, _)), = to_parse.items()
+        on_page = (lambda d, t: progress(d, t, "page")) if progress else None
+        try:
+            for batch in split_pdf(data, name, progress=on_page):
+                yield doc_id, batch, None
+        except Exception as e:
+            yield doc_id, None, str(e)
+            return
+        yield doc_id, None, None
+
+    def _split_parallel(self, to_parse):
+        """Split documents in the process pool, yielding their batches as the workers send them."""
+        pool, manager = _get_pool()
+        # Bounded: workers wait rather than pile chunks up while embedding catches up
+        batches = manager.Queue(maxsize=2 * KB_WORKERS)
+        futures = {
+            pool.submit(_split_to_queue, data, name, doc_id, batches): doc_id
+            for doc_id, (name, data, _) in to_parse.items()
+        }
+        open_docs = set(futures.values())
+        while open_docs:
+            try:
+                doc_id, batch, error = batches.get(timeout=1)
+            except queue.Empty:
+                # A worker that crashed never reports back; its future holds the error
+                for future, doc_id in futures.items():
+                    if doc_id in open_docs and future.done() and future.exception() is not None:
+                        if isinstance(future.exception(), BrokenProcessPool):
+                            # A crashed worker poisons the whole pool; start a fresh one next time
+                            _reset_pool()
+                        open_docs.discard(doc_id)
+                        yield doc_id, None, str(future.exception())
+                continue
+            if batch is None:
+                open_docs.discard(doc_id)
+            yield doc_id, batch, error
+
+    def _fail(self, doc_id, name, error, failures):
+        self.failed[doc_id] = {"name": name, "error": error}
+        failures.append((name, error))
+
+    def _refresh_search_store(self):
+        """Rebuild (or load a cached) approximate index after the document set changed."""
+        if self.flat_store is None:
+            self.vectorstore = None
+            return
+        if self.backend == "flat":
+            self.vectorstore = self.flat_store
+            return
+
+        params = index_cache.current_index_params()
+        key = index_cache.cache_key(self.fingerprint.encode("utf-8"), {**params, "ann": ann_params(self.backend)})
+        store = index_cache.load_index(key, self.embeddings)
+        if store is not None:
+            set_search_params(store.index)
+        else:
+            store = build_search_store(self.flat_store, self.backend)
+            if store is not self.flat_store:
+                index_cache.save_index(key, store, params)
+        self.vectorstore = store
+
+    def _merge(self, doc_id, name, doc_store, bm25, origin):
+        ids = list(doc_store.index_to_docstore_id.values())
+        # A fixed copy of a PDF that failed earlier replaces its failure
+        for failed_id in [d for d, info in self.failed.items() if info["name"] == name]:
+            del self.failed[failed_id]
+        self.bm25.merge_from(bm25)
+        if self.flat_store is None:
+            self.flat_store = doc_store
+        else:
+            self.flat_store.merge_from(doc_store)
+        self.documents[doc_id] = {"name": name, "chunks": len(ids), "ids": ids, "origin": origin}
+
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import queue
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.callbacks.manager import handle_event
+
+from app.config import (
+    LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_BURST,
+    LLM_MAX_RETRIES, LLM_BACKOFF_BASE_SECONDS, LLM_BACKOFF_MAX_SECONDS,
+    LLM_RETRY_AFTER_MAX_SECONDS,
+)
+
+try:
+    from groq import APIConnectionError as _GroqConnectionError
+except ImportError:
+    _GroqConnectionError = ()
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+# --- 1. HELPERS ---
+class TokenBucket:
+    """Allows `rate` requests per second on average, with bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        # Only ever touched from the gateway's event loop, so no lock is needed
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def is_retryable(error):
+    """429s, 5xx responses and connection failures are worth another attempt."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status == 429 or 500 <= status < 600
+    return isinstance(error, (ConnectionError, TimeoutError, httpx.TransportError, _GroqConnectionError))
+
+def retry_after_seconds(error):
+    """The wait a 429/503 response asks for (Retry-After / retry-after-ms headers), or None."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            # HTTP-date form
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _request_key(runnable, payload):
+    return id(runnable), json.dumps(payload, sort_keys=True, default=repr)
+
+def _handlers(config):
+    callbacks = (config or {}).get("callbacks") or []
+    # A callback manager instead of a list of handlers
+    return list(getattr(callbacks, "handlers", callbacks))
+
+
+class SharedCallbacks(BaseCallbackHandler):
+    """
+    Callback handler of a coalesced call that forwards every event to the
+    callbacks of each caller sharing the call. A caller that joins mid-call
+    first receives the events it missed, so its start/end pairs are complete.
+    """
+    run_inline = True
+
+    def __init__(self, handlers):
+        self._handlers = list(handlers)
+        self._events = []
+        self._lock = threading.Lock()
+
+    def join(self, handlers):
+        with self._lock:
+            for event_name, args, kwargs in self._events:
+                handle_event(handlers, event_name, None, *args, **kwargs)
+            self._handlers += handlers
+
+    def _forward(self, event_name, args, kwargs):
+        with self._lock:
+            self._events.append((event_name, args, kwargs))
+            handle_event(self._handlers, event_name, None, *args, **kwargs)
+
+def _forwarder(event_name):
+    def forward(self, *args, **kwargs):
+        self._forward(event_name, args, kwargs)
+    forward.__name__ = event_name
+    return forward
+
+for _event_name in [name for name in dir(BaseCallbackHandler) if name.startswith("on_")]:
+    setattr(SharedCallbacks, _event_name, _forwarder(_event_name))
+
+
+# --- 2. GATEWAY ---
+class LLMGateway:
+    """
+    Every LLM call goes through one asyncio loop running on a background thread.
+    The loop enforces a global concurrency limit and a token-bucket rate limit,
+    retries 429/5xx with exponential backoff (or after the Retry-After wait the
+    provider asks for), and lets identical in-flight requests share one call.
+    Streamlit threads use the blocking `invoke` / `stream`.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                 burst=LLM_BURST, max_retries=LLM_MAX_RETRIES,
+                 backoff_base=LLM_BACKOFF_BASE_SECONDS, backoff_max=LLM_BACKOFF_MAX_SECONDS):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self._inflight = {}
+        self._stats = {"calls": 0, "coalesced": 0, "retries": 0, "failures": 0}
+        self._stats_lock = threading.Lock()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True)
+        self._thread.start()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _should_retry(self, error, attempt):
+        if attempt >= self.max_retries or not is_retryable(error):
+            return False
+        retry_after = retry_after_seconds(error)
+        return retry_after is None or retry_after <= LLM_RETRY_AFTER_MAX_SECONDS
+
+    async def _backoff(self, attempt, error):
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            # The provider said when to come back; a little jitter spreads the sessions it told
+            await asyncio.sleep(retry_after + random.uniform(0, self.backoff_base))
+        else:
+            delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+            # Full jitter keeps sessions that failed together from retrying together
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+        self._count("retries")
+
+    async def _call(self, runnable, payload, config=None):
+        self._count("calls")
+        for attempt in range(self.max_retries + 1):
+            await self._bucket.acquire()
+            async with self._semaphore:
+                try:
+                    return await runnable.ainvoke(payload, config)
+                except Exception as e:
+                    if not self._should_retry(e, attempt):
+                        self._count("failures")
+                        raise
+                    error = e
+            await self._backoff(attempt, error)
+
+    async def _coalesced_call(self, runnable, payload, config=None):
+        key = _request_key(runnable, payload)
+        entry = self._inflight.get(key)
+        if entry is None:
+            # Every caller's callbacks (trace spans included) hear the shared call's events
+            shared = SharedCallbacks(_handlers(config))
+            task = asyncio.ensure_future(self._call(runnable, payload, {**(config or {}), "callbacks": [shared]}))
+            self._inflight[key] = (task, shared)
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            task, shared = entry
+            shared.join(_handlers(config))
+            self._count("coalesced")
+        # shield: one caller timing out must not cancel the shared call
+        return await asyncio.shield(task)
+
+    async def _pump_stream(self, runnable, payload, out, config=None):
+        self._count("calls")
+        for attempt in range(self.max_retries + 1):
+            await self._bucket.acquire()
+            started = False
+            async with self._semaphore:
+                try:
+                    async for chunk in runnable.astream(payload, config):
+                        started = True
+                        out.put(("chunk", chunk))
+                    out.put(("done", None))
+                    return
+                except Exception as e:
+                    # Once tokens reached the user a retry would duplicate them
+                    if started or not self._should_retry(e, attempt):
+                        self._count("failures")
+                        out.put(("error", e))
+                        return
+                    error = e
+            await self._backoff(attempt, error)
+
+    # --- 3. BLOCKING API FOR STREAMLIT THREADS ---
+    def invoke(self, runnable, payload, timeout=None, config=None):
+        """Run `runnable.ainvoke(payload, config)` through the gateway and wait for the result."""
+        future = asyncio.run_coroutine_threadsafe(self._coalesced_call(runnable, payload, config), self._loop)
+        return future.result(timeout)
+
+    def stream(self, runnable, payload, config=None):
+        """Yield chunks from `runnable.astream(payload, config)`; retries only happen before the first chunk."""
+        out = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._pump_stream(runnable, payload, out, config), self._loop)
+        try:
+            while True:
+                kind, item = out.get()
+                if kind == "chunk":
+                    yield item
+                elif kind == "done":
+                    return
+                else:
+                    raise item
+        finally:
+            # A reader that stops early (or is closed) cancels the upstream stream,
+            # which releases its concurrency slot right away
+            future.cancel()
+
+    def stats(self):
+        with self._stats_lock:
+            report = dict(self._stats)
+        report["in_flight"] = len(self._inflight)
+        return report
+
+
+def get_gateway():
+    """The process-wide LLM gateway."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
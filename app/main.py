@@ -11,12 +11,15 @@ import pandas as pd
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # --- 3. IMPORTS ---
-from models.llm import get_chatgroq_model
+from models.llm import get_chat_model
 from db.database import init_db
-from app.chat_logic import determine_intent
-from app.booking_flow import extract_booking_details
-from app.rag_pipeline import process_pdf
-from app.tools import save_booking_to_db, send_confirmation_email
+from app.chat_logic import get_intent_stats
+from app.llm_gateway import get_gateway
+from app.config import EMBEDDING_WARMUP, KNOWLEDGE_DIR, SHARED_KB_CHECK_SECONDS
+from app.streaming import timed_stream, format_metrics
+from app.engine import ConversationEngine, SessionState
+from app.email_outbox import get_outbox_worker
+from models.embeddings import warm_up_embedding_service
 try:
     from app.admin_dashboard import show_dashboard
 except ImportError:
@@ -68,19 +71,40 @@ def inject_custom_css():
     </style>
     """, unsafe_allow_html=True)
 
+@st.cache_resource(ttl=SHARED_KB_CHECK_SECONDS, show_spinner=False)
+def load_shared_knowledge_base():
+    """
+    KNOWLEDGE_DIR's shared knowledge base, re-checked every SHARED_KB_CHECK_SECONDS.
+    A changed folder is rebuilt in the background; the last published version
+    is served meanwhile (None before the first one is ready).
+    """
+    from app.shared_kb import shared_knowledge_base_for
+
+    return shared_knowledge_base_for(KNOWLEDGE_DIR)
+
 def main():
     # Apply CSS
     inject_custom_css()
     
-    # Initialize Database
+    # Initialize Database (once per process; reruns return immediately)
     init_db()
+    if EMBEDDING_WARMUP:
+        warm_up_embedding_service()
+    # Sends the confirmation emails queued by bookings
+    get_outbox_worker()
 
     # Get LLM
     try:
-        chat_model = get_chatgroq_model()
+        chat_model = get_chat_model()
     except Exception as e:
         st.error(f"Error loading Model: {e}. Check your API keys in models/llm.py")
         st.stop()
+    engine = ConversationEngine(chat_model)
+
+    # Booking / chat state for this browser session
+    if "conversation" not in st.session_state:
+        st.session_state.conversation = SessionState()
+    conversation = st.session_state.conversation
 
     # --- SIDEBAR NAVIGATION ---
     with st.sidebar:
@@ -92,23 +116,85 @@ def main():
         
         st.markdown("---")
         st.subheader("📚 Knowledge Base")
-        uploaded_file = st.file_uploader("Upload Mentorship PDF", type="pdf", help="Upload a guide for the bot to read.")
-        
-        if uploaded_file:
-            if "vectorstore" not in st.session_state:
-                with st.spinner("Processing Knowledge Base..."):
-                    st.session_state.vectorstore = process_pdf(uploaded_file)
+        uploaded_files = st.file_uploader(
+            "Upload Mentorship PDFs", type="pdf", accept_multiple_files=True,
+            help="Upload one or more guides for the bot to read."
+        )
+
+        # The RAG stack (pypdf, FAISS, the embedding model) is only imported
+        # once a session actually needs a knowledge base
+        if "knowledge_base" not in st.session_state and uploaded_files:
+            from app.knowledge_base import KnowledgeBase
+            # Uploads only: KNOWLEDGE_DIR is searched through the shared copy below
+            st.session_state.knowledge_base = KnowledgeBase()
+        uploads_kb = st.session_state.get("knowledge_base")
+
+        new_files = []
+        if uploads_kb is not None:
+            from app.rag_pipeline import document_id
+
+            # Keep the knowledge base in sync with the uploader: add new files, drop removed ones
+            uploads = {document_id(f.getbuffer()): f for f in uploaded_files or []}
+            for doc_id in list(uploads_kb.documents) + list(uploads_kb.failed):
+                if doc_id not in uploads:
+                    uploads_kb.remove_document(doc_id)
+
+            new_files = [
+                (f.name, f.getvalue()) for doc_id, f in uploads.items()
+                if doc_id not in uploads_kb.documents and doc_id not in uploads_kb.failed
+            ]
+        if new_files:
+            progress_bar = st.progress(0.0, text="Processing Knowledge Base...")
+            def on_progress(done, total, unit):
+                progress_bar.progress(done / total, text=f"Processing {unit} {done} of {total}...")
+
+            with st.spinner("Processing Knowledge Base..."):
+                failures = uploads_kb.add_pdfs(new_files, progress=on_progress)
+            progress_bar.empty()
+            for name, error in failures:
+                st.error(f"❌ {name}: {error}")
+            if len(failures) < len(new_files):
                 st.success("✅ Knowledge Base Ready!")
-            else:
-                st.info("📂 PDF Loaded Active")
+
+        # Every session shares one published, memory-mapped copy of KNOWLEDGE_DIR;
+        # a session's uploads are searched alongside it rather than replacing it
+        kb = uploads_kb if uploads_kb is not None and uploads_kb.documents else None
+        if KNOWLEDGE_DIR and os.path.isdir(KNOWLEDGE_DIR):
+            from app.shared_kb import LayeredKnowledgeBase, building
+            shared_kb = load_shared_knowledge_base()
+            if shared_kb is None and not building():
+                # A background build may have finished since the result was cached
+                load_shared_knowledge_base.clear()
+                shared_kb = load_shared_knowledge_base()
+            if shared_kb is not None:
+                kb = LayeredKnowledgeBase(shared_kb, kb) if kb is not None else shared_kb
+            elif building():
+                st.caption("⏳ Building the shared Knowledge Base...")
+
+        conversation.knowledge_base = kb
+
+        if kb is not None:
+            for info in kb.documents.values():
+                st.caption(f"📄 {info['name']} · {info['chunks']} chunks")
+            for layer in getattr(kb, "layers", [kb]):
+                st.caption(f"🔎 Index: {layer.index_backend} · {layer.vectorstore.index.ntotal} vectors")
+
+            with st.expander("⚙️ Embedding Stats"):
+                from models.embeddings import get_embedding_service
+                for kind, s in get_embedding_service().stats().items():
+                    st.caption(f"**{kind.title()}:** {s['texts']} texts in {s['batches']} batches · {s['texts_per_sec']:.1f} texts/sec")
+
+        with st.expander("🧭 Intent Routing"):
+            intent_stats = get_intent_stats()
+            st.caption(" · ".join(f"**{tier.title()}:** {count}" for tier, count in intent_stats.items()))
+
+        with st.expander("🚦 LLM Gateway"):
+            gateway_stats = get_gateway().stats()
+            st.caption(" · ".join(f"**{key.replace('_', ' ').title()}:** {value}" for key, value in gateway_stats.items()))
 
         st.markdown("---")
         if st.button("🗑️ Reset Conversation", use_container_width=True):
-            st.session_state.messages = []
-            st.session_state.booking_in_progress = False
-            st.session_state.confirming = False
-            st.session_state.extracted_details = {} 
-            st.session_state.last_reset_index = 0
+            conversation.reset()
             st.rerun()
 
     # --- PAGE 1: CHAT INTERFACE ---
@@ -121,141 +207,39 @@ def main():
         </div>
         """, unsafe_allow_html=True)
 
-        # Initialize Session State
-        if "messages" not in st.session_state:
-            st.session_state.messages = []
-        if "booking_in_progress" not in st.session_state:
-            st.session_state.booking_in_progress = False
-        if "confirming" not in st.session_state:
-            st.session_state.confirming = False
-        if "extracted_details" not in st.session_state:
-            st.session_state.extracted_details = {}
-        if "last_reset_index" not in st.session_state:
-            st.session_state.last_reset_index = 0
-
         # Welcome Message if Empty
-        if not st.session_state.messages:
+        if not conversation.messages:
             st.info("👋 **Hello!** I can help you book mentorship sessions or answer questions about the course. Upload a PDF to get started!")
 
         # Display Chat History
-        for msg in st.session_state.messages:
+        for msg in conversation.messages:
             with st.chat_message(msg["role"]):
                 st.markdown(msg["content"])
+                if msg.get("metrics"):
+                    st.caption(format_metrics(msg["metrics"]))
 
         # Handle User Input
         if prompt := st.chat_input("Ask a question or book a session..."):
-            st.session_state.messages.append({"role": "user", "content": prompt})
             with st.chat_message("user"):
                 st.markdown(prompt)
 
-            response_text = ""
-            
             with st.chat_message("assistant"):
                 with st.spinner("Thinking..."):
-                    
-                    # A. CHECK FOR BOOKING CONFIRMATION
-                    if st.session_state.confirming:
-                        if prompt.lower() in ["yes", "y", "confirm", "ok", "sure"]:
-                            # Execute Booking
-                            details = st.session_state.extracted_details
-                            success, bid = save_booking_to_db(
-                                details['name'], details['email'], details['phone'],
-                                details['booking_type'], details['date'], details['time']
-                            )
-                            if success:
-                                send_confirmation_email(details['email'], details['name'], str(details))
-                                response_text = f"✅ **Booking Confirmed!**\n\n**Booking ID:** #{bid}\nI have sent a confirmation email to {details['email']}."
-                                st.balloons() # 🎉 Fun effect on success
-                            else:
-                                response_text = f"❌ Error saving booking: {bid}"
-                            
-                            # Reset
-                            st.session_state.booking_in_progress = False
-                            st.session_state.confirming = False
-                            st.session_state.extracted_details = {}
-                            st.session_state.last_reset_index = len(st.session_state.messages) + 1
-                        
-                        elif prompt.lower() in ["no", "cancel", "stop"]:
-                            response_text = "🚫 Booking cancelled. How else can I help you?"
-                            st.session_state.booking_in_progress = False
-                            st.session_state.confirming = False
-                            st.session_state.extracted_details = {}
-                            st.session_state.last_reset_index = len(st.session_state.messages) + 1
-                        
-                        else:
-                            response_text = "Please type 'Yes' to confirm the booking or 'No' to cancel."
-
-                    # B. NORMAL FLOW
-                    else:
-                        if st.session_state.booking_in_progress:
-                            intent = "BOOKING"
-                        else:
-                            intent = determine_intent(prompt, chat_model)
-                        
-                        # --- BOOKING FLOW ---
-                        if intent == "BOOKING":
-                            st.session_state.booking_in_progress = True
-                            
-                            relevant_msgs = st.session_state.messages[st.session_state.last_reset_index:]
-                            current_details = extract_booking_details(relevant_msgs, chat_model)
-                            
-                            if current_details:
-                                for key, value in current_details.items():
-                                    if value and key != 'missing_fields':
-                                        st.session_state.extracted_details[key] = value
-
-                            saved = st.session_state.extracted_details
-                            missing = []
-                            if not saved.get('name'): missing.append("Name")
-                            if not saved.get('email'): missing.append("Email")
-                            if not saved.get('phone'): missing.append("Phone")
-                            if not saved.get('booking_type'): missing.append("Booking Type")
-                            if not saved.get('date'): missing.append("Date")
-                            if not saved.get('time'): missing.append("Time")
-                            
-                            if missing:
-                                response_text = f"I can help you book. I just need a few details. Could you please provide your **{missing[0]}**?"
-                            else:
-                                st.session_state.confirming = True
-                                response_text = (
-                                    f"📋 **Please Confirm Your Booking Details:**\n\n"
-                                    f"👤 **Name:** {saved['name']}\n"
-                                    f"📧 **Email:** {saved['email']}\n"
-                                    f"📱 **Phone:** {saved['phone']}\n"
-                                    f"🎓 **Type:** {saved['booking_type']}\n"
-                                    f"📅 **Date:** {saved['date']} at {saved['time']}\n\n"
-                                    f"**Is this correct? (Yes/No)**"
-                                )
-
-                        # --- RAG / GENERAL QUERY ---
-                        else:
-                            if "vectorstore" in st.session_state:
-                                retriever = st.session_state.vectorstore.as_retriever(search_kwargs={"k": 3})
-                                from langchain_core.runnables import RunnablePassthrough
-                                from langchain_core.prompts import PromptTemplate
-                                from langchain_core.output_parsers import StrOutputParser
-
-                                template = """Answer the question based only on the following context:
-                                {context}
-
-                                Question: {question}
-                                """
-                                rag_prompt = PromptTemplate.from_template(template)
-                                
-                                rag_chain = (
-                                    {"context": retriever, "question": RunnablePassthrough()}
-                                    | rag_prompt
-                                    | chat_model
-                                    | StrOutputParser()
-                                )
-                                response_text = rag_chain.invoke(prompt)
-                            else:
-                                from langchain_core.messages import HumanMessage, SystemMessage
-                                msgs = [SystemMessage(content="You are a helpful assistant.")] + [HumanMessage(content=m["content"]) for m in st.session_state.messages if m["role"] == "user"]
-                                response_text = chat_model.invoke(msgs).content
-
-                st.markdown(response_text)
-                st.session_state.messages.append({"role": "assistant", "content": response_text})
+                    reply = engine.respond(conversation, prompt)
+
+                if reply.booking_id is not None:
+                    get_outbox_worker().wake()
+                    st.balloons() # 🎉 Fun effect on success
+
+                # Streams start generating here, after the spinner, so tokens render as they arrive
+                if reply.stream is not None:
+                    metrics = {}
+                    response_text = st.write_stream(timed_stream(reply.stream, metrics))
+                    st.caption(format_metrics(metrics))
+                    engine.finish(conversation, reply, response_text, metrics)
+                else:
+                    st.markdown(reply.text)
+                    engine.finish(conversation, reply, reply.text)
 
     # --- PAGE 2: ADMIN DASHBOARD ---
     elif page == "Admin Dashboard":
@@ -271,7 +255,7 @@ def main():
         ### How to use PyScholar AI
         
         1. **🤖 Chatting:** Just type naturally! You can say "Hi" or ask questions.
-        2. **📚 Knowledge Base:** - Upload a PDF in the sidebar.
+        2. **📚 Knowledge Base:** - Upload one or more PDFs in the sidebar.
            - Ask questions like *"What is covered in Week 1?"* or *"Who are the mentors?"*
         3. **📅 Booking a Session:**
            - Say *"I want to book a mentorship session"*
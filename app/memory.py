@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from app.chains import get_chain
+from app.config import MEMORY_WINDOW_TOKENS, MEMORY_SUMMARY_MAX_TOKENS, MEMORY_SUMMARY_CACHE_SIZE
+from app.context import count_tokens, trim_to_tokens
+from app.llm_gateway import get_gateway
+
+logger = logging.getLogger(__name__)
+
+# Summaries run here, never in the Streamlit thread answering the user
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+_summaries = OrderedDict()
+_summaries_lock = threading.Lock()
+
+_summary_prompt = PromptTemplate.from_template(
+    """Update the running summary of a conversation between a student and the PyScholar AI mentorship assistant.
+    Keep names, dates, decisions, open questions and anything the student asked to remember.
+    Write at most {max_words} words.
+
+    Current summary:
+    {summary}
+
+    New lines of conversation:
+    {turns}
+
+    Updated summary:"""
+)
+
+
+# --- 1. SUMMARY CACHE ---
+def _summarize(llm, summary, turns):
+    """Fold `turns` into `summary`. Cached by content, so a replayed conversation is summarized once."""
+    text = "\n".join(f"{role.title()}: {content}" for role, content in turns)
+    key = hashlib.sha256(f"{summary}\x00{text}".encode("utf-8")).hexdigest()
+    with _summaries_lock:
+        if key in _summaries:
+            _summaries.move_to_end(key)
+            return _summaries[key]
+
+    chain = get_chain("summary", lambda model: _summary_prompt | model | StrOutputParser(), llm)
+    result = get_gateway().invoke(chain, {
+        "summary": summary or "(none yet)",
+        "turns": text,
+        "max_words": MEMORY_SUMMARY_MAX_TOKENS * 3 // 4,
+    }).strip()
+    if count_tokens(result) > MEMORY_SUMMARY_MAX_TOKENS:
+        result = trim_to_tokens(result, MEMORY_SUMMARY_MAX_TOKENS)
+
+    with _summaries_lock:
+        _summaries[key] = result
+        while len(_summaries) > MEMORY_SUMMARY_CACHE_SIZE:
+            _summaries.popitem(last=False)
+    return result
+
+
+# --- 2. MEMORY ---
+class ConversationMemory:
+    """
+    Chat history for the no-PDF path with a bounded prompt size. The newest
+    turns that fit in `window_tokens` are sent verbatim; once the unsummarized
+    history outgrows the window, the oldest turns are folded into a rolling
+    summary in the background and dropped.
+    """
+
+    def __init__(self, window_tokens=MEMORY_WINDOW_TOKENS):
+        self.window_tokens = window_tokens
+        self.summary = ""
+        # [(role, content, tokens)] not yet folded into the summary
+        self.turns = []
+        self._pending = None
+        # Bumped by clear(), so a summary finishing afterwards is discarded
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def add(self, role, content):
+        with self._lock:
+            self.turns.append((role, content, count_tokens(content)))
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self.turns = []
+            self._pending = None
+            self._generation += 1
+
+    def messages(self, system_prompt):
+        """System prompt (plus summary) and the newest turns that fit in the window."""
+        with self._lock:
+            summary, turns = self.summary, list(self.turns)
+
+        recent, used = [], 0
+        for role, content, tokens in reversed(turns):
+            if recent and used + tokens > self.window_tokens:
+                break
+            recent.append(HumanMessage(content=content) if role == "user" else AIMessage(content=content))
+            used += tokens
+        recent.reverse()
+
+        if summary:
+            system_prompt = f"{system_prompt}\n\nSummary of the earlier conversation:\n{summary}"
+        return [SystemMessage(content=system_prompt)] + recent
+
+    def compact(self, llm):
+        """
+        Start summarizing old turns if the history outgrew the window. Keeps
+        the newest half-window verbatim so compaction does not run every turn.
+        Returns immediately; the summary lands when the background job ends.
+        """
+        with self._lock:
+            if self._pending is not None or sum(t[2] for t in self.turns) <= self.window_tokens:
+                return
+            keep, split = 0, len(self.turns)
+            while split > 1 and keep + self.turns[split - 1][2] <= self.window_tokens // 2:
+                split -= 1
+                keep += self.turns[split][2]
+            old = [(role, content) for role, content, _ in self.turns[:split]]
+            self._pending = _executor.submit(self._fold, llm, self.summary, old, self._generation)
+
+    def _fold(self, llm, summary, old, generation):
+        try:
+            summary = _summarize(llm, summary, old)
+        except Exception:
+            # Keep the turns; the next compact() retries
+            logger.exception("Conversation summary failed")
+            summary = None
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._pending = None
+            if summary is None:
+                return
+            self.summary = summary
+            self.turns = self.turns[len(old):]
+
+    def wait(self, timeout=None):
+        """Block until a running summary finishes (for scripts and tests)."""
+        pending = self._pending
+        if pending is not None:
+            pending.result(timeout)
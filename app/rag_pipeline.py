@@ -1,20 +1,58 @@
-from langchain_community.document_loaders import PyPDFLoader
+import hashlib
+import io
+
+from pypdf import PdfReader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 
-def process_pdf(pdf_file):
-    # Save uploaded file temporarily
-    with open("temp.pdf", "wb") as f:
-        f.write(pdf_file.getbuffer())
-    
-    loader = PyPDFLoader("temp.pdf")
-    docs = loader.load()
-    
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(docs)
-    
-    # Create Vector Store
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    vectorstore = FAISS.from_documents(documents=splits, embedding=embeddings)
-    return vectorstore
\ No newline at end of file
+from app.config import CHUNK_SIZE, CHUNK_OVERLAP
+
+# --- 1. STREAMING STAGES ---
+def document_id(pdf_bytes):
+    """Stable ID for a PDF, derived from its contents."""
+    return hashlib.sha256(pdf_bytes).hexdigest()[:16]
+
+def iter_pdf_pages(pdf_source, source="uploaded.pdf", progress=None):
+    """
+    Yield one Document per page, reading straight from bytes or a file-like
+    buffer. `progress(pages_done, total_pages)` is called after each page.
+    """
+    if isinstance(pdf_source, (bytes, bytearray, memoryview)):
+        doc_id = document_id(pdf_source)
+        pdf_source = io.BytesIO(pdf_source)
+    else:
+        doc_id = document_id(pdf_source.getbuffer())
+        pdf_source.seek(0)
+
+    reader = PdfReader(pdf_source)
+    total_pages = len(reader.pages)
+    for i, page in enumerate(reader.pages):
+        yield Document(
+            page_content=page.extract_text() or "",
+            metadata={"doc_id": doc_id, "source": source, "page": i, "total_pages": total_pages},
+        )
+        if progress:
+            progress(i + 1, total_pages)
+
+def iter_chunks(pages, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Split pages one at a time so only the current page's chunks are in memory.
+    Each chunk records its `start_index` in the page, so overlapping chunks can
+    be merged back together when they are retrieved together.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+    )
+    for page in pages:
+        yield from text_splitter.split_documents([page])
+
+def add_to_vectorstore(vectorstore, batch, embeddings):
+    """Embed one batch of chunks and add it to `vectorstore`, which is created on the first batch."""
+    texts = [doc.page_content for doc in batch]
+    metadatas = [doc.metadata for doc in batch]
+    text_embeddings = list(zip(texts, embeddings.embed_documents(texts)))
+    if vectorstore is None:
+        return FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas)
+    vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
+    return vectorstore
@@ -0,0 +1,154 @@
+"""
+Replay scripted conversations through the conversation engine, concurrently.
+
+    python -m app.replay conversations.jsonl --workers 16 --backend stub --out results.jsonl
+
+One conversation per line:
+
+    {"id": "mock-1",
+     "turns": ["I want to book a mock interview", "My name is Asha Rao",
+               "asha@example.com, 9876543210", "{today+3} at 10am", "yes"],
+     "expect": {"booked": true, "details": {"booking_type": "Mock Interview"},
+                "last_reply_contains": "Booking Confirmed"}}
+
+`{today+N}` in a turn becomes the ISO date N days from today, so scripts keep
+booking future slots. "expect" is optional. Bookings go to a temporary
+database unless --db is given, and confirmation emails stay queued there (the
+outbox worker is not started). For load tests with the stub backend, raise
+PYSCHOLAR_LLM_REQUESTS_PER_MINUTE so the gateway's rate limit is not the
+bottleneck.
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from app.engine import ConversationEngine, SessionState
+from db import database
+from models.llm import get_chat_model
+
+DATE_RE = re.compile(r"\{today([+-]\d+)?\}")
+
+
+# --- 1. ONE CONVERSATION ---
+def expand_dates(text, today=None):
+    today = today or date.today()
+    return DATE_RE.sub(lambda m: (today + timedelta(days=int(m.group(1) or 0))).isoformat(), text)
+
+def check_expectations(expect, result):
+    """Human-readable mismatches between `expect` and a replayed conversation."""
+    problems = []
+    if "booked" in expect and bool(result["booking_id"]) != expect["booked"]:
+        problems.append(f"booked: expected {expect['booked']}, got booking {result['booking_id']}")
+    for field, value in expect.get("details", {}).items():
+        got = result["details"].get(field)
+        if str(got).strip().lower() != str(value).strip().lower():
+            problems.append(f"{field}: expected {value!r}, got {got!r}")
+    needle = expect.get("last_reply_contains")
+    if needle and (not result["replies"] or needle not in result["replies"][-1]):
+        problems.append(f"last reply does not contain {needle!r}")
+    return problems
+
+def replay_conversation(engine, script, knowledge_base=None):
+    state = SessionState(session_id=f"replay-{script['id']}", knowledge_base=knowledge_base)
+    result = {"id": script["id"], "replies": [], "turn_ms": [], "paths": [],
+              "booking_id": None, "details": {}, "error": None}
+    try:
+        for prompt in script["turns"]:
+            start = time.perf_counter()
+            reply, text = engine.run_turn(state, expand_dates(prompt))
+            result["turn_ms"].append((time.perf_counter() - start) * 1000)
+            result["replies"].append(text)
+            result["paths"].append(reply.path)
+            if state.extracted_details:
+                # Details are cleared once a booking is saved; keep the last full set
+                result["details"] = dict(state.extracted_details)
+            if reply.booking_id is not None:
+                result["booking_id"] = reply.booking_id
+    except Exception as e:
+        result["error"] = repr(e)
+    result["problems"] = check_expectations(script.get("expect", {}), result)
+    return result
+
+
+# --- 2. BATCH ---
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+def replay(scripts, engine, workers=8, knowledge_base=None):
+    """Replay `scripts` on a thread pool. Returns (results in input order, summary)."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="replay") as pool:
+        results = list(pool.map(lambda s: replay_conversation(engine, s, knowledge_base), scripts))
+    elapsed = time.perf_counter() - start
+
+    turn_ms = [ms for r in results for ms in r["turn_ms"]]
+    summary = {
+        "conversations": len(results),
+        "turns": len(turn_ms),
+        "seconds": round(elapsed, 3),
+        "turns_per_sec": round(len(turn_ms) / elapsed, 1) if elapsed else 0.0,
+        "turn_p50_ms": round(percentile(turn_ms, 0.50), 2),
+        "turn_p95_ms": round(percentile(turn_ms, 0.95), 2),
+        "turn_p99_ms": round(percentile(turn_ms, 0.99), 2),
+        "bookings": sum(1 for r in results if r["booking_id"]),
+        "errors": sum(1 for r in results if r["error"]),
+        "failed_expectations": sum(1 for r in results if r["problems"]),
+    }
+    return results, summary
+
+def load_scripts(path):
+    with open(path) as f:
+        scripts = [json.loads(line) for line in f if line.strip()]
+    for number, script in enumerate(scripts, start=1):
+        script.setdefault("id", str(number))
+    return scripts
+
+
+# --- 3. ENTRY POINT ---
+def main():
+    parser = argparse.ArgumentParser(description="Replay scripted conversations through the conversation engine.")
+    parser.add_argument("conversations", help="JSONL file, one scripted conversation per line")
+    parser.add_argument("--workers", type=int, default=8, help="Conversations replayed at once")
+    parser.add_argument("--backend", choices=["groq", "stub"], default="stub", help="Chat model backend")
+    parser.add_argument("--stream", action="store_true", help="Stream answers, as the UI does")
+    parser.add_argument("--db", help="Bookings database (default: a fresh temporary file)")
+    parser.add_argument("--pdf", action="append", default=[], help="PDF for a knowledge base shared by all sessions")
+    parser.add_argument("--out", help="Write per-conversation results here (JSONL)")
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db or os.path.join(tempfile.mkdtemp(prefix="pyscholar-replay-"), "bookings.db")
+    database.init_db()
+
+    knowledge_base = None
+    if args.pdf:
+        from app.knowledge_base import KnowledgeBase
+
+        knowledge_base = KnowledgeBase()
+        pdfs = []
+        for path in args.pdf:
+            with open(path, "rb") as f:
+                pdfs.append((os.path.basename(path), f.read()))
+        for name, error in knowledge_base.add_pdfs(pdfs):
+            print(f"❌ {name}: {error}")
+
+    engine = ConversationEngine(get_chat_model(args.backend), stream=args.stream)
+    results, summary = replay(load_scripts(args.conversations), engine, args.workers, knowledge_base)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+    for result in results:
+        for problem in result["problems"] + ([result["error"]] if result["error"] else []):
+            print(f"✗ {result['id']}: {problem}")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+from typing import Any, List
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from app.config import RETRIEVAL_K, RETRIEVAL_FETCH_K, RRF_K
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=RRF_K):
+    """Fuse several best-first id lists: each id scores sum(1 / (rrf_k + rank))."""
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense (FAISS) and keyword (BM25) retrieval over the same chunks, merged
+    with reciprocal rank fusion. Exact terms such as course codes or mentor
+    names rank high through BM25 even when their embeddings are not close.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: Any
+    bm25: Any
+    k: int = RETRIEVAL_K
+    fetch_k: int = RETRIEVAL_FETCH_K
+    rrf_k: int = RRF_K
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        dense = self.vectorstore.similarity_search(query, k=self.fetch_k)
+        docs = {doc.id: doc for doc in dense}
+        keyword_ids = [chunk_id for chunk_id, _ in self.bm25.search(query, self.fetch_k)]
+
+        results = []
+        for chunk_id in reciprocal_rank_fusion([[doc.id for doc in dense], keyword_ids], self.rrf_k):
+            doc = docs.get(chunk_id) or self.vectorstore.docstore.search(chunk_id)
+            # The docstore returns an error string for ids it no longer holds
+            if isinstance(doc, Document):
+                results.append(doc)
+            if len(results) == self.k:
+                break
+        return results
+
+
+class LayeredRetriever(BaseRetriever):
+    """
+    Several indexes searched as one, e.g. a session's uploads on top of the
+    shared knowledge base. Each layer ranks its own chunks (dense, plus BM25
+    when the layer has a keyword index) and all rankings are fused with
+    reciprocal rank fusion. Chunk ids are only unique within a layer, so they
+    are fused as (layer, id).
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    # (vectorstore, bm25 or None) per layer
+    layers: List[Any]
+    k: int = RETRIEVAL_K
+    fetch_k: int = RETRIEVAL_FETCH_K
+    rrf_k: int = RRF_K
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        docs, rankings = {}, []
+        for layer, (vectorstore, bm25) in enumerate(self.layers):
+            dense = vectorstore.similarity_search(query, k=self.fetch_k)
+            docs.update(((layer, doc.id), doc) for doc in dense)
+            rankings.append([(layer, doc.id) for doc in dense])
+            if bm25 is not None:
+                rankings.append([(layer, chunk_id) for chunk_id, _ in bm25.search(query, self.fetch_k)])
+
+        results = []
+        for layer, chunk_id in reciprocal_rank_fusion(rankings, self.rrf_k):
+            doc = docs.get((layer, chunk_id)) or self.layers[layer][0].docstore.search(chunk_id)
+            if isinstance(doc, Document):
+                results.append(doc)
+            if len(results) == self.k:
+                break
+        return results
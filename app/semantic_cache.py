@@ -0,0 +1,139 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app.config import (
+    SEMANTIC_CACHE_DB, SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL_HOURS, SEMANTIC_CACHE_MAX_ENTRIES,
+)
+from app.bm25 import tokenize
+
+_local = threading.local()
+# kb_id -> (signature, ids, matrix), least recently used first
+_matrices = OrderedDict()
+_matrices_lock = threading.Lock()
+# Knowledge bases whose embedding matrix stays in memory; a new fingerprint replaces the oldest
+MAX_MATRICES = 16
+# How many of the most similar cached questions are checked for matching key terms
+CANDIDATES = 5
+WORD_RE = re.compile(r"[A-Za-z][\w'-]*")
+
+
+# --- 1. STORAGE ---
+def _get_connection():
+    """One connection per thread; WAL lets sessions in other processes read while we write."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(SEMANTIC_CACHE_DB), exist_ok=True)
+        conn = sqlite3.connect(SEMANTIC_CACHE_DB, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute('''CREATE TABLE IF NOT EXISTS answers
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         kb_id TEXT NOT NULL,
+                         question TEXT NOT NULL,
+                         embedding BLOB NOT NULL,
+                         answer TEXT NOT NULL,
+                         created_at REAL NOT NULL,
+                         last_used REAL NOT NULL)''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_kb ON answers(kb_id, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_last_used ON answers(last_used)")
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+def _embed(question):
+    from models.embeddings import get_embedding_service
+
+    vector = np.asarray(get_embedding_service().embed_query(question), dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def _load_matrix(conn, kb_id, min_created):
+    """
+    Cached embeddings for one knowledge base as a (rows, dim) matrix.
+    Re-read from SQLite only when the row set for that knowledge base changed.
+    """
+    signature = conn.execute(
+        "SELECT COUNT(*), MAX(id), MIN(id) FROM answers WHERE kb_id = ? AND created_at >= ?",
+        (kb_id, min_created),
+    ).fetchone()
+
+    with _matrices_lock:
+        memo = _matrices.get(kb_id)
+        if memo and memo[0] == signature:
+            _matrices.move_to_end(kb_id)
+            return memo[1], memo[2]
+
+    rows = conn.execute(
+        "SELECT id, embedding FROM answers WHERE kb_id = ? AND created_at >= ?",
+        (kb_id, min_created),
+    ).fetchall()
+    ids = [row[0] for row in rows]
+    matrix = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows]) if rows else None
+
+    with _matrices_lock:
+        _matrices[kb_id] = (signature, ids, matrix)
+        _matrices.move_to_end(kb_id)
+        while len(_matrices) > MAX_MATRICES:
+            _matrices.popitem(last=False)
+    return ids, matrix
+
+def key_terms(question):
+    """
+    Numbers, codes and names in a question ("week 2", "DS-101", "Priya"):
+    near-duplicates that differ in one of these ask something else.
+    """
+    terms = {token for token in tokenize(question) if any(c.isdigit() for c in token)}
+    # Capitalised words other than the first are taken as names
+    terms.update(word.lower() for word in WORD_RE.findall(question)[1:] if word[0].isupper())
+    return terms
+
+
+# --- 2. PUBLIC API ---
+def lookup(kb_id, question, threshold=SEMANTIC_CACHE_THRESHOLD):
+    """
+    Return a cached answer for a near-duplicate question on the same knowledge
+    base, or None. Similar questions whose numbers or names differ never match.
+    """
+    conn = _get_connection()
+    now = time.time()
+    ids, matrix = _load_matrix(conn, kb_id, now - SEMANTIC_CACHE_TTL_HOURS * 3600)
+    if matrix is None:
+        return None
+
+    scores = matrix @ _embed(question)
+    terms = key_terms(question)
+    for position in np.argsort(-scores)[:CANDIDATES]:
+        if scores[position] < threshold:
+            break
+        row = conn.execute("SELECT question, answer FROM answers WHERE id = ?", (ids[position],)).fetchone()
+        # None: evicted by another process since the matrix was loaded
+        if row is None or key_terms(row[0]) != terms:
+            continue
+        conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, ids[position]))
+        conn.commit()
+        return row[1]
+    return None
+
+def store(kb_id, question, answer):
+    """Cache an answer, then drop expired and least-recently-used entries."""
+    if not answer:
+        return
+    conn = _get_connection()
+    now = time.time()
+    conn.execute(
+        "INSERT INTO answers (kb_id, question, embedding, answer, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+        (kb_id, question, _embed(question).tobytes(), answer, now, now),
+    )
+    conn.execute("DELETE FROM answers WHERE created_at < ?", (now - SEMANTIC_CACHE_TTL_HOURS * 3600,))
+    conn.execute(
+        "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+        (SEMANTIC_CACHE_MAX_ENTRIES,),
+    )
+    conn.commit()
@@ -0,0 +1,385 @@
+"""
+Read-only knowledge bases published to disk and memory-mapped by every session and process.
+
+    python -m app.shared_kb guides/          # build, publish and switch to a new version
+    python -m app.shared_kb --status
+
+A version is a directory holding the FAISS index, the chunk texts and
+metadata as UTF-8 blobs with offset arrays, the keyword postings as arrays
+and a manifest. CURRENT names the live version and is replaced atomically;
+a process picks up the new version on its next lookup, while queries
+already running keep searching the version they started with.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections.abc import Mapping
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+
+from app.config import SHARED_KB_DIR, SHARED_KB_KEEP_VERSIONS, SHARED_KB_MMAP
+from app.ann_index import set_search_params, index_backend
+from app.bm25 import MappedBM25Index
+from models.embeddings import get_embedding_service
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+TEXTS_FILE = "texts.bin"
+TEXT_OFFSETS_FILE = "text_offsets.npy"
+METADATA_FILE = "metadata.bin"
+METADATA_OFFSETS_FILE = "metadata_offsets.npy"
+
+# (root, version) -> SharedKnowledgeBase for the version this process has open
+_opened = None
+_opened_lock = threading.Lock()
+_publish_lock = threading.Lock()
+# Background rebuild of a KNOWLEDGE_DIR that changed since the live version was published
+_build_thread = None
+_build_lock = threading.Lock()
+# Folder signatures that had no readable PDFs, so they are not rebuilt on every check
+_unbuildable = set()
+
+
+# --- 1. CHUNK STORE ---
+def _write_blob(directory, blob_file, offsets_file, strings):
+    offsets = [0]
+    with open(os.path.join(directory, blob_file), "wb") as f:
+        for text in strings:
+            data = text.encode("utf-8")
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    np.save(os.path.join(directory, offsets_file), np.array(offsets, dtype=np.int64))
+
+def _read_blob(directory, blob_file, offsets_file, mmap):
+    path = os.path.join(directory, blob_file)
+    offsets = np.load(os.path.join(directory, offsets_file), mmap_mode="r" if mmap else None)
+    if mmap and os.path.getsize(path):
+        return np.memmap(path, dtype=np.uint8, mode="r"), offsets
+    return np.fromfile(path, dtype=np.uint8), offsets
+
+
+class ChunkStore:
+    """Chunk texts and metadata of one published version, by index position."""
+
+    def __init__(self, directory, mmap=SHARED_KB_MMAP):
+        self._texts, self._text_offsets = _read_blob(directory, TEXTS_FILE, TEXT_OFFSETS_FILE, mmap)
+        self._metadata, self._metadata_offsets = _read_blob(directory, METADATA_FILE, METADATA_OFFSETS_FILE, mmap)
+
+    def __len__(self):
+        return len(self._text_offsets) - 1
+
+    def text(self, position):
+        start, end = self._text_offsets[position], self._text_offsets[position + 1]
+        return self._texts[start:end].tobytes().decode("utf-8")
+
+    def metadata(self, position):
+        start, end = self._metadata_offsets[position], self._metadata_offsets[position + 1]
+        return json.loads(self._metadata[start:end].tobytes().decode("utf-8"))
+
+
+class MappedDocstore(Docstore):
+    """Docstore over a ChunkStore; chunk ids are index positions as strings."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def search(self, search):
+        try:
+            position = int(search)
+        except (TypeError, ValueError):
+            position = -1
+        if not 0 <= position < len(self.chunks):
+            return f"ID {search} not found."
+        return Document(id=str(position), page_content=self.chunks.text(position),
+                        metadata=self.chunks.metadata(position))
+
+
+class _PositionIds(Mapping):
+    """index_to_docstore_id for a MappedDocstore, without a per-process dict of every id."""
+
+    def __init__(self, size):
+        self.size = size
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.size:
+            raise KeyError(position)
+        return str(int(position))
+
+    def __iter__(self):
+        return iter(range(self.size))
+
+    def __len__(self):
+        return self.size
+
+
+# --- 2. PUBLISHING ---
+def _write_current(root, version):
+    # Temp file + rename: readers see the old or the new version, never a partial name
+    tmp_path = os.path.join(root, f".{CURRENT_FILE}.{uuid.uuid4().hex}")
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+
+def current_version(root=SHARED_KB_DIR):
+    """Name of the live version, or None when nothing is published."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def _prune(root, keep=SHARED_KB_KEEP_VERSIONS):
+    """Delete all but the live version and the `keep` newest others (plus abandoned temp dirs)."""
+    current = current_version(root)
+    versions = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if not os.path.isdir(path):
+            continue
+        if name.startswith(".tmp-"):
+            if time.time() - os.path.getmtime(path) > 3600:
+                shutil.rmtree(path, ignore_errors=True)
+        elif name != current:
+            versions.append((os.path.getmtime(path), path))
+    # Processes still mapping a deleted version keep working: the files live until unmapped
+    for _, path in sorted(versions, reverse=True)[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+def publish(kb, source_signature=None, root=SHARED_KB_DIR):
+    """
+    Write `kb`'s search index and chunks as a new version, then make it the
+    live one. Returns the version name.
+    """
+    import faiss
+
+    store = kb.vectorstore
+    if store is None:
+        raise ValueError("Nothing to publish: the knowledge base has no documents")
+    count = store.index.ntotal
+    docs = [store.docstore.search(store.index_to_docstore_id[i]) for i in range(count)]
+
+    os.makedirs(root, exist_ok=True)
+    version = f"{time.strftime('%Y%m%dT%H%M%S')}-{kb.fingerprint}-{uuid.uuid4().hex[:6]}"
+    tmp_dir = os.path.join(root, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir)
+    try:
+        faiss.write_index(store.index, os.path.join(tmp_dir, INDEX_FILE))
+        _write_blob(tmp_dir, TEXTS_FILE, TEXT_OFFSETS_FILE, (doc.page_content for doc in docs))
+        _write_blob(tmp_dir, METADATA_FILE, METADATA_OFFSETS_FILE, (json.dumps(doc.metadata) for doc in docs))
+        # Keyword index keyed by position, like the mapped docstore
+        MappedBM25Index.write(tmp_dir, (doc.page_content for doc in docs), kb.bm25.k1, kb.bm25.b)
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+            json.dump({
+                "version": version,
+                "fingerprint": kb.fingerprint,
+                "source_signature": source_signature,
+                "backend": index_backend(store.index),
+                "distance_strategy": DistanceStrategy(store.distance_strategy).value,
+                "chunks": count,
+                "documents": {
+                    doc_id: {"name": info["name"], "chunks": info["chunks"], "origin": info["origin"]}
+                    for doc_id, info in kb.documents.items()
+                },
+                "created_at": time.time(),
+            }, f)
+        os.replace(tmp_dir, os.path.join(root, version))
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    _write_current(root, version)
+    _prune(root)
+    logger.info("Published knowledge base %s (%d chunks)", version, count)
+    return version
+
+
+# --- 3. READING ---
+def _read_index(path, backend, mmap):
+    import faiss
+
+    if not mmap:
+        return faiss.read_index(path)
+    # IVF inverted lists map with IO_FLAG_MMAP; flat code arrays (flat, SQ and
+    # the HNSW storage) need IO_FLAG_MMAP_IFC
+    flag = faiss.IO_FLAG_MMAP if backend in ("ivf", "ivfpq") else getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    try:
+        return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        logger.warning("Could not memory-map %s; reading it into memory instead", path)
+        return faiss.read_index(path)
+
+
+class SharedKnowledgeBase:
+    """
+    One published version, opened read-only. The index and chunk store are
+    memory-mapped, so every session and process on this version shares a
+    single copy through the page cache. Offers the search side of
+    KnowledgeBase (`vectorstore`, `bm25`, `fingerprint`, `documents`).
+    """
+
+    def __init__(self, directory, mmap=SHARED_KB_MMAP, embeddings=None):
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        self.version = manifest["version"]
+        self.fingerprint = manifest["fingerprint"]
+        self.source_signature = manifest["source_signature"]
+        self.documents = manifest["documents"]
+        self.failed = {}
+
+        index = _read_index(os.path.join(directory, INDEX_FILE), manifest["backend"], mmap)
+        set_search_params(index)
+        self.chunks = ChunkStore(directory, mmap)
+        self.vectorstore = FAISS(
+            embedding_function=embeddings or get_embedding_service(),
+            index=index,
+            docstore=MappedDocstore(self.chunks),
+            index_to_docstore_id=_PositionIds(index.ntotal),
+            distance_strategy=DistanceStrategy(manifest["distance_strategy"]),
+        )
+        self.bm25 = MappedBM25Index(directory, mmap)
+
+    @property
+    def index_backend(self):
+        return index_backend(self.vectorstore.index)
+
+
+def get_shared_knowledge_base(root=SHARED_KB_DIR):
+    """
+    The live version, opened once per process (None when nothing is
+    published). A swap is picked up on the next call.
+    """
+    global _opened
+    version = current_version(root)
+    if version is None:
+        return None
+    with _opened_lock:
+        if _opened is None or _opened[0] != (root, version):
+            _opened = ((root, version), SharedKnowledgeBase(os.path.join(root, version)))
+        return _opened[1]
+
+def directory_signature(path):
+    """Identity of a PDF folder's contents from names, sizes and modification times."""
+    entries = []
+    for name in sorted(os.listdir(path)):
+        if name.lower().endswith(".pdf"):
+            stat = os.stat(os.path.join(path, name))
+            entries.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha256("\n".join(entries).encode("utf-8")).hexdigest()[:16]
+
+def _build_and_publish(pdf_dir, signature, root):
+    """Build the folder's knowledge base (reusing the index cache) and publish it. False when it has no readable PDFs."""
+    with _publish_lock:
+        kb = get_shared_knowledge_base(root)
+        if kb is not None and kb.source_signature == signature:
+            return True
+        from app.knowledge_base import KnowledgeBase
+
+        builder = KnowledgeBase()
+        builder.add_directory(pdf_dir)
+        if builder.vectorstore is None:
+            _unbuildable.add(signature)
+            return False
+        publish(builder, signature, root)
+    return True
+
+def _build_in_background(pdf_dir, signature, root):
+    global _build_thread
+
+    def build():
+        try:
+            if not _build_and_publish(pdf_dir, signature, root):
+                logger.warning("No readable PDFs in %s; nothing published", pdf_dir)
+        except Exception:
+            logger.exception("Building the shared knowledge base from %s failed", pdf_dir)
+
+    with _build_lock:
+        # One build at a time; a folder that changed again is picked up by a later check
+        if _build_thread is not None and _build_thread.is_alive():
+            return
+        _build_thread = threading.Thread(target=build, name="shared-kb-build", daemon=True)
+        _build_thread.start()
+
+def shared_knowledge_base_for(pdf_dir, root=SHARED_KB_DIR, wait=False):
+    """
+    The shared knowledge base for a PDF folder. When the live version was not
+    published from the folder as it is now, a background thread builds and
+    publishes it while the last published version (or None) keeps being
+    served; `wait=True` builds in the calling thread instead (the CLI).
+    """
+    signature = directory_signature(pdf_dir)
+    kb = get_shared_knowledge_base(root)
+    if (kb is not None and kb.source_signature == signature) or signature in _unbuildable:
+        return kb
+    if wait:
+        return get_shared_knowledge_base(root) if _build_and_publish(pdf_dir, signature, root) else None
+    _build_in_background(pdf_dir, signature, root)
+    return kb
+
+def building():
+    """Whether a background rebuild is running."""
+    return _build_thread is not None and _build_thread.is_alive()
+
+
+# --- 4. SESSION UPLOADS ---
+class LayeredKnowledgeBase:
+    """
+    A session's uploads searched on top of a shared knowledge base. Each layer
+    keeps its own index, so the shared one stays memory-mapped and only the
+    uploads are embedded per session; `layers` are queried together and fused
+    with reciprocal rank fusion (see get_layered_rag_chain).
+    """
+
+    def __init__(self, shared, uploads):
+        self.layers = [shared, uploads]
+        self.failed = uploads.failed
+
+    @property
+    def fingerprint(self):
+        """Changes whenever either layer changes, so answer caches are per combination."""
+        identity = "|".join(kb.fingerprint for kb in self.layers)
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def documents(self):
+        return {doc_id: info for kb in self.layers for doc_id, info in kb.documents.items()}
+
+
+# --- 5. ENTRY POINT ---
+def main():
+    parser = argparse.ArgumentParser(description="Publish a folder of PDFs as the shared knowledge base.")
+    parser.add_argument("pdf_dir", nargs="?", help="Folder of PDFs to build and publish")
+    parser.add_argument("--status", action="store_true", help="Show the live version and exit")
+    args = parser.parse_args()
+
+    if args.pdf_dir and not args.status:
+        kb = shared_knowledge_base_for(args.pdf_dir, wait=True)
+        if kb is None:
+            parser.error(f"no readable PDFs in {args.pdf_dir}")
+    kb = get_shared_knowledge_base()
+    if kb is None:
+        print("Nothing published yet.")
+        return
+    size = sum(os.path.getsize(os.path.join(SHARED_KB_DIR, kb.version, name))
+               for name in os.listdir(os.path.join(SHARED_KB_DIR, kb.version)))
+    print(f"Live version: {kb.version}")
+    print(f"  {len(kb.documents)} documents, {kb.vectorstore.index.ntotal} chunks, "
+          f"{kb.index_backend} index, {size / 1e6:.1f} MB on disk")
+    for info in kb.documents.values():
+        print(f"  📄 {info['name']} · {info['chunks']} chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def timed_stream(chunks, metrics, label="response"):
+    """
+    Yield text from a LangChain stream (strings or message chunks) and record
+    time-to-first-token and total generation time, in ms, into `metrics`.
+    Timing starts on the first iteration, which is when the request is sent.
+    """
+    start = time.perf_counter()
+    metrics["ttft_ms"] = None
+    metrics["chunks"] = 0
+
+    for chunk in chunks:
+        text = chunk if isinstance(chunk, str) else getattr(chunk, "content", "")
+        if not text:
+            continue
+        if metrics["ttft_ms"] is None:
+            metrics["ttft_ms"] = (time.perf_counter() - start) * 1000
+        metrics["chunks"] += 1
+        yield text
+
+    metrics["total_ms"] = (time.perf_counter() - start) * 1000
+    logger.info("%s: first token %.0f ms, total %.0f ms, %d chunks",
+                label, metrics["ttft_ms"] or 0, metrics["total_ms"], metrics["chunks"])
+
+def format_metrics(metrics):
+    if metrics.get("ttft_ms") is None:
+        return f"⏱️ {metrics.get('total_ms', 0):.0f} ms"
+    return f"⏱️ First token {metrics['ttft_ms']:.0f} ms · Total {metrics['total_ms']:.0f} ms"
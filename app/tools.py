@@ -1,82 +1,45 @@
-import smtplib
-from email.message import EmailMessage
-import sqlite3
-import os
-import streamlit as st # Import streamlit to access secrets
+from db.database import add_booking
 
 # --- 1. DATABASE TOOL ---
-def save_booking_to_db(name, email, phone, booking_type, date, time):
+def save_booking_to_db(name, email, phone, booking_type, date, time, details=None):
     """
-    Saves the booking details to the SQLite database.
+    Saves the booking details to the SQLite database and queues the
+    confirmation email in the same transaction.
     """
-    # Force absolute path to ensure we hit the same DB as the dashboard
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    DB_PATH = os.path.join(BASE_DIR, '..', 'db', 'bookings.db')
-    
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        
-        # Insert Customer (simple logic: insert new row even if email exists to avoid complex logic for now)
-        c.execute("INSERT INTO customers (name, email, phone) VALUES (?, ?, ?)", (name, email, phone))
-        customer_id = c.lastrowid
-        
-        # Insert Booking
-        c.execute("INSERT INTO bookings (customer_id, booking_type, date, time, status) VALUES (?, ?, ?, ?, 'Confirmed')", 
-                  (customer_id, booking_type, date, time))
-        
-        conn.commit()
-        booking_id = c.lastrowid
-        conn.close()
-        return True, booking_id
-    except Exception as e:
-        return False, str(e)
-
-
-# --- 2. REAL EMAIL TOOL (SMTP) ---
-def send_confirmation_email(to_email, name, booking_details):
+    # One write path for the whole app: reuses the pooled connection and
+    # upserts the customer instead of inserting a duplicate row
+    summary = details if details is not None else {
+        "name": name, "email": email, "phone": phone,
+        "booking_type": booking_type, "date": date, "time": time,
+    }
+    return add_booking(
+        name, email, phone, booking_type, date, time,
+        confirmation=lambda booking_id: build_confirmation_email(name, booking_id, summary),
+    )
+
+
+# --- 2. CONFIRMATION EMAIL ---
+def build_confirmation_email(name, booking_id, booking_details):
     """
-    Sends a real email using credentials from Streamlit Secrets.
+    Subject and body of the confirmation email. The email itself is sent by
+    the background outbox worker (see app/email_outbox.py), not in the chat turn.
     """
-    # ============================================================
-    # 👇 LOAD CREDENTIALS SECURELY
-    # ============================================================
-    try:
-        SENDER_EMAIL = st.secrets["email"]["sender_email"]
-        APP_PASSWORD = st.secrets["email"]["app_password"]
-    except Exception:
-        st.error("❌ Email credentials missing! Check your .streamlit/secrets.toml")
-        return False
-    # ============================================================
-
-    # Create the email content
-    msg = EmailMessage()
-    msg['Subject'] = f"✅ Session Confirmed: {name}"
-    msg['From'] = SENDER_EMAIL
-    msg['To'] = to_email  # <--- This uses whatever email the user provided in chat!
-    
-    msg.set_content(f"""
+    subject = f"✅ Session Confirmed: {name}"
+    details = "\n    ".join(f"{key.replace('_', ' ').title()}: {value}" for key, value in booking_details.items())
+    body = f"""
     Hello {name},
 
     Your mentorship session has been successfully booked!
     
     Here are your details:
     --------------------------------------------------
-    {booking_details}
+    Booking ID: #{booking_id}
+    {details}
     --------------------------------------------------
 
     Please be ready 5 minutes before the scheduled time with your questions.
 
     Best regards,
     PyScholar AI Team
-    """)
-
-    try:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-            smtp.login(SENDER_EMAIL, APP_PASSWORD)
-            smtp.send_message(msg)
-        return True
-        
-    except Exception as e:
-        print(f"❌ Failed to send email: {e}")
-        return False
\ No newline at end of file
+    """
+    return subject, body
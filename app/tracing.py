@@ -0,0 +1,265 @@
+import logging
+import math
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.config import (
+    TRACES_DB, TRACE_SAMPLE_RATE, TRACE_RETENTION_DAYS, TRACE_MAX_SPANS, TRACE_DASHBOARD_MAX_SPANS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Spans are written by one background thread, so tracing never blocks a chat turn on disk
+_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+# Run the retention purge every this many written batches
+PURGE_EVERY = 200
+# Pause after a failed write before taking the next batch
+WRITE_RETRY_SECONDS = 1.0
+
+
+# --- 1. STORAGE ---
+def _connect():
+    """Writer connection; creates the schema, so only the writer thread (and tests) use it."""
+    os.makedirs(os.path.dirname(TRACES_DB), exist_ok=True)
+    conn = sqlite3.connect(TRACES_DB, timeout=5, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute('''CREATE TABLE IF NOT EXISTS spans
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     session_id TEXT,
+                     turn_id TEXT,
+                     stage TEXT NOT NULL,
+                     detail TEXT,
+                     started_at REAL NOT NULL,
+                     duration_ms REAL NOT NULL,
+                     ok INTEGER NOT NULL)''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_stage_time ON spans(stage, started_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_turn ON spans(turn_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_time ON spans(started_at)")
+    conn.commit()
+    return conn
+
+def _connect_readonly():
+    """Dashboard connection: no DDL and no write lock. None until the writer has created the database."""
+    try:
+        conn = sqlite3.connect(f"file:{TRACES_DB}?mode=ro", uri=True, timeout=5)
+        conn.execute("SELECT 1 FROM spans LIMIT 1")
+    except sqlite3.Error:
+        return None
+    return conn
+
+def _write_loop():
+    conn = None
+    batches = 0
+    while True:
+        rows = _queue.get()
+        taken = 1
+        # Drain whatever else is waiting into the same transaction
+        while True:
+            try:
+                rows += _queue.get_nowait()
+                taken += 1
+            except queue.Empty:
+                break
+        try:
+            if conn is None:
+                conn = _connect()
+            conn.executemany(
+                '''INSERT INTO spans (session_id, turn_id, stage, detail, started_at, duration_ms, ok)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''', rows,
+            )
+            batches += 1
+            if batches % PURGE_EVERY == 1:
+                conn.execute("DELETE FROM spans WHERE started_at < ?", (time.time() - TRACE_RETENTION_DAYS * 86400,))
+                conn.execute("DELETE FROM spans WHERE id <= (SELECT MAX(id) FROM spans) - ?", (TRACE_MAX_SPANS,))
+            conn.commit()
+        except (sqlite3.Error, OSError):
+            # Keep the thread alive: the next batch reconnects
+            logger.exception("Could not write %d trace spans", len(rows))
+            if conn is not None:
+                conn.close()
+                conn = None
+            time.sleep(WRITE_RETRY_SECONDS)
+        finally:
+            for _ in range(taken):
+                _queue.task_done()
+
+def _enqueue(rows):
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_write_loop, name="trace-writer", daemon=True)
+                _writer.start()
+    _queue.put(rows)
+
+def flush(timeout=5.0):
+    """Wait until queued spans are committed (or dropped after an error), for scripts and tests."""
+    deadline = time.time() + timeout
+    # queue.join() with a timeout: the writer marks batches done after their commit
+    with _queue.all_tasks_done:
+        while _queue.unfinished_tasks:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            _queue.all_tasks_done.wait(remaining)
+    return True
+
+
+# --- 2. SPANS ---
+class Turn:
+    """
+    Spans for one chat turn. Sampled per turn: an unsampled turn still runs
+    every `span()` block but records nothing.
+    """
+
+    def __init__(self, session_id, sampled):
+        self.session_id = session_id
+        self.turn_id = uuid.uuid4().hex[:12]
+        self.sampled = sampled
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._rows = []
+        self._lock = threading.Lock()
+
+    def add(self, stage, started_at, duration_ms, ok=True, detail=None):
+        if self.sampled:
+            with self._lock:
+                self._rows.append((self.session_id, self.turn_id, stage, detail, started_at, duration_ms, int(ok)))
+
+    @contextmanager
+    def span(self, stage, detail=None):
+        started_at, start = time.time(), time.perf_counter()
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            self.add(stage, started_at, (time.perf_counter() - start) * 1000, ok, detail)
+
+    def callbacks(self):
+        """LangChain callbacks that time retrieval and generation inside a chain."""
+        return [TraceCallbackHandler(self)] if self.sampled else []
+
+    def finish(self, detail=None):
+        """Record the whole turn and hand its spans to the background writer."""
+        if not self.sampled:
+            return
+        self.add("turn", self.started_at, (time.perf_counter() - self._start) * 1000, True, detail)
+        with self._lock:
+            rows, self._rows = self._rows, []
+        _enqueue(rows)
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """Turns LangChain retriever / chat-model start and end events into spans."""
+
+    def __init__(self, turn):
+        self.turn = turn
+        self._open = {}
+
+    def _start(self, run_id, stage):
+        self._open[run_id] = (stage, time.time(), time.perf_counter())
+
+    def _end(self, run_id, ok=True):
+        opened = self._open.pop(run_id, None)
+        if opened:
+            stage, started_at, start = opened
+            self.turn.add(stage, started_at, (time.perf_counter() - start) * 1000, ok)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id, "retrieval")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, ok=False)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "generation")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, ok=False)
+
+
+def start_turn(session_id, sample_rate=TRACE_SAMPLE_RATE):
+    return Turn(session_id, random.random() < sample_rate)
+
+def record_span(stage, duration_ms, ok=True, session_id=None, turn_id=None, detail=None,
+                sample_rate=TRACE_SAMPLE_RATE):
+    """A standalone span for work outside a chat turn (e.g. the email outbox)."""
+    if random.random() < sample_rate:
+        _enqueue([(session_id, turn_id, stage, detail, time.time() - duration_ms / 1000, duration_ms, int(ok))])
+
+
+# --- 3. QUERIES FOR THE DASHBOARD ---
+def _nearest_rank(ordered, q):
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+def stage_percentiles(since, max_spans=TRACE_DASHBOARD_MAX_SPANS):
+    """
+    (columns, rows) with the span count and p50 / p95 / p99 per stage, over
+    the newest `max_spans` spans since `since` (a unix time). The cap is applied
+    in SQL, so the cost does not grow with the trace history.
+    """
+    conn = _connect_readonly()
+    if conn is None:
+        return ["Stage", "Count", "p50 (ms)", "p95 (ms)", "p99 (ms)"], []
+    try:
+        # Newest first along idx_spans_time: the scan stops after max_spans rows
+        rows = conn.execute(
+            "SELECT stage, duration_ms FROM spans WHERE started_at >= ? ORDER BY started_at DESC LIMIT ?",
+            (since, max_spans),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    by_stage = {}
+    for stage, duration_ms in rows:
+        by_stage.setdefault(stage, []).append(duration_ms)
+    summary = []
+    for stage, durations in by_stage.items():
+        durations.sort()
+        summary.append((stage, len(durations), *(round(_nearest_rank(durations, q), 1) for q in (0.50, 0.95, 0.99))))
+    summary.sort(key=lambda row: row[3], reverse=True)
+    return ["Stage", "Count", "p50 (ms)", "p95 (ms)", "p99 (ms)"], summary
+
+def slowest_turns(since, limit=10):
+    """The slowest turns since `since`, with a stage-by-stage breakdown."""
+    conn = _connect_readonly()
+    if conn is None:
+        return [], []
+    try:
+        # Pick the turns first, so the per-turn breakdown runs `limit` times, not once per turn
+        cur = conn.execute('''
+            WITH slow AS (
+                SELECT turn_id, session_id, started_at, duration_ms, detail FROM spans
+                WHERE stage = 'turn' AND started_at >= ?
+                ORDER BY duration_ms DESC
+                LIMIT ?)
+            SELECT t.turn_id as Turn_ID, t.session_id as Session_ID,
+                   datetime(t.started_at, 'unixepoch', 'localtime') as Started,
+                   ROUND(t.duration_ms, 1) as Total_ms, t.detail as Path,
+                   (SELECT group_concat(s.stage || ' ' || CAST(ROUND(s.duration_ms) AS INTEGER) || 'ms', ' · ')
+                    FROM spans s WHERE s.turn_id = t.turn_id AND s.stage != 'turn') as Stages
+            FROM slow t
+            ORDER BY t.duration_ms DESC''', (since, limit))
+        return [d[0] for d in cur.description], cur.fetchall()
+    finally:
+        conn.close()
@@ -0,0 +1,160 @@
+"""
+Cold-start and first-response times of the Streamlit app, each run in a fresh process.
+
+    python -m benchmarks.cold_start                      # this checkout
+    python -m benchmarks.cold_start --baseline HEAD~1    # compare with another commit
+
+Every run starts a new interpreter and drives app/main.py through Streamlit's
+AppTest: "cold_start" is the first script run (imports included), "rerun" the
+next one, and "first_response" the run that answers the first chat message.
+Scenarios: "chat" (no PDF) and "knowledge_dir" (a PDF folder given via
+PYSCHOLAR_KNOWLEDGE_DIR, built and published in the background, so the first
+response may come before it is searchable).
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+SCENARIOS = ("chat", "knowledge_dir")
+# Modules whose presence after the first run shows the RAG stack was imported
+HEAVY_MODULES = ("faiss", "pypdf", "langchain_community.vectorstores", "sentence_transformers")
+
+
+# --- 1. ONE MEASURED PROCESS ---
+def _child(root, workdir, scenario, embeddings, warmup):
+    os.environ["PYSCHOLAR_CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ["PYSCHOLAR_LLM_BACKEND"] = "stub"
+    os.environ["PYSCHOLAR_STUB_LATENCY_MS"] = "0"
+    os.environ["PYSCHOLAR_EMBEDDING_WARMUP"] = "1" if warmup else "0"
+    # The fakes come from this checkout; everything else from the measured one
+    sys.path.insert(0, ROOT)
+    from benchmarks.fakes import HashingEncoder, synthetic_pdf
+
+    sys.path.remove(ROOT)
+    if scenario == "knowledge_dir":
+        os.makedirs(os.path.join(workdir, "pdfs"))
+        with open(os.path.join(workdir, "pdfs", "guide.pdf"), "wb") as f:
+            f.write(synthetic_pdf(10))
+        os.environ["PYSCHOLAR_KNOWLEDGE_DIR"] = os.path.join(workdir, "pdfs")
+    sys.path.insert(0, root)
+
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_s = time.perf_counter() - start
+
+    # Keep the checkout's bookings.db untouched
+    from db import database
+    database.DB_PATH = os.path.join(workdir, "bookings.db")
+    if embeddings == "hashing":
+        from models.embeddings import EmbeddingService, install_embedding_service
+
+        install_embedding_service(EmbeddingService(model=HashingEncoder()))
+
+    app = AppTest.from_file(os.path.join(root, "app", "main.py"), default_timeout=600)
+    start = time.perf_counter()
+    app.run()
+    cold_start_s = time.perf_counter() - start
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    start = time.perf_counter()
+    app.run()
+    rerun_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    app.chat_input[0].set_value("What topics are covered in week 2?").run()
+    first_response_s = time.perf_counter() - start
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+
+    print(json.dumps({
+        "streamlit_import_s": streamlit_s,
+        "cold_start_s": cold_start_s,
+        "rerun_s": rerun_s,
+        "first_response_s": first_response_s,
+        "heavy_modules_at_start": heavy,
+    }))
+
+def measure(root, scenario, embeddings, warmup):
+    # Removed only after the process exits: background writers may still be flushing
+    workdir = tempfile.mkdtemp(prefix="pyscholar-coldstart-")
+    try:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", root, "--workdir", workdir,
+             "--scenario", scenario, "--embeddings", embeddings] + (["--warmup"] if warmup else []),
+            capture_output=True, text=True, check=True,
+        ).stdout
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+# --- 2. REPORT ---
+def run_all(root, runs, embeddings, warmup):
+    report = {}
+    for scenario in SCENARIOS:
+        samples = [measure(root, scenario, embeddings, warmup) for _ in range(runs)]
+        report[scenario] = {
+            key: round(statistics.median(s[key] for s in samples), 3)
+            for key in ("cold_start_s", "rerun_s", "first_response_s")
+        }
+        report[scenario]["heavy_modules_at_start"] = samples[0]["heavy_modules_at_start"]
+    return report
+
+def print_report(results):
+    names = list(results)
+    print(f"{'scenario / metric':<34}" + "".join(f"{name:>16}" for name in names))
+    for scenario in SCENARIOS:
+        for key in ("cold_start_s", "rerun_s", "first_response_s"):
+            values = "".join(f"{results[name][scenario][key]:>15.3f}s" for name in names)
+            print(f"{scenario + ' / ' + key:<34}{values}")
+        modules = " | ".join(",".join(results[name][scenario]["heavy_modules_at_start"]) or "-" for name in names)
+        print(f"{scenario + ' / heavy modules':<34}  {modules}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure PyScholar cold start and first response.")
+    parser.add_argument("--baseline", help="Git ref to compare against (checked out in a temporary worktree)")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per scenario (median is reported)")
+    parser.add_argument("--embeddings", choices=["hashing", "real"], default="hashing",
+                        help="'real' loads the SentenceTransformer model instead of the offline hashing encoder")
+    parser.add_argument("--warmup", action="store_true", help="Enable PYSCHOLAR_EMBEDDING_WARMUP")
+    parser.add_argument("--out", help="Also write the results as JSON to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--scenario", default="chat", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.workdir, args.scenario, args.embeddings, args.warmup)
+        return
+
+    results = {}
+    worktree = None
+    try:
+        if args.baseline:
+            worktree = tempfile.mkdtemp(prefix="pyscholar-baseline-")
+            subprocess.run(["git", "worktree", "add", "--detach", worktree, args.baseline],
+                           cwd=ROOT, check=True, capture_output=True)
+            print(f"▶ baseline {args.baseline} ...", flush=True)
+            results[args.baseline] = run_all(worktree, args.runs, args.embeddings, args.warmup)
+        print("▶ current checkout ...", flush=True)
+        results["current"] = run_all(ROOT, args.runs, args.embeddings, args.warmup)
+    finally:
+        if worktree:
+            subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=ROOT, capture_output=True)
+
+    print_report(results)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
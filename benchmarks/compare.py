@@ -0,0 +1,62 @@
+"""
+Compare two benchmark result files:
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+import json
+import sys
+
+# Metric suffixes where a bigger number is better; every other timing is lower-is-better
+HIGHER_IS_BETTER = ("_per_sec",)
+TIMING_SUFFIXES = ("_ms", "_s")
+
+
+def flatten(tree, prefix=""):
+    for key, value in tree.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+def compare(base, new, threshold):
+    """Rows of (metric, base, new, % change, regressed) for metrics present in both runs."""
+    base_metrics = dict(flatten(base["results"]))
+    rows = []
+    for metric, value in flatten(new["results"]):
+        if metric not in base_metrics or not metric.endswith(HIGHER_IS_BETTER + TIMING_SUFFIXES):
+            continue
+        old = base_metrics[metric]
+        change = (value - old) / old * 100 if old else 0.0
+        worse = -change if metric.endswith(HIGHER_IS_BETTER) else change
+        rows.append((metric, old, value, change, worse > threshold))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs.")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="%% change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"base {base['meta'].get('commit')} ({base['meta']['timestamp']})  →  "
+          f"new {new['meta'].get('commit')} ({new['meta']['timestamp']})")
+    rows = compare(base, new, args.threshold)
+    width = max((len(r[0]) for r in rows), default=10)
+    for metric, old, value, change, regressed in rows:
+        flag = "  ⚠️ regression" if regressed else ""
+        print(f"{metric:<{width}}  {old:>12.3f}  {value:>12.3f}  {change:>+8.1f}%{flag}")
+
+    regressions = sum(r[4] for r in rows)
+    print(f"\n{regressions} regression(s) above {args.threshold:.0f}%")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
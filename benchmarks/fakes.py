@@ -0,0 +1,70 @@
+import random
+import re
+import zlib
+
+import numpy as np
+
+WORD_RE = re.compile(r"\w+")
+
+VOCABULARY = (
+    "python pandas numpy statistics regression classification clustering feature engineering "
+    "model evaluation deployment mentor session week module project interview review career "
+    "guidance dataset pipeline visualization notebook assignment deadline capstone sql query "
+    "neural network gradient descent overfitting validation accuracy precision recall"
+).split()
+
+
+class HashingEncoder:
+    """
+    Deterministic stand-in for SentenceTransformer: a hashed bag of words,
+    L2-normalized. Similar texts get similar vectors, and no model is downloaded.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in WORD_RE.findall(text.lower()):
+                vectors[row, zlib.crc32(word.encode("utf-8")) % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+def synthetic_text(rng, words):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+def make_pdf(pages):
+    """A minimal valid PDF with one page of Helvetica text per string in `pages`."""
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page objects are numbered
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for text in pages:
+        lines = [text[i:i + 90].replace("(", "").replace(")", "").replace("\\", "") for i in range(0, len(text), 90)]
+        ops = "BT /F1 9 Tf 36 760 Td 11 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(ops)} >>\nstream\n{ops}\nendstream")
+        content = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content} 0 R >>")
+        kids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return out
+
+def synthetic_pdf(pages, words_per_page=450, seed=0):
+    rng = random.Random(seed)
+    return make_pdf([synthetic_text(rng, words_per_page) for _ in range(pages)])
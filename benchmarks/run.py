@@ -0,0 +1,289 @@
+"""
+Offline benchmarks for the chat, ingestion, database and dashboard hot paths.
+
+    python -m benchmarks.run                      # everything, results in benchmarks/results/
+    python -m benchmarks.run --only db_queries --rows 10000,100000
+    python -m benchmarks.compare old.json new.json
+
+The LLM is the stub chat model and embeddings come from a hashing encoder,
+so runs need no network, API key or model download.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+# Configure the app for offline runs before any app module reads its config
+_WORKDIR = tempfile.mkdtemp(prefix="pyscholar-bench-")
+os.environ.setdefault("PYSCHOLAR_CACHE_DIR", os.path.join(_WORKDIR, "cache"))
+os.environ.setdefault("PYSCHOLAR_LLM_BACKEND", "stub")
+os.environ.setdefault("PYSCHOLAR_STUB_LATENCY_MS", "0")
+os.environ.setdefault("PYSCHOLAR_LLM_REQUESTS_PER_MINUTE", "10000000")
+os.environ.setdefault("PYSCHOLAR_LLM_BURST", "100000")
+os.environ.setdefault("PYSCHOLAR_SEMANTIC_CACHE", "0")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.fakes import HashingEncoder, synthetic_pdf, synthetic_text
+from db import database
+from models.embeddings import EmbeddingService, install_embedding_service
+from models.llm import get_chat_model
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BOOKING_TYPES = ["Mock Interview", "Code Review", "Career Guidance"]
+
+
+# --- 1. HELPERS ---
+def summarize(samples_ms):
+    samples = sorted(samples_ms)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    return {
+        "n": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(pick(0.50), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+def fresh_database(name):
+    database.DB_PATH = os.path.join(_WORKDIR, f"{name}.db")
+    database.init_db()
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- 2. BENCHMARKS ---
+def bench_booking_flow(conversations=50):
+    """Per-turn latency of a four-message booking conversation (intent, slot parsing, availability)."""
+    from app.booking_flow import extract_booking_details, missing_fields, check_availability
+    from app.chat_logic import determine_intent
+
+    fresh_database("booking_flow")
+    llm = get_chat_model()
+    start_day = datetime.now().date() + timedelta(days=1)
+    turns_ms = []
+    for i in range(conversations):
+        day = start_day + timedelta(days=i)
+        messages = [
+            "I want to book a mock interview",
+            f"My name is Student {chr(65 + i % 26)}",
+            f"student{i}@example.com, 98765{i:05d}",
+            f"{day.isoformat()} at 10am",
+        ]
+        details, in_progress = {}, False
+        for message in messages:
+            start = time.perf_counter()
+            if not in_progress:
+                in_progress = determine_intent(message, llm) == "BOOKING"
+            missing = missing_fields(details)
+            details.update(extract_booking_details(message, details, llm, missing[0] if missing else None))
+            if not missing_fields(details):
+                check_availability(details)
+            turns_ms.append((time.perf_counter() - start) * 1000)
+    return summarize(turns_ms)
+
+def _knowledge_base(docs, pages):
+    from app.knowledge_base import KnowledgeBase
+
+    kb = KnowledgeBase(backend="flat")
+    kb.add_pdfs([(f"guide-{i}.pdf", synthetic_pdf(pages, seed=i)) for i in range(docs)])
+    return kb
+
+def bench_rag_flow(turns=100):
+    """Per-turn latency of intent routing + hybrid retrieval + context assembly + (stub) generation."""
+    import random
+
+    from app.chains import get_rag_chain
+    from app.chat_logic import determine_intent
+    from app.llm_gateway import get_gateway
+
+    kb = _knowledge_base(docs=2, pages=20)
+    llm = get_chat_model()
+    chain = get_rag_chain(llm, kb.vectorstore, kb.bm25)
+    rng = random.Random(1)
+    turns_ms = []
+    for i in range(turns):
+        question = f"What does week {i % 12} cover about {synthetic_text(rng, 3)}?"
+        start = time.perf_counter()
+        determine_intent(question, llm)
+        get_gateway().invoke(chain, question)
+        turns_ms.append((time.perf_counter() - start) * 1000)
+    return summarize(turns_ms)
+
+def bench_ingestion(docs=3, pages=40):
+    """Pages/sec and chunks/sec for a cold build, plus the time to reload the same PDFs from the index cache."""
+    start = time.perf_counter()
+    kb = _knowledge_base(docs, pages)
+    cold_s = time.perf_counter() - start
+    chunks = sum(info["chunks"] for info in kb.documents.values())
+
+    start = time.perf_counter()
+    _knowledge_base(docs, pages)
+    cached_s = time.perf_counter() - start
+    return {
+        "documents": docs,
+        "pages": docs * pages,
+        "chunks": chunks,
+        "cold_s": round(cold_s, 3),
+        "pages_per_sec": round(docs * pages / cold_s, 1),
+        "chunks_per_sec": round(chunks / cold_s, 1),
+        "cached_s": round(cached_s, 3),
+    }
+
+def bench_db_writes(writer_counts=(1, 4, 8), per_writer=200):
+    """Booking inserts/sec (booking + customer upsert + outbox email) with concurrent writer threads."""
+    from app.tools import save_booking_to_db
+
+    results = {}
+    for writers in writer_counts:
+        fresh_database(f"writes_{writers}")
+        errors = []
+        base = datetime(2030, 1, 1)
+
+        def write(worker):
+            for i in range(per_writer):
+                n = worker * per_writer + i
+                slot = base + timedelta(days=n // 9, hours=9 + n % 9)
+                ok, result = save_booking_to_db(
+                    f"Writer {worker}", f"w{worker}-{i}@example.com", "9876543210", "Code Review",
+                    slot.strftime("%Y-%m-%d"), slot.strftime("%H:%M"),
+                )
+                if not ok:
+                    errors.append(result)
+
+        threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        results[f"writers_{writers}"] = {
+            "bookings": writers * per_writer,
+            "errors": len(errors),
+            "bookings_per_sec": round(writers * per_writer / elapsed, 1),
+        }
+    return results
+
+def _bulk_load(start, stop):
+    """Insert bookings [start, stop) directly, with unique slots and ~5 bookings per customer."""
+    base = datetime(2000, 1, 1)
+    with database.transaction() as c:
+        c.executemany(
+            "INSERT OR IGNORE INTO customers (id, name, email, phone) VALUES (?, ?, ?, ?)",
+            ((n // 5 + 1, f"Customer {n // 5}", f"customer{n // 5}@example.com", "9876543210")
+             for n in range(start, stop)),
+        )
+        rows = []
+        for n in range(start, stop):
+            booking_type = BOOKING_TYPES[n % 3]
+            slot = n // 3
+            when = base + timedelta(days=slot // 9, hours=9 + slot % 9)
+            date, time_ = when.strftime("%Y-%m-%d"), when.strftime("%H:%M")
+            rows.append((n // 5 + 1, booking_type, date, time_, "Confirmed" if n % 4 else "Pending",
+                         f"{date} {time_}", booking_type))
+        c.executemany(
+            '''INSERT INTO bookings (customer_id, booking_type, date, time, status, slot_start, resource)
+               VALUES (?, ?, ?, ?, ?, ?, ?)''', rows,
+        )
+
+def bench_db_queries(row_counts=(10_000, 100_000, 1_000_000), repeats=20):
+    """Dashboard query times as the bookings table grows (loaded incrementally)."""
+    fresh_database("dashboard")
+    results, loaded = {}, 0
+    for rows in sorted(row_counts):
+        load_ms, _ = timed(_bulk_load, loaded, rows)
+        loaded = rows
+
+        middle_id = rows // 2
+        dates = database.distinct_booking_dates()
+        some_date = dates[len(dates) // 2]
+        queries = {
+            "first_page": lambda: database.search_bookings(page_size=25),
+            "deep_page": lambda: database.search_bookings(before_id=middle_id, page_size=25),
+            "search_fts": lambda: database.search_bookings(search="customer12", page_size=25),
+            "search_short": lambda: database.search_bookings(search="r1", page_size=25),
+            "date_filter": lambda: database.search_bookings(date=some_date, page_size=25),
+            "filtered_counts": lambda: database.count_bookings_by_status(search="customer12"),
+            "stats": database.get_booking_stats,
+            "distinct_dates": database.distinct_booking_dates,
+            "slot_free": lambda: database.is_slot_free("Code Review", "2001-06-01 10:00"),
+        }
+        timings = {}
+        for name, query in queries.items():
+            timings[name] = summarize([timed(query)[0] for _ in range(repeats)])
+        results[f"rows_{rows}"] = {"load_s": round(load_ms / 1000, 2), "queries": timings}
+    return results
+
+
+BENCHMARKS = {
+    "booking_flow": bench_booking_flow,
+    "rag_flow": bench_rag_flow,
+    "ingestion": bench_ingestion,
+    "db_writes": bench_db_writes,
+    "db_queries": bench_db_queries,
+}
+
+
+# --- 3. ENTRY POINT ---
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline PyScholar benchmarks.")
+    parser.add_argument("--only", help="Comma-separated subset of: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--rows", default="10000,100000,1000000", help="Row counts for db_queries")
+    parser.add_argument("--out", help="Results file (default: benchmarks/results/<time>_<commit>.json)")
+    args = parser.parse_args()
+
+    install_embedding_service(EmbeddingService(model=HashingEncoder()))
+    selected = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = set(selected) - BENCHMARKS.keys()
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in selected:
+        print(f"▶ {name} ...", flush=True)
+        start = time.perf_counter()
+        if name == "db_queries":
+            results[name] = bench_db_queries(tuple(int(r) for r in args.rows.split(",")))
+        else:
+            results[name] = BENCHMARKS[name]()
+        print(f"  done in {time.perf_counter() - start:.1f}s: {json.dumps(results[name])[:200]}", flush=True)
+
+    now = datetime.now(timezone.utc)
+    commit = git_commit()
+    report = {
+        "meta": {
+            "timestamp": now.isoformat(timespec="seconds"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"{now:%Y%m%dT%H%M%S}_{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,511 @@
+import queue
 import sqlite3
 import os
+import threading
+import time as _time
+from contextlib import contextmanager
+from datetime import datetime
 
 # FORCE ABSOLUTE PATH to avoid "table not found" errors
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "bookings.db")
 
-def get_connection():
-    return sqlite3.connect(DB_PATH)
+POOL_SIZE = 5
+
+# Applied to every pooled connection. WAL lets the dashboard read while chat
+# sessions write; busy_timeout waits out short write locks instead of failing.
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA temp_store=MEMORY",
+]
+
+
+# --- 1. CONNECTION POOL ---
+class ConnectionPool:
+    """A small pool of SQLite connections shared by every thread in the process."""
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # isolation_level=None: transactions are explicit (see `transaction`)
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.path != DB_PATH:
+            _pool = ConnectionPool(DB_PATH)
+        return _pool
+
+@contextmanager
+def connection():
+    """Borrow a pooled connection for reads."""
+    pool = _get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+@contextmanager
+def transaction():
+    """
+    Borrow a pooled connection inside a write transaction. BEGIN IMMEDIATE
+    takes the write lock up front, so concurrent writers queue on busy_timeout
+    instead of failing when a read lock is upgraded.
+    """
+    with connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+# --- 2. SCHEMA ---
+# Database paths already initialized by this process
+_initialized = set()
+_init_lock = threading.Lock()
 
 def init_db():
-    """Initializes the database with the required tables."""
-    conn = get_connection()
-    c = conn.cursor()
-    
-    # 1. Create Customers Table
-    c.execute('''CREATE TABLE IF NOT EXISTS customers
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                  name TEXT, 
-                  email TEXT, 
-                  phone TEXT)''')
-    
-    # 2. Create Bookings Table
-    c.execute('''CREATE TABLE IF NOT EXISTS bookings
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                  customer_id INTEGER, 
-                  booking_type TEXT, 
-                  date TEXT, 
-                  time TEXT, 
-                  status TEXT,
-                  FOREIGN KEY(customer_id) REFERENCES customers(id))''')
-    
-    conn.commit()
-    conn.close()
+    """
+    Initializes the database with the required tables. Runs once per process
+    and database path; later calls (every Streamlit rerun) return immediately.
+    """
+    with _init_lock:
+        if DB_PATH in _initialized:
+            return
+        _init_schema()
+        _initialized.add(DB_PATH)
+
+def _init_schema():
+    with transaction() as c:
+        # 1. Create Customers Table
+        c.execute('''CREATE TABLE IF NOT EXISTS customers
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      name TEXT,
+                      email TEXT,
+                      phone TEXT)''')
+
+        # 2. Create Bookings Table
+        c.execute('''CREATE TABLE IF NOT EXISTS bookings
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      customer_id INTEGER,
+                      booking_type TEXT,
+                      date TEXT,
+                      time TEXT,
+                      status TEXT,
+                      FOREIGN KEY(customer_id) REFERENCES customers(id))''')
+
+        # 3. One customer row per email (older versions inserted a new row per booking)
+        has_unique_email = c.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_customers_email'"
+        ).fetchone()
+        if not has_unique_email:
+            _merge_duplicate_customers(c)
+            c.execute("CREATE UNIQUE INDEX idx_customers_email ON customers(email)")
+
+        # 4. Indexes for the dashboard and availability queries
+        c.execute("CREATE INDEX IF NOT EXISTS idx_bookings_date_time ON bookings(date, time)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings(status)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_bookings_customer ON bookings(customer_id)")
+
+        # 5. Full-text index over customer name/email for the dashboard search
+        _create_customer_search_index(c)
+
+        # 6. Version counter bumped on every booking change, used to invalidate dashboard caches
+        c.execute('''CREATE TABLE IF NOT EXISTS data_version
+                     (name TEXT PRIMARY KEY,
+                      version INTEGER NOT NULL)''')
+        c.execute("INSERT OR IGNORE INTO data_version (name, version) VALUES ('bookings', 0)")
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            c.execute(f'''CREATE TRIGGER IF NOT EXISTS bookings_version_{event.lower()}
+                          AFTER {event} ON bookings BEGIN
+                              UPDATE data_version SET version = version + 1 WHERE name = 'bookings';
+                          END''')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS customers_version_update
+                     AFTER UPDATE ON customers BEGIN
+                         UPDATE data_version SET version = version + 1 WHERE name = 'bookings';
+                     END''')
+
+        # 7. Running counts per status / date / booking type for the dashboard metrics
+        _create_booking_stats(c)
+
+        # 8. Normalized slots: one active booking per (resource, slot_start)
+        _create_slot_index(c)
+
+        # 9. Confirmation emails waiting for the background sender
+        c.execute('''CREATE TABLE IF NOT EXISTS email_outbox
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      booking_id INTEGER,
+                      to_email TEXT NOT NULL,
+                      subject TEXT NOT NULL,
+                      body TEXT NOT NULL,
+                      status TEXT NOT NULL DEFAULT 'pending',
+                      attempts INTEGER NOT NULL DEFAULT 0,
+                      next_attempt_at REAL NOT NULL,
+                      last_error TEXT,
+                      created_at REAL NOT NULL,
+                      sent_at REAL,
+                      FOREIGN KEY(booking_id) REFERENCES bookings(id) ON DELETE SET NULL)''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON email_outbox(status, next_attempt_at)")
+
     print(f"Database initialized at: {DB_PATH}")
 
-def add_booking(name, email, phone, booking_type, date, time):
-    conn = get_connection()
-    c = conn.cursor()
+def _create_customer_search_index(c):
+    """
+    FTS5 trigram index kept in sync with `customers` by triggers. Trigrams give
+    case-insensitive substring matches, like the old pandas str.contains filter.
+    Skipped when this SQLite build lacks FTS5 or the trigram tokenizer.
+    """
+    if c.execute("SELECT 1 FROM sqlite_master WHERE name = 'customers_fts'").fetchone():
+        return
+    c.execute("SAVEPOINT customers_fts")
     try:
-        # Check if customer exists, else create
-        c.execute("SELECT id FROM customers WHERE email = ?", (email,))
-        data = c.fetchone()
-        
-        if data:
-            customer_id = data[0]
-        else:
-            c.execute("INSERT INTO customers (name, email, phone) VALUES (?, ?, ?)", (name, email, phone))
-            customer_id = c.lastrowid
-            
-        # Insert Booking
-        c.execute("INSERT INTO bookings (customer_id, booking_type, date, time, status) VALUES (?, ?, ?, ?, 'Confirmed')", 
-                  (customer_id, booking_type, date, time))
-        conn.commit()
-        return True, c.lastrowid
+        c.execute('''CREATE VIRTUAL TABLE customers_fts USING fts5
+                     (name, email, content='customers', content_rowid='id', tokenize='trigram')''')
+    except sqlite3.OperationalError:
+        c.execute("ROLLBACK TO customers_fts")
+        c.execute("RELEASE customers_fts")
+        return
+
+    c.execute('''CREATE TRIGGER customers_fts_insert AFTER INSERT ON customers BEGIN
+                     INSERT INTO customers_fts (rowid, name, email) VALUES (new.id, new.name, new.email);
+                 END''')
+    c.execute('''CREATE TRIGGER customers_fts_delete AFTER DELETE ON customers BEGIN
+                     INSERT INTO customers_fts (customers_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email);
+                 END''')
+    c.execute('''CREATE TRIGGER customers_fts_update AFTER UPDATE ON customers BEGIN
+                     INSERT INTO customers_fts (customers_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email);
+                     INSERT INTO customers_fts (rowid, name, email) VALUES (new.id, new.name, new.email);
+                 END''')
+    # Index the customers that existed before the FTS table
+    c.execute("INSERT INTO customers_fts (customers_fts) VALUES ('rebuild')")
+    c.execute("RELEASE customers_fts")
+
+STATS_DIMENSIONS = ["status", "date", "booking_type"]
+
+def _create_booking_stats(c):
+    """
+    booking_stats holds one row per (dimension, value) with its booking count,
+    plus ('total', 'all'). Triggers keep it current on every insert, update and
+    delete, so metrics never need to scan `bookings`.
+    """
+    if c.execute("SELECT 1 FROM sqlite_master WHERE name = 'booking_stats'").fetchone():
+        return
+
+    c.execute('''CREATE TABLE booking_stats
+                 (dimension TEXT NOT NULL,
+                  key TEXT NOT NULL,
+                  count INTEGER NOT NULL,
+                  PRIMARY KEY (dimension, key)) WITHOUT ROWID''')
+
+    def bump(row, delta):
+        keys = [("'total'", "'all'")] + [(f"'{d}'", f"COALESCE({row}.{d}, '')") for d in STATS_DIMENSIONS]
+        return "\n".join(
+            f'''INSERT INTO booking_stats (dimension, key, count) VALUES ({dim}, {key}, {delta})
+                ON CONFLICT (dimension, key) DO UPDATE SET count = count + ({delta});'''
+            for dim, key in keys
+        )
+
+    c.execute(f'''CREATE TRIGGER booking_stats_insert AFTER INSERT ON bookings BEGIN
+                      {bump("new", 1)}
+                  END''')
+    c.execute(f'''CREATE TRIGGER booking_stats_delete AFTER DELETE ON bookings BEGIN
+                      {bump("old", -1)}
+                  END''')
+    c.execute(f'''CREATE TRIGGER booking_stats_update AFTER UPDATE OF status, date, booking_type ON bookings BEGIN
+                      {bump("old", -1)}
+                      {bump("new", 1)}
+                  END''')
+
+    # Backfill from the bookings that already exist
+    c.execute("INSERT INTO booking_stats (dimension, key, count) SELECT 'total', 'all', COUNT(*) FROM bookings")
+    for d in STATS_DIMENSIONS:
+        c.execute(f'''INSERT INTO booking_stats (dimension, key, count)
+                      SELECT '{d}', COALESCE({d}, ''), COUNT(*) FROM bookings GROUP BY COALESCE({d}, '')''')
+
+def _create_slot_index(c):
+    """
+    `slot_start` ("YYYY-MM-DD HH:MM", sortable as text) and `resource` (the
+    booking type being booked) are derived from the free-text date/time. A
+    partial unique index over active bookings rejects double bookings and
+    answers "is this slot free" / "booked slots in a range" with an index seek.
+    """
+    columns = {row[1] for row in c.execute("PRAGMA table_info(bookings)")}
+    if "slot_start" not in columns:
+        c.execute("ALTER TABLE bookings ADD COLUMN slot_start TEXT")
+    if "resource" not in columns:
+        c.execute("ALTER TABLE bookings ADD COLUMN resource TEXT")
+    if c.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_bookings_slot'").fetchone():
+        return
+
+    # Backfill existing rows; if a slot was already double-booked only the
+    # oldest booking claims it, the rest keep a NULL slot_start
+    c.execute("UPDATE bookings SET resource = booking_type WHERE resource IS NULL")
+    c.execute('''UPDATE bookings SET slot_start = date || ' ' || time
+                 WHERE slot_start IS NULL AND status != 'Cancelled'
+                   AND date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+                   AND time GLOB '[0-9][0-9]:[0-9][0-9]'
+                   AND id = (SELECT MIN(b2.id) FROM bookings b2
+                             WHERE b2.resource = bookings.resource AND b2.date = bookings.date
+                               AND b2.time = bookings.time AND b2.status != 'Cancelled')''')
+    c.execute('''CREATE UNIQUE INDEX idx_bookings_slot ON bookings(resource, slot_start)
+                 WHERE status != 'Cancelled' ''')
+
+def _merge_duplicate_customers(c):
+    """Point every booking at the oldest customer row for its email, then drop the rest."""
+    c.execute("UPDATE customers SET email = lower(trim(email)) WHERE email IS NOT NULL")
+    c.execute('''UPDATE bookings SET customer_id = (
+                     SELECT MIN(c2.id) FROM customers c1
+                     JOIN customers c2 ON c2.email = c1.email
+                     WHERE c1.id = bookings.customer_id)
+                 WHERE customer_id IN (SELECT id FROM customers WHERE email IS NOT NULL)''')
+    c.execute('''DELETE FROM customers WHERE email IS NOT NULL AND id NOT IN (
+                     SELECT MIN(id) FROM customers WHERE email IS NOT NULL GROUP BY email)''')
+
+
+# --- 3. BOOKINGS ---
+SLOT_TAKEN = "That slot has just been booked by someone else."
+
+def slot_key(date, time):
+    """Normalized "YYYY-MM-DD HH:MM" slot for a date and a 24h time, or None if either is unparseable."""
+    try:
+        return datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M").strftime("%Y-%m-%d %H:%M")
+    except (TypeError, ValueError):
+        return None
+
+def add_booking(name, email, phone, booking_type, date, time, confirmation=None):
+    """
+    Insert a confirmed booking. `confirmation(booking_id)` may return a
+    (subject, body) email, which is queued in the outbox inside the same
+    transaction so a booking never commits without its email (or vice versa).
+    """
+    try:
+        with transaction() as c:
+            # Create the customer, or refresh their details if the email is already known
+            customer_id = c.execute(
+                '''INSERT INTO customers (name, email, phone) VALUES (?, ?, ?)
+                   ON CONFLICT(email) DO UPDATE SET name = excluded.name, phone = excluded.phone
+                   RETURNING id''',
+                (name, email.strip().lower(), phone),
+            ).fetchone()[0]
+
+            # Insert Booking
+            cur = c.execute('''INSERT INTO bookings (customer_id, booking_type, date, time, status, slot_start, resource)
+                               VALUES (?, ?, ?, ?, 'Confirmed', ?, ?)''',
+                            (customer_id, booking_type, date, time, slot_key(date, time), booking_type))
+            if confirmation is not None:
+                subject, body = confirmation(cur.lastrowid)
+                _enqueue_email(c, cur.lastrowid, email.strip().lower(), subject, body)
+        return True, cur.lastrowid
+    except sqlite3.IntegrityError as e:
+        # Lost a race for the slot between the availability check and confirmation
+        return False, SLOT_TAKEN if "slot_start" in str(e) else str(e)
     except Exception as e:
         return False, str(e)
-    finally:
-        conn.close()
\ No newline at end of file
+
+def is_slot_free(resource, slot_start):
+    with connection() as conn:
+        return conn.execute(
+            "SELECT 1 FROM bookings WHERE resource = ? AND slot_start = ? AND status != 'Cancelled' LIMIT 1",
+            (resource, slot_start),
+        ).fetchone() is None
+
+def booked_slots(resource, start, end):
+    """Active slot_start values for `resource` in [start, end), in order (one index range scan)."""
+    with connection() as conn:
+        return [row[0] for row in conn.execute(
+            '''SELECT slot_start FROM bookings
+               WHERE resource = ? AND slot_start >= ? AND slot_start < ? AND status != 'Cancelled'
+               ORDER BY slot_start''', (resource, start, end),
+        )]
+
+def _booking_filters(conn, search=None, date=None):
+    """WHERE clause + params for the dashboard's name/email search and date filter."""
+    clauses, params = [], []
+    if search:
+        search = search.strip()
+        if len(search) >= 3 and _has_search_index(conn):
+            # Quoted so FTS5 treats the input as a literal substring, not query syntax
+            clauses.append("b.customer_id IN (SELECT rowid FROM customers_fts WHERE customers_fts MATCH ?)")
+            params.append('"' + search.replace('"', '""') + '"')
+        else:
+            # Trigrams need 3+ characters; shorter terms fall back to LIKE
+            pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            clauses.append("(c.name LIKE ? ESCAPE '\\' OR c.email LIKE ? ESCAPE '\\')")
+            params += [pattern, pattern]
+    if date:
+        clauses.append("b.date = ?")
+        params.append(date)
+    return (" AND ".join(clauses) or "1"), params
+
+def _has_search_index(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'customers_fts'").fetchone() is not None
+
+def search_bookings(search=None, date=None, before_id=None, page_size=25):
+    """
+    One page of bookings, newest first. Keyset pagination: pass the last
+    Booking_ID of the previous page as `before_id`. Returns
+    (columns, rows, next_before_id); next_before_id is None on the last page.
+    """
+    with connection() as conn:
+        where, params = _booking_filters(conn, search, date)
+        if before_id is not None:
+            where += " AND b.id < ?"
+            params.append(before_id)
+        cur = conn.execute(f"""
+        SELECT
+            b.id as Booking_ID,
+            c.name as Customer_Name,
+            c.email as Email,
+            c.phone as Phone,
+            b.booking_type as Service_Type,
+            b.date as Date,
+            b.time as Time,
+            b.status as Status
+        FROM bookings b
+        JOIN customers c ON b.customer_id = c.id
+        WHERE {where}
+        ORDER BY b.id DESC
+        LIMIT ?
+        """, params + [page_size + 1])
+        columns = [d[0] for d in cur.description]
+        rows = cur.fetchall()
+
+    next_before_id = rows[page_size - 1][0] if len(rows) > page_size else None
+    return columns, rows[:page_size], next_before_id
+
+def count_bookings_by_status(search=None, date=None):
+    """{status: count} for the bookings matching the dashboard filters."""
+    with connection() as conn:
+        where, params = _booking_filters(conn, search, date)
+        rows = conn.execute(f"""
+        SELECT b.status, COUNT(*)
+        FROM bookings b
+        JOIN customers c ON b.customer_id = c.id
+        WHERE {where}
+        GROUP BY b.status
+        """, params).fetchall()
+    return dict(rows)
+
+def distinct_booking_dates():
+    """Every booked date, read from the trigger-maintained booking_stats table."""
+    with connection() as conn:
+        return [row[0] for row in conn.execute(
+            "SELECT key FROM booking_stats WHERE dimension = 'date' AND count > 0 AND key != '' ORDER BY key"
+        )]
+
+def get_booking_stats():
+    """{dimension: {value: count}} for 'total', 'status', 'date' and 'booking_type'."""
+    stats = {"total": {"all": 0}}
+    with connection() as conn:
+        for dimension, key, count in conn.execute(
+            "SELECT dimension, key, count FROM booking_stats WHERE count > 0 ORDER BY dimension, key"
+        ):
+            stats.setdefault(dimension, {})[key] = count
+    return stats
+
+def bookings_version():
+    """Changes whenever a booking is written; used as a cache key."""
+    with connection() as conn:
+        row = conn.execute("SELECT version FROM data_version WHERE name = 'bookings'").fetchone()
+    return row[0] if row else 0
+
+
+# --- 4. EMAIL OUTBOX ---
+def _enqueue_email(c, booking_id, to_email, subject, body):
+    now = _time.time()
+    c.execute('''INSERT INTO email_outbox (booking_id, to_email, subject, body, next_attempt_at, created_at)
+                 VALUES (?, ?, ?, ?, ?, ?)''', (booking_id, to_email, subject, body, now, now))
+
+def claim_outbox_batch(limit, lease_seconds):
+    """
+    Claim up to `limit` due emails for sending. Claimed rows move to 'sending'
+    with a lease; if the sender dies mid-batch they become due again when the
+    lease runs out, so every email is retried rather than lost.
+    """
+    now = _time.time()
+    with transaction() as c:
+        rows = c.execute('''UPDATE email_outbox
+                            SET status = 'sending', attempts = attempts + 1, next_attempt_at = ?
+                            WHERE id IN (SELECT id FROM email_outbox
+                                         WHERE status IN ('pending', 'sending') AND next_attempt_at <= ?
+                                         ORDER BY next_attempt_at LIMIT ?)
+                            RETURNING id, to_email, subject, body, attempts''',
+                         (now + lease_seconds, now, limit)).fetchall()
+    return sorted(rows)
+
+def mark_email_sent(outbox_id):
+    with transaction() as c:
+        c.execute("UPDATE email_outbox SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?",
+                  (_time.time(), outbox_id))
+
+def mark_email_failed(outbox_id, error, retry_at=None):
+    """Schedule another attempt at `retry_at`, or dead-letter the email when it is None."""
+    with transaction() as c:
+        if retry_at is None:
+            c.execute("UPDATE email_outbox SET status = 'dead', last_error = ? WHERE id = ?", (error, outbox_id))
+        else:
+            c.execute("UPDATE email_outbox SET status = 'pending', next_attempt_at = ?, last_error = ? WHERE id = ?",
+                      (retry_at, error, outbox_id))
+
+def requeue_dead_emails():
+    """Give every dead-lettered email a fresh set of attempts. Returns how many were requeued."""
+    with transaction() as c:
+        return c.execute('''UPDATE email_outbox SET status = 'pending', attempts = 0, next_attempt_at = ?
+                            WHERE status = 'dead' ''', (_time.time(),)).rowcount
+
+def purge_sent_emails(older_than):
+    with transaction() as c:
+        c.execute("DELETE FROM email_outbox WHERE status = 'sent' AND sent_at < ?", (older_than,))
+
+def outbox_status():
+    """{status: count} over the outbox, plus the most recent failures for the dashboard."""
+    with connection() as conn:
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM email_outbox GROUP BY status").fetchall())
+        cur = conn.execute('''SELECT id as Outbox_ID, booking_id as Booking_ID, to_email as Email, status as Status,
+                                   attempts as Attempts, last_error as Last_Error
+                            FROM email_outbox
+                            WHERE last_error IS NOT NULL AND status != 'sent'
+                            ORDER BY id DESC LIMIT 20''')
+        columns = [d[0] for d in cur.description]
+        failures = cur.fetchall()
+    return counts, columns, failures
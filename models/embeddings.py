@@ -0,0 +1,170 @@
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+
+from app.config import EMBEDDING_MODEL, EMBED_BATCH_SIZE, QUERY_BATCH_SIZE, QUERY_BATCH_WAIT_MS, QUERY_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+_services = {}
+_services_lock = threading.Lock()
+# Models whose background warm-up has started
+_warming = set()
+
+
+class EmbeddingService(Embeddings):
+    """
+    One SentenceTransformer per process, shared by every session.
+    Documents are encoded in fixed-size batches; concurrent query embeddings
+    are collected for a few milliseconds and encoded in a single forward pass.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL, batch_size=EMBED_BATCH_SIZE,
+                 query_batch_size=QUERY_BATCH_SIZE, query_wait_ms=QUERY_BATCH_WAIT_MS, model=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.query_batch_size = query_batch_size
+        self.query_wait = query_wait_ms / 1000.0
+        if model is None:
+            # Imported here so the model library only loads when embeddings are needed
+            from sentence_transformers import SentenceTransformer
+
+            model = SentenceTransformer(model_name)
+        # Anything with SentenceTransformer's `encode(texts, batch_size, show_progress_bar)`
+        self.model = model
+
+        self._encode_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "documents": {"texts": 0, "batches": 0, "seconds": 0.0},
+            "queries": {"texts": 0, "batches": 0, "seconds": 0.0},
+        }
+        self._queries = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        # The same user message is embedded by the intent router, the answer
+        # cache and the retriever; remember recent query vectors
+        self._query_cache = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+
+    # --- 1. ENCODING ---
+    def _encode(self, texts, kind, batch_size):
+        start = time.perf_counter()
+        with self._encode_lock:
+            vectors = self.model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+        elapsed = time.perf_counter() - start
+
+        with self._stats_lock:
+            s = self._stats[kind]
+            s["texts"] += len(texts)
+            s["batches"] += 1
+            s["seconds"] += elapsed
+        return vectors.tolist()
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            vectors.extend(self._encode(texts[i:i + self.batch_size], "documents", self.batch_size))
+        return vectors
+
+    def embed_query(self, text):
+        with self._query_cache_lock:
+            if text in self._query_cache:
+                self._query_cache.move_to_end(text)
+                return list(self._query_cache[text])
+
+        self._ensure_worker()
+        future = Future()
+        self._queries.put((text, future))
+        vector = future.result()
+
+        with self._query_cache_lock:
+            self._query_cache[text] = vector
+            while len(self._query_cache) > QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return list(vector)
+
+    # --- 2. QUERY MICRO-BATCHING ---
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._query_loop, name="embedding-queries", daemon=True)
+                self._worker.start()
+
+    def _query_loop(self):
+        while True:
+            batch = [self._queries.get()]
+            deadline = time.perf_counter() + self.query_wait
+            while len(batch) < self.query_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queries.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                vectors = self._encode([text for text, _ in batch], "queries", self.query_batch_size)
+                for (_, future), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+    # --- 3. METRICS ---
+    def stats(self):
+        """Texts, batches and throughput (texts/sec) for documents and queries."""
+        with self._stats_lock:
+            report = {}
+            for kind, s in self._stats.items():
+                report[kind] = dict(s)
+                report[kind]["texts_per_sec"] = s["texts"] / s["seconds"] if s["seconds"] else 0.0
+            return report
+
+
+def get_embedding_service(model_name=EMBEDDING_MODEL):
+    """Return the process-wide embedding service, loading the model on first use."""
+    service = _services.get(model_name)
+    if service is None:
+        with _services_lock:
+            service = _services.get(model_name)
+            if service is None:
+                service = EmbeddingService(model_name)
+                _services[model_name] = service
+    return service
+
+def embedding_service_loaded(model_name=EMBEDDING_MODEL):
+    """Whether the model is already in memory, i.e. get_embedding_service() will not block on loading it."""
+    return model_name in _services
+
+def install_embedding_service(service, model_name=EMBEDDING_MODEL):
+    """Use `service` as the process-wide embedding service (offline benchmarks and scripts)."""
+    with _services_lock:
+        _services[model_name] = service
+
+def warm_up_embedding_service(model_name=EMBEDDING_MODEL):
+    """
+    Load the embedding model in a daemon thread; later get_embedding_service()
+    calls reuse it. Only the first call per model starts a thread.
+    """
+    with _services_lock:
+        if model_name in _services or model_name in _warming:
+            return
+        _warming.add(model_name)
+
+    def load():
+        try:
+            get_embedding_service(model_name).embed_query("warm up")
+        except Exception:
+            logger.exception("Embedding model warm-up failed")
+
+    threading.Thread(target=load, name="embedding-warmup", daemon=True).start()
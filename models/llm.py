@@ -1,7 +1,31 @@
+import asyncio
+import json
 import os
+import random
+import threading
+import time
+
+import httpx
 import streamlit as st
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
 from langchain_groq import ChatGroq
 
+from app.config import (
+    GROQ_MODEL, GROQ_MAX_CONNECTIONS, GROQ_TIMEOUT_SECONDS,
+    LLM_BACKEND, STUB_LATENCY_MS,
+)
+
+_models = {}
+_models_lock = threading.Lock()
+
+def _http_clients():
+    """Pooled keep-alive HTTP clients, so every turn reuses open connections to Groq."""
+    limits = httpx.Limits(max_connections=GROQ_MAX_CONNECTIONS, max_keepalive_connections=GROQ_MAX_CONNECTIONS)
+    timeout = httpx.Timeout(GROQ_TIMEOUT_SECONDS, connect=10.0)
+    return httpx.Client(limits=limits, timeout=timeout), httpx.AsyncClient(limits=limits, timeout=timeout)
+
 def get_chatgroq_model():
     try:
         # TRY to get key from Streamlit Secrets, otherwise use environment variable
@@ -11,11 +35,81 @@ def get_chatgroq_model():
         else:
             my_api_key = os.getenv("GROQ_API_KEY")
 
-        groq_model = ChatGroq(
-            api_key=my_api_key,
-            model_name="llama-3.3-70b-versatile",
-            temperature=0
-        )
+        # One client per process (and key): Streamlit reruns and sessions share it
+        groq_model = _models.get(my_api_key)
+        if groq_model is None:
+            with _models_lock:
+                groq_model = _models.get(my_api_key)
+                if groq_model is None:
+                    http_client, http_async_client = _http_clients()
+                    groq_model = ChatGroq(
+                        api_key=my_api_key,
+                        model_name=GROQ_MODEL,
+                        temperature=0,
+                        http_client=http_client,
+                        http_async_client=http_async_client,
+                        # Retries are owned by app/llm_gateway.py
+                        max_retries=0,
+                    )
+                    _models[my_api_key] = groq_model
         return groq_model
     except Exception as e:
-        raise RuntimeError(f"Failed to initialize Groq model: {str(e)}")
\ No newline at end of file
+        raise RuntimeError(f"Failed to initialize Groq model: {str(e)}")
+
+
+# --- OFFLINE STUB MODEL ---
+class StubRateLimitError(Exception):
+    """Mimics a Groq 429 so retry handling can be exercised offline."""
+    status_code = 429
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Deterministic local stand-in for Groq. Answers the intent and booking
+    prompts with plausible outputs, echoes everything else, and simulates
+    network latency (and optionally rate-limit errors).
+    """
+    latency_ms: float = STUB_LATENCY_MS
+    error_rate: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "pyscholar-stub"
+
+    def _respond(self, messages):
+        prompt = "\n".join(str(m.content) for m in messages)
+        if random.random() < self.error_rate:
+            raise StubRateLimitError("stub rate limit")
+
+        if '"BOOKING" or "QUERY"' in prompt:
+            message = prompt.split("User Message:", 1)[-1].lower()
+            return "BOOKING" if any(w in message for w in ("book", "schedule", "appointment", "slot")) else "QUERY"
+        if "Extract booking details" in prompt:
+            return json.dumps({})
+        question = str(messages[-1].content).strip().splitlines()
+        return f"(stub) You asked: {question[-1] if question else ''}"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        for word in self._respond(messages).split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency_ms / 1000)
+        for word in self._respond(messages).split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+def get_chat_model(backend=None):
+    """The configured chat model: Groq in production, the stub offline."""
+    if (backend or LLM_BACKEND) == "stub":
+        return _models.setdefault("__stub__", StubChatModel())
+    return get_chatgroq_model()
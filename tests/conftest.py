@@ -0,0 +1,43 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Offline configuration, set before any app module reads app/config.py
+_WORKDIR = tempfile.mkdtemp(prefix="pyscholar-tests-")
+os.environ.setdefault("PYSCHOLAR_CACHE_DIR", os.path.join(_WORKDIR, "cache"))
+os.environ.setdefault("PYSCHOLAR_LLM_BACKEND", "stub")
+os.environ.setdefault("PYSCHOLAR_STUB_LATENCY_MS", "0")
+os.environ.setdefault("PYSCHOLAR_LLM_REQUESTS_PER_MINUTE", "10000000")
+os.environ.setdefault("PYSCHOLAR_LLM_BURST", "100000")
+os.environ.setdefault("PYSCHOLAR_SEMANTIC_CACHE", "0")
+os.environ.setdefault("PYSCHOLAR_TRACE_SAMPLE_RATE", "0")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.fakes import HashingEncoder
+from db import database
+from models.embeddings import EmbeddingService, install_embedding_service
+from models.llm import get_chat_model
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh bookings database for one test."""
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "bookings.db"))
+    database.init_db()
+    return database
+
+
+@pytest.fixture(scope="session", autouse=True)
+def embeddings():
+    """The offline hashing encoder in place of the SentenceTransformer model."""
+    service = EmbeddingService(model=HashingEncoder())
+    install_embedding_service(service)
+    return service
+
+
+@pytest.fixture
+def llm():
+    return get_chat_model("stub")
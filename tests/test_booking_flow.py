@@ -0,0 +1,100 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app.booking_flow import (
+    parse_date, parse_time, parse_phone, parse_name, parse_booking_type,
+    parse_local_details, extract_booking_details, missing_fields,
+)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2031-03-05", "2031-03-05"),
+    ("on 05/03/2031 please", "2031-03-05"),
+    ("5th of March 2031", "2031-03-05"),
+    ("March 5, 2031 at noon", "2031-03-05"),
+    ("10.30am on 5/3/2031", "2031-03-05"),
+    ("2031-02-30", None),
+])
+def test_parse_date(text, expected):
+    assert parse_date(text)[0] == expected
+
+
+def test_parse_relative_dates():
+    today = date.today()
+    assert parse_date("tomorrow works")[0] == (today + timedelta(days=1)).isoformat()
+    next_monday = parse_date("next monday")[0]
+    assert date.fromisoformat(next_monday).weekday() == 0
+    assert date.fromisoformat(next_monday) > today
+    # Day/month without a year is the next occurrence
+    short = date.fromisoformat(parse_date("on 10/11 please")[0])
+    assert (short.day, short.month) == (10, 11) and short >= today
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("10am", "10:00"),
+    ("at 3:30 pm", "15:30"),
+    ("10.30am", "10:30"),
+    ("12 am", "00:00"),
+    ("14:45", "14:45"),
+    ("around noon", "12:00"),
+    ("no time here", None),
+])
+def test_parse_time(text, expected):
+    assert parse_time(text)[0] == expected
+
+
+def test_parse_phone_and_booking_type():
+    assert parse_phone("call +91 98765 43210 please")[0] == "+91 98765 43210"
+    assert parse_phone("room 12345")[0] is None
+    assert parse_booking_type("I'd like a code review")[0] == "Code Review"
+    assert parse_booking_type("some career advice")[0] == "Career Guidance"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("My name is Asha rao and my email is a@b.com", "Asha Rao"),
+    ("this is Ravi", "Ravi"),
+    ("I'm interested in a mock interview", None),
+    ("Hi, this is regarding a code review", None),
+    ("this is urgent, I need a mock interview tomorrow at 10am", None),
+    ("This is a mock interview request", None),
+    ("My name is not important", None),
+    ("My name is Asha, please book a mock interview", "Asha"),
+])
+def test_parse_name(text, expected):
+    assert parse_name(text)[0] == expected
+
+
+def test_parse_local_details_fills_every_slot():
+    details, leftover = parse_local_details(
+        "I'm Asha Rao, asha@example.com, 9876543210, mock interview on 2031-03-05 at 10am"
+    )
+    assert details == {
+        "name": "Asha Rao", "email": "asha@example.com", "phone": "9876543210",
+        "booking_type": "Mock Interview", "date": "2031-03-05", "time": "10:00",
+    }
+    # The date's digits are not mistaken for a phone number
+    assert "2031" not in leftover
+
+
+def test_bare_reply_to_name_question_is_the_name():
+    assert parse_local_details("asha rao", asking_for="name")[0] == {"name": "Asha Rao"}
+    assert parse_local_details("hi, I'm Asha", asking_for="name")[0] == {"name": "Asha"}
+    assert parse_local_details("sure Asha Rao", asking_for="name")[0] == {"name": "Asha Rao"}
+    # Only taken as a name when the name is what we asked for
+    assert parse_local_details("asha rao", asking_for="email")[0] == {}
+
+
+@pytest.mark.parametrize("reply", ["yes", "ok", "no", "sure", "hi", "Yes please", "ok thanks", "nope"])
+def test_confirmation_and_filler_replies_are_not_names(reply):
+    assert "name" not in parse_local_details(reply, asking_for="name")[0]
+
+
+def test_extract_uses_local_parsers_without_the_llm():
+    class NoLLM:
+        def __getattr__(self, name):
+            raise AssertionError("the LLM should not be called")
+
+    found = extract_booking_details("asha@example.com, 9876543210", {"name": "Asha"}, NoLLM())
+    assert found == {"email": "asha@example.com", "phone": "9876543210"}
+    assert missing_fields({"name": "Asha", **found}) == ["booking_type", "date", "time"]
@@ -0,0 +1,22 @@
+from app import chat_logic
+from models import embeddings
+
+
+def test_rules_answer_clear_messages():
+    assert chat_logic._classify_rules("i want to book a session") == "BOOKING"
+    assert chat_logic._classify_rules("what is covered in week 1") == "QUERY"
+    assert chat_logic._classify_rules("what does a booking cost") is None
+
+
+def test_centroid_tier_never_loads_the_model_in_a_turn(monkeypatch):
+    warmed = []
+    monkeypatch.setattr(embeddings, "_services", {})
+    monkeypatch.setattr(embeddings, "warm_up_embedding_service", lambda: warmed.append(True))
+    assert chat_logic._classify_centroid("could you help me with my interview") is None
+    assert warmed == [True]
+
+
+def test_centroid_tier_runs_once_the_model_is_loaded(monkeypatch):
+    monkeypatch.setattr(embeddings, "warm_up_embedding_service", lambda: None)
+    assert embeddings.embedding_service_loaded()
+    assert chat_logic._classify_centroid("Please reserve a career guidance slot for me") in ("BOOKING", None)
@@ -0,0 +1,46 @@
+from langchain_core.documents import Document
+
+from app.context import assemble_context, count_tokens, trim_to_tokens
+
+
+def chunk(text, start, page=0, source="guide.pdf", doc_id="d1"):
+    return Document(page_content=text, metadata={"doc_id": doc_id, "source": source, "page": page,
+                                                 "start_index": start})
+
+
+def test_overlapping_chunks_of_a_page_are_merged():
+    page = "Week two covers regression. Week two also covers classification and evaluation."
+    first, second = chunk(page[:45], 0), chunk(page[30:], 30)
+    context, stats = assemble_context([second, first])
+    assert context == f"[guide.pdf, page 1]\n{page}"
+    assert (stats["retrieved"], stats["merged"], stats["used"]) == (2, 1, 1)
+
+
+def test_chunks_on_other_pages_stay_separate_and_in_rank_order():
+    docs = [chunk("Clustering is in week three.", 0, page=4), chunk("Pandas is in week one.", 0, page=1)]
+    context, _ = assemble_context(docs)
+    assert context.index("[guide.pdf, page 5]") < context.index("[guide.pdf, page 2]")
+
+
+def test_near_duplicates_are_dropped():
+    text = "The capstone project is reviewed by a mentor in the final week of the course."
+    docs = [chunk(text, 0, doc_id="a"), chunk(text + " Really.", 0, doc_id="b")]
+    _, stats = assemble_context(docs)
+    assert stats["used"] == 1
+
+
+def test_context_stays_within_the_token_budget():
+    sentence = "Feature engineering turns raw columns into model inputs. "
+    docs = [chunk(sentence * 40, 0, page=p) for p in range(5)]
+    context, stats = assemble_context(docs, budget=300, dedup_threshold=1.1)
+    assert stats["context_tokens"] <= 300
+    assert count_tokens(context) <= 300 + 10
+    # The last block is trimmed at a sentence boundary rather than dropped mid-word
+    assert context.endswith(". …")
+
+
+def test_trim_to_tokens():
+    text = "One sentence here. " * 50
+    trimmed = trim_to_tokens(text, 20)
+    assert count_tokens(trimmed) <= 22
+    assert trimmed.endswith(". …")
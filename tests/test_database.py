@@ -0,0 +1,127 @@
+import threading
+
+import pytest
+
+
+def book(db, name="Asha Rao", email="asha@example.com", day="2031-03-05", time="10:00",
+         booking_type="Mock Interview"):
+    return db.add_booking(name, email, "9876543210", booking_type, day, time)
+
+
+def test_init_db_is_idempotent(db):
+    db.init_db()
+    db._init_schema()
+    assert book(db)[0]
+
+
+def test_customer_is_upserted_by_email(db):
+    assert book(db, email="Asha@Example.com ")[0]
+    assert book(db, name="Asha R.", day="2031-03-06")[0]
+    with db.connection() as conn:
+        customers = conn.execute("SELECT name, email FROM customers").fetchall()
+        bookings = conn.execute("SELECT COUNT(DISTINCT customer_id) FROM bookings").fetchone()[0]
+    # One customer per (normalized) email, with the latest details
+    assert customers == [("Asha R.", "asha@example.com")]
+    assert bookings == 1
+
+
+def test_confirmation_email_is_queued_with_the_booking(db):
+    ok, booking_id = db.add_booking("Asha", "asha@example.com", "9876543210", "Code Review",
+                                    "2031-03-05", "11:00", confirmation=lambda bid: ("Subject", f"Booking #{bid}"))
+    assert ok
+    with db.connection() as conn:
+        assert conn.execute("SELECT booking_id, body FROM email_outbox").fetchall() == [(booking_id, f"Booking #{booking_id}")]
+
+
+def test_failed_confirmation_rolls_back_the_booking(db):
+    def broken(_):
+        raise RuntimeError("template error")
+
+    ok, error = db.add_booking("Asha", "asha@example.com", "9876543210", "Code Review",
+                               "2031-03-05", "11:00", confirmation=broken)
+    assert (ok, error) == (False, "template error")
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM bookings").fetchone()[0] == 0
+
+
+def test_concurrent_writers_all_commit(db):
+    results = []
+
+    def write(i):
+        results.append(book(db, email=f"user{i}@example.com", time=f"{9 + i % 9:02d}:00",
+                            day=f"2031-03-{1 + i // 9:02d}"))
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(30)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(ok for ok, _ in results)
+    assert db.get_booking_stats()["total"]["all"] == 30
+
+
+# --- Dashboard search and paging ---
+@pytest.fixture
+def customers(db):
+    people = [("Asha Rao", "asha@example.com"), ("Ravi Kumar", "ravi@mentors.io"),
+              ("Meera Nair", "meera@example.com"), ("Rahul_Dev", "rahul@example.com")]
+    for i, (name, email) in enumerate(people * 3):
+        book(db, name=name, email=email, day=f"2031-04-{1 + i:02d}")
+    return db
+
+
+@pytest.mark.parametrize("term, names", [
+    ("rao", {"Asha Rao"}),
+    ("MENTORS", {"Ravi Kumar"}),
+    ("example.com", {"Asha Rao", "Meera Nair", "Rahul_Dev"}),
+    # Short terms use LIKE, with wildcards escaped
+    ("_D", {"Rahul_Dev"}),
+    ('"', set()),
+])
+def test_search_matches_name_or_email_substrings(customers, term, names):
+    _, rows, _ = customers.search_bookings(search=term, page_size=100)
+    assert {row[1] for row in rows} == names
+
+
+def test_keyset_pagination_walks_every_booking_once(customers):
+    seen, before_id = [], None
+    while True:
+        _, rows, before_id = customers.search_bookings(before_id=before_id, page_size=5)
+        seen += [row[0] for row in rows]
+        if before_id is None:
+            break
+    assert seen == sorted(seen, reverse=True)
+    assert len(seen) == len(set(seen)) == 12
+
+
+def test_filters_and_counts(customers):
+    _, rows, _ = customers.search_bookings(date="2031-04-02")
+    assert [row[1] for row in rows] == ["Ravi Kumar"]
+    assert customers.count_bookings_by_status(search="asha") == {"Confirmed": 3}
+    assert customers.distinct_booking_dates()[:2] == ["2031-04-01", "2031-04-02"]
+
+
+def test_booking_stats_follow_status_changes(customers):
+    with customers.transaction() as c:
+        c.execute("UPDATE bookings SET status = 'Cancelled' WHERE date = '2031-04-01'")
+        c.execute("DELETE FROM bookings WHERE date = '2031-04-02'")
+    stats = customers.get_booking_stats()
+    assert stats["total"]["all"] == 11
+    assert stats["status"] == {"Confirmed": 10, "Cancelled": 1}
+    assert "2031-04-02" not in stats["date"]
+
+
+# --- Booking slots ---
+def test_second_booking_of_a_slot_is_rejected(db):
+    assert book(db)[0]
+    assert book(db, email="ravi@example.com") == (False, db.SLOT_TAKEN)
+    # Same time, other resource: allowed
+    assert book(db, email="ravi@example.com", booking_type="Code Review")[0]
+    assert not db.is_slot_free("Mock Interview", "2031-03-05 10:00")
+    assert db.booked_slots("Mock Interview", "2031-03-05 00:00", "2031-03-06 00:00") == ["2031-03-05 10:00"]
+
+
+def test_unparseable_slots_are_not_constrained(db):
+    assert db.slot_key("next week", "10:00") is None
+    assert book(db, day="next week")[0]
+    assert book(db, day="next week", email="ravi@example.com")[0]
@@ -0,0 +1,155 @@
+import smtplib
+import time
+
+import pytest
+
+from app.email_outbox import OutboxWorker
+
+
+class FakeSMTP:
+    """Records sent messages; `fail` maps a recipient to the exception its send raises."""
+
+    def __init__(self, fail=None):
+        self.fail = fail or {}
+        self.sent = []
+        self.closed = False
+        self.noops = 0
+
+    def noop(self):
+        self.noops += 1
+        return (250, b"OK")
+
+    def send_message(self, msg):
+        error = self.fail.get(msg["To"])
+        if error is not None:
+            raise error
+        self.sent.append(msg["To"])
+
+    def quit(self):
+        self.closed = True
+
+
+def queue_emails(db, recipients):
+    with db.transaction() as c:
+        for to_email in recipients:
+            db._enqueue_email(c, None, to_email, "Booking confirmed", "See you then.")
+
+def outbox_rows(db):
+    with db.connection() as conn:
+        return {row[0]: row[1:] for row in conn.execute(
+            "SELECT to_email, status, attempts, last_error FROM email_outbox")}
+
+def make_worker(smtp, max_attempts=3):
+    worker = OutboxWorker(credentials=("mentor@example.com", None), max_attempts=max_attempts)
+    worker._connect = lambda: smtp
+    return worker
+
+
+def test_sends_every_due_email(db):
+    smtp = FakeSMTP()
+    queue_emails(db, ["a@example.com", "b@example.com"])
+
+    assert make_worker(smtp).drain_once() == 2
+    assert smtp.sent == ["a@example.com", "b@example.com"]
+    assert {status for status, _, _ in outbox_rows(db).values()} == {"sent"}
+    # A connection in use is not probed before every message
+    assert smtp.noops == 0
+
+
+def test_idle_connection_is_probed(db, monkeypatch):
+    smtp = FakeSMTP()
+    worker = make_worker(smtp)
+    queue_emails(db, ["a@example.com"])
+    worker.drain_once()
+
+    monkeypatch.setattr(worker, "_last_used", time.time() - 3600)
+    queue_emails(db, ["b@example.com"])
+    worker.drain_once()
+    assert smtp.noops == 1 and smtp.sent == ["a@example.com", "b@example.com"]
+
+
+def test_unconfigured_sender_leaves_mail_queued(db, monkeypatch, caplog):
+    monkeypatch.setattr("app.email_outbox.load_credentials", lambda: (None, None))
+    queue_emails(db, ["a@example.com"])
+    worker = OutboxWorker()
+
+    assert worker.drain_once() == 0 and worker.drain_once() == 0
+    assert outbox_rows(db)["a@example.com"][:2] == ("pending", 0)
+    assert sum("No SMTP sender" in record.message for record in caplog.records) == 1
+
+
+def test_refused_recipient_fails_only_its_own_email(db):
+    refused = smtplib.SMTPRecipientsRefused({"b@example.com": (550, b"No such user")})
+    smtp = FakeSMTP(fail={"b@example.com": refused})
+    queue_emails(db, ["a@example.com", "b@example.com", "c@example.com"])
+
+    worker = make_worker(smtp)
+    worker.drain_once()
+
+    rows = outbox_rows(db)
+    assert smtp.sent == ["a@example.com", "c@example.com"]
+    assert rows["a@example.com"][0] == "sent"
+    assert rows["c@example.com"][0] == "sent"
+    # A 5xx refusal is permanent: dead-lettered at once, with its own error
+    assert rows["b@example.com"][0] == "dead"
+    assert "No such user" in rows["b@example.com"][2]
+    assert not smtp.closed
+    assert worker.stats()["dead"] == 1
+
+
+def test_transient_refusal_is_retried_later(db):
+    busy = smtplib.SMTPDataError(451, b"Try again later")
+    smtp = FakeSMTP(fail={"a@example.com": busy})
+    queue_emails(db, ["a@example.com", "b@example.com"])
+
+    make_worker(smtp).drain_once()
+
+    rows = outbox_rows(db)
+    assert rows["a@example.com"][0] == "pending"
+    assert rows["b@example.com"][0] == "sent"
+    with db.connection() as conn:
+        next_attempt = conn.execute(
+            "SELECT next_attempt_at FROM email_outbox WHERE to_email = 'a@example.com'").fetchone()[0]
+    assert next_attempt > time.time()
+
+
+@pytest.mark.parametrize("error", [
+    smtplib.SMTPServerDisconnected("Connection unexpectedly closed"),
+    ConnectionResetError("reset by peer"),
+])
+def test_lost_connection_reschedules_the_rest_of_the_batch(db, error):
+    smtp = FakeSMTP(fail={"b@example.com": error})
+    queue_emails(db, ["a@example.com", "b@example.com", "c@example.com"])
+
+    worker = make_worker(smtp)
+    worker.drain_once()
+
+    rows = outbox_rows(db)
+    assert rows["a@example.com"][0] == "sent"
+    assert rows["b@example.com"][0] == "pending"
+    assert rows["c@example.com"][0] == "pending"
+    assert smtp.closed
+    assert worker.stats()["retried"] == 2
+
+
+def test_dead_letters_after_max_attempts(db):
+    busy = smtplib.SMTPDataError(451, b"Try again later")
+    smtp = FakeSMTP(fail={"a@example.com": busy})
+    queue_emails(db, ["a@example.com"])
+    worker = make_worker(smtp, max_attempts=2)
+
+    for _ in range(2):
+        worker.drain_once()
+        with db.transaction() as c:
+            c.execute("UPDATE email_outbox SET next_attempt_at = 0 WHERE status = 'pending'")
+
+    status, attempts, _ = outbox_rows(db)["a@example.com"]
+    assert (status, attempts) == ("dead", 2)
+
+
+def test_expired_lease_is_claimed_again(db):
+    queue_emails(db, ["a@example.com"])
+    assert len(db.claim_outbox_batch(10, lease_seconds=-1)) == 1
+    # The first sender died without reporting back; the email is due again
+    assert [row[4] for row in db.claim_outbox_batch(10, lease_seconds=300)] == [2]
+    assert db.claim_outbox_batch(10, lease_seconds=300) == []
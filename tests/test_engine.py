@@ -0,0 +1,106 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app.engine import ConversationEngine, SessionState
+
+DAY = (date.today() + timedelta(days=3)).isoformat()
+
+
+@pytest.fixture
+def engine(db, llm):
+    return ConversationEngine(llm, stream=False)
+
+
+def say(engine, state, *messages):
+    return [engine.run_turn(state, message)[1] for message in messages]
+
+
+def start_booking(engine, state, email="asha@example.com", slot=f"{DAY} at 10am"):
+    return say(engine, state, "I want to book a mock interview", "My name is Asha Rao",
+               f"{email}, 9876543210", slot)
+
+
+def test_booking_conversation(engine):
+    state = SessionState()
+    replies = start_booking(engine, state)
+    assert "Please Confirm" in replies[-1]
+    assert state.confirming
+
+    reply, text = engine.run_turn(state, "yes")
+    assert reply.booking_id is not None
+    assert "Booking Confirmed" in text
+    assert not state.booking_in_progress and state.extracted_details == {}
+
+
+def test_name_question_is_not_answered_by_ok(engine):
+    state = SessionState()
+    say(engine, state, "I want to book a mock interview")
+    assert state.asking_for == "name"
+    say(engine, state, "ok")
+    assert "name" not in state.extracted_details
+    assert state.asking_for == "name"
+
+
+def test_cancel_during_confirmation(engine):
+    state = SessionState()
+    start_booking(engine, state)
+    assert "cancelled" in say(engine, state, "no")[0]
+    assert not state.booking_in_progress
+
+
+def test_taken_slot_offers_alternatives_before_confirming(engine):
+    first, second = SessionState(), SessionState()
+    start_booking(engine, first)
+    say(engine, first, "yes")
+
+    reply = start_booking(engine, second, email="ravi@example.com")[-1]
+    assert "isn't available" in reply and f"{DAY} at 11:00" in reply
+    assert second.asking_for == "time" and second.extracted_details["date"] == DAY
+    assert "Please Confirm" in say(engine, second, "11am")[0]
+
+
+def test_losing_the_confirmation_race_keeps_the_details(engine):
+    first, second = SessionState(), SessionState()
+    start_booking(engine, first)
+    start_booking(engine, second, email="ravi@example.com")
+    say(engine, first, "yes")
+
+    reply, text = engine.run_turn(second, "yes")
+    assert reply.booking_id is None
+    assert "isn't available" in text
+    assert second.booking_in_progress and second.asking_for == "time"
+    assert second.extracted_details["email"] == "ravi@example.com"
+
+
+def test_unreadable_date_is_asked_for_again(engine):
+    state = SessionState()
+    state.booking_in_progress = True
+    state.extracted_details = {"name": "Asha", "email": "asha@example.com", "phone": "9876543210",
+                               "booking_type": "Mock Interview", "date": "sometime soon", "time": "10:00"}
+
+    text = say(engine, state, "book it")[0]
+    assert "isn't a date and time I can book" in text
+    assert state.asking_for == "date"
+    assert state.extracted_details["date"] is None and state.extracted_details["time"] is None
+
+    assert "Please Confirm" in say(engine, state, f"{DAY} at 2pm")[0]
+
+
+def test_cancelled_booking_frees_its_slot(engine, db):
+    state = SessionState()
+    start_booking(engine, state)
+    booking_id = engine.run_turn(state, "yes")[0].booking_id
+    with db.transaction() as c:
+        c.execute("UPDATE bookings SET status = 'Cancelled' WHERE id = ?", (booking_id,))
+
+    other = SessionState()
+    start_booking(engine, other, email="ravi@example.com")
+    assert engine.run_turn(other, "yes")[0].booking_id is not None
+
+
+def test_general_questions_are_answered_by_the_model(engine):
+    state = SessionState()
+    reply, text = engine.run_turn(state, "What is overfitting?")
+    assert reply.path == "chat"
+    assert "What is overfitting?" in text
@@ -0,0 +1,43 @@
+from benchmarks.fakes import synthetic_pdf
+from app.knowledge_base import KnowledgeBase, split_pdf
+
+
+def test_split_pdf_yields_bounded_batches():
+    batches = list(split_pdf(synthetic_pdf(6), "guide.pdf", batch_size=8))
+    assert len(batches) > 1
+    assert all(0 < len(batch) <= 8 for batch in batches)
+    text, metadata = batches[0][0]
+    assert text and metadata["source"] == "guide.pdf" and metadata["page"] == 0
+
+
+def test_add_and_remove_documents():
+    kb = KnowledgeBase(backend="flat")
+    first, second = synthetic_pdf(3, seed=1), synthetic_pdf(4, seed=2)
+
+    assert kb.add_pdfs([("a.pdf", first)]) == []
+    failures = kb.add_pdfs([("b.pdf", second), ("broken.pdf", b"%PDF-1.4 not really")])
+    assert [name for name, _ in failures] == ["broken.pdf"]
+    chunks = {info["name"]: info["chunks"] for info in kb.documents.values()}
+    assert set(chunks) == {"a.pdf", "b.pdf"}
+    assert kb.vectorstore.index.ntotal == sum(chunks.values())
+
+    doc_id = next(d for d, info in kb.documents.items() if info["name"] == "a.pdf")
+    assert kb.remove_document(doc_id)
+    assert kb.vectorstore.index.ntotal == chunks["b.pdf"]
+    assert {doc.metadata["source"] for doc in kb.vectorstore.similarity_search("python", k=5)} == {"b.pdf"}
+
+
+def test_failures_clear_when_fixed_or_removed():
+    kb = KnowledgeBase(backend="flat")
+    broken = b"%PDF-1.4 not really"
+    assert [name for name, _ in kb.add_pdfs([("guide.pdf", broken), ("other.pdf", broken + b" ")])] \
+        == ["guide.pdf", "other.pdf"]
+    assert {info["name"] for info in kb.failed.values()} == {"guide.pdf", "other.pdf"}
+
+    # A fixed copy of guide.pdf replaces its failure
+    assert kb.add_pdfs([("guide.pdf", synthetic_pdf(2))]) == []
+    assert {info["name"] for info in kb.failed.values()} == {"other.pdf"}
+
+    # Removing the broken upload drops its failure too
+    assert kb.remove_document(next(iter(kb.failed)))
+    assert kb.failed == {} and len(kb.documents) == 1
@@ -0,0 +1,138 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+
+from app.llm_gateway import LLMGateway, retry_after_seconds
+from models.llm import StubChatModel, StubRateLimitError
+
+
+class FlakyRunnable:
+    """Fails with `errors` in turn, then answers "ok"."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def ainvoke(self, payload, config=None):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+class EndlessStream:
+    def __init__(self):
+        self.cancelled = threading.Event()
+
+    async def astream(self, payload, config=None):
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield "token "
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, headers):
+        super().__init__("rate limited")
+        self.response = type("Response", (), {"headers": headers})()
+
+
+class Recorder(BaseCallbackHandler):
+    def __init__(self):
+        self.events = []
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.events.append("start")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self.events.append("end")
+
+
+def make_gateway(**kwargs):
+    return LLMGateway(**{"requests_per_minute": 60000, "burst": 1000, "backoff_base": 0.01,
+                         "backoff_max": 0.02, **kwargs})
+
+
+def test_retries_rate_limits_then_succeeds():
+    gateway = make_gateway()
+    runnable = FlakyRunnable(StubRateLimitError("429"), StubRateLimitError("429"))
+    assert gateway.invoke(runnable, {"q": 1}, timeout=5) == "ok"
+    assert runnable.calls == 3
+    assert gateway.stats()["retries"] == 2
+
+
+def test_gives_up_after_max_retries_and_on_other_errors():
+    gateway = make_gateway(max_retries=1)
+    with pytest.raises(StubRateLimitError):
+        gateway.invoke(FlakyRunnable(*[StubRateLimitError("429")] * 3), {"q": 2}, timeout=5)
+    runnable = FlakyRunnable(ValueError("bad prompt"))
+    with pytest.raises(ValueError):
+        gateway.invoke(runnable, {"q": 3}, timeout=5)
+    assert runnable.calls == 1
+
+
+def test_honors_retry_after():
+    gateway = make_gateway()
+    start = time.monotonic()
+    assert gateway.invoke(FlakyRunnable(RateLimited({"retry-after": "0.3"})), {"q": 4}, timeout=5) == "ok"
+    assert time.monotonic() - start >= 0.3
+
+
+def test_retry_after_longer_than_the_limit_is_not_retried():
+    gateway = make_gateway()
+    runnable = FlakyRunnable(RateLimited({"retry-after": "3600"}))
+    with pytest.raises(RateLimited):
+        gateway.invoke(runnable, {"q": 5}, timeout=5)
+    assert runnable.calls == 1
+
+
+def test_retry_after_header_forms():
+    assert retry_after_seconds(RateLimited({"retry-after": "2"})) == 2.0
+    assert retry_after_seconds(RateLimited({"retry-after-ms": "250"})) == 0.25
+    assert retry_after_seconds(RateLimited({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert retry_after_seconds(RateLimited({})) is None
+    assert retry_after_seconds(ValueError()) is None
+
+
+def test_identical_requests_share_one_call_and_every_callers_callbacks():
+    gateway = make_gateway()
+    model = StubChatModel(latency_ms=300)
+    messages = [HumanMessage(content="What is covered in week 2?")]
+    recorders = [Recorder() for _ in range(3)]
+    results = [None] * 3
+
+    def ask(i):
+        results[i] = gateway.invoke(model, messages, timeout=5, config={"callbacks": [recorders[i]]})
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+
+    assert gateway.stats()["coalesced"] == 2
+    assert len({r.content for r in results}) == 1
+    # Callers that joined mid-call still see the whole start/end pair
+    assert [r.events for r in recorders] == [["start", "end"]] * 3
+
+
+def test_abandoned_stream_releases_its_slot():
+    gateway = make_gateway(max_concurrency=1)
+    runnable = EndlessStream()
+    stream = gateway.stream(runnable, "hello")
+    assert next(stream) == "token "
+    stream.close()
+
+    assert runnable.cancelled.wait(2)
+    # The only concurrency slot is free again
+    assert gateway.invoke(FlakyRunnable(), {"q": 6}, timeout=2) == "ok"
@@ -0,0 +1,82 @@
+import pytest
+from langchain_community.vectorstores import FAISS
+
+from app.bm25 import BM25Index, MappedBM25Index, tokenize
+from app.retrieval import HybridRetriever, reciprocal_rank_fusion
+
+TEXTS = [
+    "Week 1 covers python basics and pandas dataframes.",
+    "Week 2 covers regression, classification and model evaluation.",
+    "The DS-101 capstone project is reviewed by mentor Priya Sharma.",
+    "Clustering and feature engineering are covered in week 3.",
+    "Mock interviews focus on sql query practice and statistics.",
+]
+
+
+def test_tokenize_keeps_codes_together():
+    assert tokenize("DS-101, week3 and v2.1!") == ["ds-101", "week3", "and", "v2.1"]
+
+
+def test_bm25_ranks_exact_terms_first():
+    index = BM25Index()
+    index.add([str(i) for i in range(len(TEXTS))], TEXTS)
+    assert index.search("ds-101 capstone", 1)[0][0] == "2"
+    assert [chunk_id for chunk_id, _ in index.search("regression", 5)] == ["1"]
+    assert index.search("astronomy", 5) == []
+
+
+def test_bm25_remove_and_merge():
+    left, right = BM25Index(), BM25Index()
+    left.add(["a", "b"], TEXTS[:2])
+    right.add(["c"], TEXTS[2:3])
+    left.merge_from(right)
+    assert left.search("priya", 1)[0][0] == "c"
+
+    left.remove(["c"])
+    assert left.search("priya", 1) == []
+    assert len(left) == 2 and left.total_length == sum(left.lengths.values())
+
+
+def test_bm25_round_trips_through_json(tmp_path):
+    index = BM25Index()
+    index.add([str(i) for i in range(len(TEXTS))], TEXTS)
+    index.save(tmp_path)
+    assert BM25Index.load(tmp_path).search("week covers", 3) == index.search("week covers", 3)
+    assert BM25Index.load(tmp_path / "missing") is None
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_mapped_index_scores_match(tmp_path, mmap):
+    index = BM25Index()
+    index.add([str(i) for i in range(len(TEXTS))], TEXTS)
+    MappedBM25Index.write(tmp_path, TEXTS)
+    mapped = MappedBM25Index(tmp_path, mmap=mmap)
+    for query in ("week covers", "ds-101 mentor", "sql statistics practice", "nothing here"):
+        expected = index.search(query, 5)
+        got = mapped.search(query, 5)
+        assert [c for c, _ in got] == [c for c, _ in expected]
+        assert [s for _, s in got] == pytest.approx([s for _, s in expected])
+
+
+def test_mapped_index_without_tokens(tmp_path):
+    MappedBM25Index.write(tmp_path, ["", "!!!"])
+    mapped = MappedBM25Index(tmp_path)
+    assert mapped.avgdl == 1.0
+    assert mapped.search("anything", 5) == []
+
+
+def test_reciprocal_rank_fusion():
+    # "b" is second in both lists and beats ids that top only one of them
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["d", "b"]])[0] == "b"
+    assert reciprocal_rank_fusion([["a"], []]) == ["a"]
+    assert set(reciprocal_rank_fusion([["a", "b"], ["c"]])) == {"a", "b", "c"}
+
+
+def test_hybrid_retriever_finds_exact_terms(embeddings):
+    store = FAISS.from_texts(TEXTS, embeddings)
+    bm25 = BM25Index.from_vectorstore(store)
+    retriever = HybridRetriever(vectorstore=store, bm25=bm25, k=2, fetch_k=5)
+
+    docs = retriever.invoke("Who reviews DS-101?")
+    assert len(docs) == 2
+    assert docs[0].page_content == TEXTS[2]
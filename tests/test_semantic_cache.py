@@ -0,0 +1,42 @@
+import pytest
+
+from app import semantic_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_CACHE_DB", str(tmp_path / "semantic_cache.db"))
+    monkeypatch.setattr(semantic_cache._local, "conn", None, raising=False)
+    semantic_cache._matrices.clear()
+    return semantic_cache
+
+
+def test_key_terms():
+    assert semantic_cache.key_terms("What is covered in Week 1?") == {"1", "week"}
+    assert semantic_cache.key_terms("Who reviews the DS-101 capstone, Priya?") == {"ds-101", "priya"}
+    assert semantic_cache.key_terms("How do mock interviews work?") == set()
+
+
+def test_near_duplicate_hits(cache):
+    cache.store("kb", "What is covered in week 1?", "Python basics.")
+    assert cache.lookup("kb", "what is covered in week 1", threshold=0.5) == "Python basics."
+    assert cache.lookup("other-kb", "What is covered in week 1?", threshold=0.5) is None
+
+
+@pytest.mark.parametrize("question", [
+    "What is covered in week 2?",
+    "What is covered in week 1 and week 3?",
+    "What does Priya cover in week 1?",
+])
+def test_different_number_or_name_misses(cache, question):
+    cache.store("kb", "What is covered in week 1?", "Python basics.")
+    # Even when the embeddings are close enough, a different number or name is another question
+    assert cache.lookup("kb", question, threshold=0.0) is None
+
+
+def test_matrix_memo_is_bounded(cache, monkeypatch):
+    monkeypatch.setattr(cache, "MAX_MATRICES", 2)
+    for kb_id in ("a", "b", "c"):
+        cache.store(kb_id, "Where is the office?", kb_id)
+        assert cache.lookup(kb_id, "Where is the office?") == kb_id
+    assert list(cache._matrices) == ["b", "c"]
@@ -0,0 +1,80 @@
+import os
+
+from benchmarks.fakes import make_pdf, synthetic_pdf
+from app import shared_kb
+from app.chains import get_layered_rag_chain
+from app.engine import ConversationEngine, SessionState
+from app.knowledge_base import KnowledgeBase
+from app.retrieval import LayeredRetriever
+from app.shared_kb import LayeredKnowledgeBase, get_shared_knowledge_base, publish
+
+UPLOAD_TEXT = "The zephyr bootcamp orientation is run by mentor Quentin Okafor every Monday."
+
+
+def _shared(tmp_path):
+    builder = KnowledgeBase(backend="flat")
+    builder.add_pdfs([("guide.pdf", synthetic_pdf(3))], origin="directory")
+    publish(builder, "sig", root=str(tmp_path))
+    return get_shared_knowledge_base(str(tmp_path))
+
+
+def _uploads():
+    kb = KnowledgeBase(backend="flat")
+    assert kb.add_pdfs([("upload.pdf", make_pdf([UPLOAD_TEXT]))]) == []
+    return kb
+
+
+def test_uploads_are_layered_over_the_shared_store(tmp_path):
+    shared, uploads = _shared(tmp_path), _uploads()
+    kb = LayeredKnowledgeBase(shared, uploads)
+
+    assert kb.layers[0] is shared
+    assert {info["name"] for info in kb.documents.values()} == {"guide.pdf", "upload.pdf"}
+    assert kb.fingerprint not in (shared.fingerprint, uploads.fingerprint)
+
+    retriever = LayeredRetriever(layers=[(layer.vectorstore, layer.bm25) for layer in kb.layers], k=4)
+    sources = [doc.metadata["source"] for doc in retriever.invoke("quentin okafor zephyr orientation")]
+    assert sources[0] == "upload.pdf"
+    # Chunk ids overlap between layers; both layers still contribute
+    assert "guide.pdf" in sources
+
+
+def test_engine_answers_from_both_layers(tmp_path, llm):
+    kb = LayeredKnowledgeBase(_shared(tmp_path), _uploads())
+    assert get_layered_rag_chain(llm, kb.layers) is get_layered_rag_chain(llm, kb.layers)
+
+    state = SessionState(knowledge_base=kb)
+    reply, text = ConversationEngine(llm, stream=False).run_turn(state, "Who runs the zephyr orientation?")
+    assert reply.path == "rag" and text
+
+
+def test_publish_swaps_versions_under_a_reader(tmp_path):
+    root = str(tmp_path)
+    old = _shared(tmp_path)
+    old_version = shared_kb.current_version(root)
+
+    builder = KnowledgeBase(backend="flat")
+    builder.add_pdfs([("second.pdf", synthetic_pdf(2, seed=9))], origin="directory")
+    new_version = publish(builder, "sig-2", root=root)
+
+    assert shared_kb.current_version(root) == new_version != old_version
+    assert get_shared_knowledge_base(root).source_signature == "sig-2"
+    assert not [name for name in os.listdir(root) if name.startswith(".")]
+    # The old version is deleted from disk, but a reader that opened it keeps searching it
+    shared_kb._prune(root, keep=0)
+    assert not os.path.exists(os.path.join(root, old_version))
+    assert {doc.metadata["source"] for doc in old.vectorstore.similarity_search("python", k=3)} == {"guide.pdf"}
+    assert old.bm25.search("python", 3)
+
+
+def test_changed_folder_is_built_in_the_background(tmp_path):
+    pdf_dir, root = tmp_path / "pdfs", str(tmp_path / "shared")
+    pdf_dir.mkdir()
+    (pdf_dir / "guide.pdf").write_bytes(synthetic_pdf(2))
+
+    # Nothing published yet: the caller is not blocked by the build
+    assert shared_kb.shared_knowledge_base_for(str(pdf_dir), root=root) is None
+    shared_kb._build_thread.join(60)
+    kb = shared_kb.shared_knowledge_base_for(str(pdf_dir), root=root)
+    assert kb is not None and kb.source_signature == shared_kb.directory_signature(str(pdf_dir))
+    assert not shared_kb.building()
@@ -0,0 +1,90 @@
+import math
+import time
+
+import pytest
+
+from app import tracing
+
+
+@pytest.fixture
+def traces(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACES_DB", str(tmp_path / "traces.db"))
+
+    def insert(rows):
+        conn = tracing._connect()
+        conn.executemany('''INSERT INTO spans (session_id, turn_id, stage, detail, started_at, duration_ms, ok)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)''', rows)
+        conn.commit()
+        conn.close()
+    return insert
+
+
+def nearest_rank(values, q):
+    values = sorted(values)
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+def test_stage_percentiles_use_nearest_rank(traces):
+    now = time.time()
+    retrieval = [float(ms) for ms in range(1, 201)]
+    traces([("s", "t", "retrieval", None, now, ms, 1) for ms in retrieval]
+           + [("s", "t", "generation", None, now, 900.0, 1)]
+           # Outside the window
+           + [("s", "t", "retrieval", None, now - 7200, 10_000.0, 1)])
+
+    columns, rows = tracing.stage_percentiles(now - 3600)
+    assert columns == ["Stage", "Count", "p50 (ms)", "p95 (ms)", "p99 (ms)"]
+    stats = {row[0]: row[1:] for row in rows}
+    assert stats["generation"] == (1, 900.0, 900.0, 900.0)
+    assert stats["retrieval"] == (200, nearest_rank(retrieval, 0.50), nearest_rank(retrieval, 0.95),
+                                  nearest_rank(retrieval, 0.99))
+    # Slowest p95 first
+    assert [row[0] for row in rows] == ["generation", "retrieval"]
+
+
+def test_stage_percentiles_only_read_the_newest_spans(traces):
+    now = time.time()
+    traces([("s", "t", "intent", None, now, 1000.0, 1)] * 50 + [("s", "t", "intent", None, now, 1.0, 1)] * 10)
+    _, rows = tracing.stage_percentiles(now - 60, max_spans=10)
+    assert rows == [("intent", 10, 1.0, 1.0, 1.0)]
+
+
+def test_slowest_turns_break_down_stages(traces):
+    now = time.time()
+    traces([("s1", "fast", "turn", "chat", now, 100.0, 1), ("s1", "fast", "generation", None, now, 90.0, 1),
+            ("s2", "slow", "turn", "rag", now, 900.0, 1), ("s2", "slow", "retrieval", None, now, 200.0, 1)])
+    columns, turns = tracing.slowest_turns(now - 60, limit=1)
+    row = dict(zip(columns, turns[0]))
+    assert (row["Turn_ID"], row["Path"], row["Stages"]) == ("slow", "rag", "retrieval 200ms")
+
+
+def test_dashboard_reads_do_not_create_the_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACES_DB", str(tmp_path / "traces.db"))
+    assert tracing.stage_percentiles(0)[1] == [] and tracing.slowest_turns(0) == ([], [])
+    assert not (tmp_path / "traces.db").exists()
+
+
+def test_writer_survives_a_failed_connect(tmp_path, monkeypatch):
+    (tmp_path / "not-a-dir").write_text("")
+    monkeypatch.setattr(tracing, "TRACES_DB", str(tmp_path / "not-a-dir" / "traces.db"))
+    monkeypatch.setattr(tracing, "WRITE_RETRY_SECONDS", 0)
+    tracing.record_span("email_send", 5.0, sample_rate=1)
+    assert tracing.flush()
+
+    monkeypatch.setattr(tracing, "TRACES_DB", str(tmp_path / "traces.db"))
+    tracing.record_span("email_send", 7.0, sample_rate=1)
+    assert tracing.flush()
+    assert tracing.stage_percentiles(0)[1] == [("email_send", 1, 7.0, 7.0, 7.0)]
+
+
+def test_unsampled_turns_record_nothing():
+    turn = tracing.Turn("session", sampled=False)
+    with turn.span("intent"):
+        pass
+    assert turn._rows == [] and turn.callbacks() == []
+
+    sampled = tracing.Turn("session", sampled=True)
+    with pytest.raises(ValueError):
+        with sampled.span("extraction"):
+            raise ValueError
+    assert [(row[2], row[6]) for row in sampled._rows] == [("extraction", 0)]